@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_environment():
+    """Кэш и MEDIA_ROOT тестов — во временном каталоге (core.testing)."""
+    from core.testing import isolated
+
+    with isolated():
+        yield
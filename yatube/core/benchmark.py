@@ -0,0 +1,155 @@
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+
+@contextmanager
+def bench_database(name=None):
+    """Поднимает временные БД и кэш, чтобы замеры не трогали рабочие.
+
+    ``name`` задаёт файл БД вместо базы в памяти — он нужен, когда к базе
+    одновременно ходят несколько потоков. Кэш — свой файл на прогон.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings['NAME']
+    if name:
+        test_settings['NAME'] = name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                CACHES={**settings.CACHES, 'default': {
+                    **settings.CACHES['default'],
+                    'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+                }}):
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+
+
+def measure(func, repeat=20):
+    """Запускает ``func`` ``repeat`` раз и возвращает тайминги в мс."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summary(timings):
+    ordered = sorted(timings)
+
+    def pct(value):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * value))]
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.mean(ordered), 3),
+        'p50_ms': round(pct(0.50), 3),
+        'p95_ms': round(pct(0.95), 3),
+        'p99_ms': round(pct(0.99), 3),
+    }
+
+
+class WSGIClient:
+    """Вызывает WSGI-приложение напрямую, минуя сокеты и тестовый клиент.
+
+    Запрос проходит весь стек middleware, как на сервере.
+    """
+
+    def __init__(self, application, cookies=None, host='localhost'):
+        self.application = application
+        self.cookies = cookies or {}
+        self.host = host
+
+    def environ(self, method, path, data=None):
+        body = urlencode(data or {}).encode() if method == 'POST' else b''
+        path, _, query = path.partition('?')
+        if method == 'GET' and data:
+            query = urlencode(data)
+        return {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': self.host,
+            'HTTP_COOKIE': '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items()),
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': BytesIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+    def request(self, method, path, data=None):
+        """Возвращает код ответа и заголовки; тело читается и выбрасывается."""
+        status, headers, _ = self.fetch(method, path, data)
+        return status, headers
+
+    def fetch(self, method, path, data=None):
+        """Как ``request``, но ещё и с размером тела в байтах."""
+        started = {}
+        size = 0
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = dict(headers)
+
+        result = self.application(self.environ(method, path, data),
+                                  start_response)
+        try:
+            for chunk in result:
+                size += len(chunk)
+        finally:
+            # close() шлёт request_finished и возвращает соединения с БД.
+            if hasattr(result, 'close'):
+                result.close()
+        return started['status'], started['headers'], size
+
+
+def load(task, requests, concurrency):
+    """Выполняет ``task(worker)`` ``requests`` раз в ``concurrency`` потоках.
+
+    Возвращает результаты вызовов, их тайминги в мс и общее время в
+    секундах.
+    """
+    def worker(index, count):
+        results, timings = [], []
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                results.append(task(index))
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            connections.close_all()
+        return results, timings
+
+    shares = [requests // concurrency + (index < requests % concurrency)
+              for index in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        done = list(pool.map(worker, range(concurrency), shares))
+    elapsed = time.perf_counter() - started
+    results = [result for worker_results, _ in done
+               for result in worker_results]
+    timings = [timing for _, worker_timings in done
+               for timing in worker_timings]
+    return results, timings, elapsed
@@ -0,0 +1,50 @@
+"""Бюджеты производительности для именованных URL.
+
+Файл ``settings.PERF_BUDGETS_FILE`` — JSON вида
+``{"posts:post": {"GET": {"queries": 5, "total_ms": 150}}}``: у GET и
+POST одного URL разная работа, поэтому бюджет задаётся для пары (view,
+метод). Ключи совпадают с полями замеров ``RequestMetrics``; превышение
+пишется в лог предупреждением, а тесты проверяют ``queries`` через
+``BudgetTestMixin``. Значения — замеры тестовых прогонов с запасом на
+холодный кэш, а не цели.
+"""
+import json
+
+from django.conf import settings
+
+# Время зависит от машины, поэтому в тестах сверяется только число запросов.
+TEST_ENFORCED = ('queries',)
+
+
+def load_budgets():
+    path = getattr(settings, 'PERF_BUDGETS_FILE', None)
+    if not path:
+        return {}
+    with open(path, encoding='utf-8') as budgets:
+        return json.load(budgets)
+
+
+def budget_for(budgets, view_name, method):
+    return budgets.get(view_name, {}).get(method)
+
+
+def exceeded(budget, record):
+    return sorted(key for key, limit in budget.items()
+                  if record.get(key, 0) > limit)
+
+
+class BudgetTestMixin:
+    """Проверки для ``TestCase``: ответ укладывается в бюджет своего URL."""
+
+    def assertWithinBudget(self, response):
+        record = response.perf_metrics
+        budget = budget_for(load_budgets(), record['view'],
+                            record['method'])
+        self.assertIsNotNone(
+            budget,
+            f'Для {record["view"]} {record["method"]} не задан бюджет')
+        enforced = {key: limit for key, limit in budget.items()
+                    if key in TEST_ENFORCED}
+        self.assertEqual(
+            exceeded(enforced, record), [],
+            f'{record["view"]}: {record} превышает бюджет {budget}')
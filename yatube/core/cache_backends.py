@@ -0,0 +1,369 @@
+"""Двухуровневый кэш: LRU в памяти процесса поверх общего файла SQLite.
+
+L2 — таблица в SQLite-файле, её видят все воркеры на машине, так что
+инвалидация в одном процессе сразу видна остальным. L1 — ограниченный по
+байтам LRU в каждом процессе. Каждая запись L2 несёт случайный штамп,
+который меняется при любой записи.
+
+Попадание в L1 отдаётся без чтения таблицы, пока файл не менялся другими
+соединениями: это видно по ``PRAGMA data_version``, который не читает
+страниц. Если менялся, поднимается эпоха L1, и записи старых эпох
+сверяются со штампами L2 одним запросом по первичному ключу; значение
+из L2 читается, только если штамп не совпал. Неизменяемые значения
+(строки фрагментов, числа версий тегов) хранятся в L1 уже распакованными.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoTierCache',
+            'LOCATION': '/var/lib/yatube/cache.sqlite3',
+            'OPTIONS': {'L1_MAX_BYTES': 8 * 1024 * 1024},
+        },
+    }
+"""
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        stamp INTEGER NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+# Сколько записей в L2 делать между проверками переполнения.
+CULL_EVERY = 100
+# Ниже лимита SQLite на число параметров в запросе (999 в старых сборках).
+CHUNK = 500
+# Эти значения не меняются на месте: L1 отдаёт их без распаковки.
+IMMUTABLE = (str, bytes, int, float, type(None))
+
+
+def chunks(items):
+    for start in range(0, len(items), CHUNK):
+        yield items[start:start + CHUNK]
+
+
+class Entry:
+    __slots__ = ('stamp', 'expires', 'blob', 'value', 'epoch')
+
+    def __init__(self, stamp, expires, blob, value, epoch):
+        self.stamp = stamp
+        self.expires = expires
+        self.blob = blob
+        self.value = value
+        self.epoch = epoch
+
+    def load(self):
+        if isinstance(self.value, IMMUTABLE):
+            return self.value
+        # Изменяемое значение распаковывается заново: вызывающий может
+        # поменять полученный объект.
+        return pickle.loads(self.blob)
+
+
+class LRU:
+    """Словарь с вытеснением давно не читанных записей по сумме байтов."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self._pop(key)
+            # Одна большая запись не должна вымывать весь L1.
+            if len(entry.blob) > self.max_bytes // 8:
+                return
+            self.entries[key] = entry
+            self.size += len(entry.blob)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.blob)
+
+    def pop(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.blob)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self.l1 = LRU(options.get('L1_MAX_BYTES', 8 * 1024 * 1024))
+        self._local = threading.local()
+        self._writes = 0
+        self._epoch = 0
+        self._epoch_lock = threading.Lock()
+
+    # Соединения: своё на каждый поток и процесс (после fork — новое).
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None,
+                check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.data_version = None
+        return connection
+
+    def _current_epoch(self):
+        """Эпоха L1; растёт, если файл менялся чужими соединениями.
+
+        ``data_version`` соединения меняется после коммита любого другого
+        соединения — другого воркера или другого потока этого процесса.
+        Свои записи процесс и так кладёт в L1.
+        """
+        connection = self._connection()
+        version, = connection.execute('PRAGMA data_version').fetchone()
+        with self._epoch_lock:
+            if version != self._local.data_version:
+                self._local.data_version = version
+                self._epoch += 1
+            return self._epoch
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция с блокировкой на запись сразу: для read-modify-write."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _alive(expires, now):
+        return expires is None or expires > now
+
+    def _remember(self, key, stamp, expires, blob, value, epoch):
+        self.l1.put(key, Entry(stamp, expires, blob, value, epoch))
+
+    def _lookup(self, keys):
+        """Возвращает ``{key: значение}`` для живых ключей."""
+        now = time.time()
+        # Эпоха берётся до чтения штампов: запись, пришедшая позже,
+        # поднимет её, и сверенные сейчас записи проверятся снова.
+        epoch = self._current_epoch()
+        found, check = self._lookup_l1(keys, epoch, now)
+        if check:
+            connection = self._connection()
+            stale = self._check_stamps(connection, check, epoch, now, found)
+            self._load(connection, stale, epoch, now, found)
+        return found
+
+    def _lookup_l1(self, keys, epoch, now):
+        """Попадания текущей эпохи и ``{key: запись L1 или None}`` к сверке."""
+        found = {}
+        check = {}
+        for key in keys:
+            entry = self.l1.get(key)
+            if entry is None:
+                check[key] = None
+            elif not self._alive(entry.expires, now):
+                self.l1.pop(key)
+            elif entry.epoch == epoch:
+                found[key] = entry.load()
+            else:
+                check[key] = entry
+        return found, check
+
+    def _check_stamps(self, connection, check, epoch, now, found):
+        """Сверяет записи L1 со штампами L2; возвращает ключи к чтению."""
+        stale = []
+        seen = set()
+        for part in chunks(list(check)):
+            placeholders = ', '.join('?' * len(part))
+            for key, stamp, expires in connection.execute(
+                    f'SELECT key, stamp, expires FROM cache '
+                    f'WHERE key IN ({placeholders})', part):
+                seen.add(key)
+                entry = check[key]
+                if not self._alive(expires, now):
+                    self.l1.pop(key)
+                elif entry is not None and entry.stamp == stamp:
+                    entry.epoch = epoch
+                    found[key] = entry.load()
+                else:
+                    stale.append(key)
+        for key in check.keys() - seen:
+            self.l1.pop(key)
+        return stale
+
+    def _load(self, connection, keys, epoch, now, found):
+        """Читает значения ``keys`` из L2 и кладёт их в L1."""
+        for part in chunks(keys):
+            placeholders = ', '.join('?' * len(part))
+            for key, blob, expires, stamp in connection.execute(
+                    f'SELECT key, value, expires, stamp FROM cache '
+                    f'WHERE key IN ({placeholders})', part):
+                if self._alive(expires, now):
+                    value = pickle.loads(blob)
+                    self._remember(key, stamp, expires, blob, value, epoch)
+                    found[key] = value
+
+    def _store(self, connection, key, value, timeout):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        stamp = secrets.randbits(62)
+        # Эпоха до записи: чужая запись того же ключа после нашей поднимет
+        # её, и L1 сверится с L2.
+        epoch = self._epoch
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, stamp) '
+            'VALUES (?, ?, ?, ?)', (key, blob, expires, stamp))
+        self._remember(key, stamp, expires, blob, value, epoch)
+        self._writes += 1
+        if self._writes % CULL_EVERY == 0:
+            self._cull(connection)
+
+    def _cull(self, connection):
+        connection.execute('DELETE FROM cache WHERE expires <= ?',
+                           (time.time(),))
+        # Каждая запись, incr и touch получают rowid больше всех
+        # существующих, поэтому в таблице остаются MAX_ENTRIES последних
+        # изменённых записей — без подсчёта строк, по индексу rowid.
+        # Часто меняемые версии тегов и корзины лимитов не вытесняются.
+        connection.execute(
+            'DELETE FROM cache WHERE rowid <= '
+            '(SELECT max(rowid) FROM cache) - ?', (self._max_entries,))
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._lookup([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        return {made[key]: value
+                for key, value in self._lookup(list(made)).items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._store(self._connection(), key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._transaction() as connection:
+            for key, value in data.items():
+                self._store(connection, self._key(key, version), value,
+                            timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and self._alive(row[0], time.time()):
+                return False
+            self._store(connection, key, value, timeout)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: чтение и запись под одной
+        блокировкой. Строка вставляется заново, с новым rowid (см. _cull).
+        """
+        key = self._key(key, version)
+        epoch = self._epoch
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or not self._alive(row[1], time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            stamp = secrets.randbits(62)
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires, stamp) '
+                'VALUES (?, ?, ?, ?)', (key, blob, row[1], stamp))
+        self._remember(key, stamp, row[1], blob, value, epoch)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        touched = self._connection().execute(
+            'UPDATE cache SET expires = ?, '
+            'rowid = (SELECT max(rowid) + 1 FROM cache) WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())).rowcount
+        self.l1.pop(key)
+        return bool(touched)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+        return row is not None and self._alive(row[0], time.time())
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self.l1.pop(key)
+        return bool(self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', (key,)).rowcount)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        for key in keys:
+            self.l1.pop(key)
+        for part in chunks(keys):
+            placeholders = ', '.join('?' * len(part))
+            self._connection().execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', part)
+
+    def clear(self):
+        self.l1.clear()
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединения живут весь процесс: открывать SQLite на каждый запрос
+        # дороже, чем держать его.
+        pass
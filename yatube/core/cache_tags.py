@@ -0,0 +1,74 @@
+"""Версии тегов для фрагментного кэша.
+
+У каждого тега (``feed``, ``group:1``, ``author:2`` …) в кэше лежит номер
+версии. Ключ фрагмента включает версии всех его тегов, поэтому
+``invalidate_tags`` делает устаревшими только зависящие от тега фрагменты,
+не перебирая их.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .db_routers import replica_epoch
+
+TAG_KEY = 'tag-version:{}'
+
+
+def tag_versions(*tags):
+    keys = [TAG_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    for tag in tags:
+        key = TAG_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Версия вытеснена из кэша: новая метка времени не совпадёт
+            # ни с одной из прежних версий.
+            cache.set(key, time.time_ns(), None)
+
+
+def fragment_cache(request, *tags):
+    """Контекст для ``{% cache cache_timeout name cache_vary %}``."""
+    page = request.GET.get('cursor') or request.GET.get('page') or ''
+    versions = tag_versions(*tags)
+    vary = ';'.join(f'{tag}={version}'
+                    for tag, version in zip(tags, versions))
+    epoch = replica_epoch()
+    if epoch:
+        return {
+            'cache_timeout': settings.REPLICA_PIN_SECONDS,
+            'cache_vary': f'{page}|{vary}|{epoch}',
+        }
+    return {
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_vary': f'{page}|{vary}',
+    }
+
+
+def tags_etag(request, *tags):
+    """Слабый ETag страницы по версиям её тегов, без запросов к БД.
+
+    В него входят путь с параметрами и cookie сессии и CSRF: страница
+    зависит от пользователя, а вход и выход меняют сессию. Страницы с
+    реплики получают свой ETag (см. ``replica_epoch``).
+    """
+    parts = [
+        settings.ETAG_SALT,
+        request.get_full_path(),
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        *map(str, tag_versions(*tags)),
+        replica_epoch(),
+    ]
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'W/"{digest}"'
@@ -0,0 +1,14 @@
+"""sqlite3 Django, у которого ``atomic`` сразу берёт блокировку записи.
+
+Стандартный ``BEGIN`` откладывает блокировку до первой записи. Если
+транзакция сначала читает (``get_or_create``, ``update_or_create``), а
+другой процесс тем временем пишет, повышение до записи падает с
+«database is locked» сразу, не дожидаясь ``busy_timeout``. ``BEGIN
+IMMEDIATE`` ждёт блокировку в начале транзакции, где ожидание работает.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
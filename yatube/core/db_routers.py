@@ -0,0 +1,101 @@
+"""Чтение с реплик, запись в основную базу.
+
+Роутер смотрит на состояние текущего запроса, которое выставляет
+``core.middleware.ReplicaRoutingMiddleware``: GET без метки «читать с
+основной» получает одну случайную реплику на весь запрос; с неё
+читаются только модели ``settings.REPLICA_APPS``. Вне запроса
+(команды, фоновые задачи) и в запросах, которые пишут, всё идёт в
+``default``. Любая запись внутри запроса переключает его оставшиеся
+чтения на основную базу, а ответ ставит cookie, по которой следующие
+``REPLICA_PIN_SECONDS`` секунд чтения этого клиента тоже идут туда: так
+пользователь видит свой пост или комментарий сразу, даже если реплика
+отстаёт.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+@dataclass
+class RoutingState:
+    read_alias: str = DEFAULT_DB_ALIAS
+    wrote: bool = False
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+def begin(use_replica):
+    """Начинает маршрутизацию запроса; возвращает токен для ``end``."""
+    replicas = settings.DATABASE_REPLICAS
+    alias = random.choice(replicas) if use_replica and replicas \
+        else DEFAULT_DB_ALIAS
+    return _state.set(RoutingState(read_alias=alias))
+
+
+def end(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+@contextmanager
+def resumed(state):
+    """Возвращает маршрутизацию запроса на время шага потокового ответа."""
+    token = _state.set(state)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def replica_epoch():
+    """Метка для ключей кэша и ETag, собранных по данным реплики.
+
+    Пусто, если запрос читает с основной базы. Иначе — реплика и номер
+    окна в ``REPLICA_PIN_SECONDS``: собранное по отстающей копии не
+    достаётся клиентам, читающим с основной базы, и живёт не дольше
+    окна, за которое реплика обязана догнать основную базу.
+    """
+    state = _state.get()
+    if state is None or state.read_alias == DEFAULT_DB_ALIAS:
+        return ''
+    window = int(time.time() // settings.REPLICA_PIN_SECONDS)
+    return f'{state.read_alias}:{window}'
+
+
+def in_pool(alias):
+    return alias == DEFAULT_DB_ALIAS or alias in settings.DATABASE_REPLICAS
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (state is None
+                or model._meta.app_label not in settings.REPLICA_APPS):
+            return DEFAULT_DB_ALIAS
+        return state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Дальше в этом запросе читаем своё же, а не отстающую копию.
+            state.read_alias = DEFAULT_DB_ALIAS
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if in_pool(obj1._state.db) and in_pool(obj2._state.db):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики — копии основной базы, схема приходит вместе с данными.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,134 @@
+"""Замеры запроса: SQL, рендер шаблонов и обращения к кэшу.
+
+Счётчики копятся в ``RequestMetrics`` текущего потока. SQL считается через
+``connection.execute_wrapper``; рендер шаблонов и чтения из кэша — обёртками
+над ``Template.render`` и ``get``/``get_many`` бэкендов кэша, которые
+ставятся один раз при создании ``PerformanceMiddleware``.
+"""
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.base import Template
+
+_local = threading.local()
+_installed = False
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.total_ms = 0.0
+        self._render_depth = 0
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'sql_ms': round(self.sql_ms, 3),
+            'template_ms': round(self.template_ms, 3),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'total_ms': round(self.total_ms, 3),
+        }
+
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+def start():
+    _local.metrics = RequestMetrics()
+    return _local.metrics
+
+
+def resume(metrics):
+    """Возвращает замер потоку: потоковый ответ дочитывается после view."""
+    _local.metrics = metrics
+
+
+def stop():
+    metrics = current()
+    _local.metrics = None
+    return metrics
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    metrics = current()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql_ms += (time.perf_counter() - started) * 1000
+
+
+def _wrap_render(render):
+    @functools.wraps(render)
+    def wrapper(self, context):
+        metrics = current()
+        if metrics is None or metrics._render_depth:
+            # Вложенные {% include %} уже учтены во внешнем рендере.
+            return render(self, context)
+        metrics._render_depth += 1
+        started = time.perf_counter()
+        sql_before = metrics.sql_ms
+        try:
+            return render(self, context)
+        finally:
+            metrics._render_depth -= 1
+            elapsed = (time.perf_counter() - started) * 1000
+            # Ленивые querysets выполняются во время рендера: их время
+            # уже учтено в sql_ms.
+            metrics.template_ms += elapsed - (metrics.sql_ms - sql_before)
+    return wrapper
+
+
+def _wrap_get(get):
+    @functools.wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        value = get(self, key, default=default, version=version)
+        metrics = current()
+        if metrics is not None:
+            if value is default:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _wrap_get_many(get_many):
+    @functools.wraps(get_many)
+    def wrapper(self, keys, version=None):
+        metrics = current()
+        # Базовый get_many вызывает get по ключу: не считаем дважды.
+        _local.metrics = None
+        try:
+            found = get_many(self, keys, version=version)
+        finally:
+            _local.metrics = metrics
+        if metrics is not None:
+            metrics.cache_hits += len(found)
+            metrics.cache_misses += len(keys) - len(found)
+        return found
+    return wrapper
+
+
+def install():
+    """Оборачивает рендер и кэш; повторный вызов ничего не делает."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    Template.render = _wrap_render(Template.render)
+    for backend in {type(caches[alias]) for alias in settings.CACHES}:
+        backend.get = _wrap_get(backend.get)
+        backend.get_many = _wrap_get_many(backend.get_many)
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import profiling
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Выдаёт сотруднику токен профилирования: запрос с параметром '
+            f'{profiling.QUERY_PARAM}=<токен> или заголовком X-Profile-Token '
+            'пишет профиль в PROFILE_DIR.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["username"]}')
+        if not user.is_staff:
+            raise CommandError(f'{user.username} не сотрудник (is_staff)')
+        self.stdout.write(profiling.make_token(user))
+        self.stderr.write(
+            f'Действует {settings.PROFILE_TOKEN_MAX_AGE // 60} мин.; '
+            f'профили — в {settings.PROFILE_DIR}')
@@ -0,0 +1,40 @@
+import os
+import sqlite3
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+def replica_path(alias):
+    name = settings.DATABASES[alias]['NAME']
+    return unquote(urlparse(name).path) if name.startswith('file:') else name
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик из '
+            'DATABASE_REPLICAS — для проверки чтения с реплик локально.')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: задайте '
+                               'YATUBE_DB_REPLICAS.')
+        source = sqlite3.connect(settings.DATABASES[DEFAULT_DB_ALIAS]['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                path = replica_path(alias)
+                # Копия собирается рядом и подменяет файл целиком: читатели
+                # видят либо старый снимок, либо новый, но не половину.
+                temporary = f'{path}.sync'
+                target = sqlite3.connect(temporary)
+                try:
+                    source.backup(target)
+                    # Реплику открывают только на чтение: WAL ей не нужен.
+                    target.execute('PRAGMA journal_mode=DELETE')
+                finally:
+                    target.close()
+                os.replace(temporary, path)
+                self.stdout.write(f'{alias}: {path}')
+        finally:
+            source.close()
@@ -0,0 +1,200 @@
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from . import db_routers, instrumentation, profiling, ratelimit
+from .budgets import budget_for, exceeded, load_budgets
+
+logger = logging.getLogger('yatube.perf')
+
+
+class PerformanceMiddleware:
+    """Считает SQL, рендер и кэш для каждого URL и сверяет с бюджетом.
+
+    Итог пишется одной JSON-строкой в лог ``yatube.perf``, при
+    ``PERF_HEADERS`` — ещё и в заголовок ``Server-Timing``. Потоковый
+    ответ замеряется, пока его не дочитают: запись в лог появляется после
+    последней порции, а заголовки отражают только работу до ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrumentation.install()
+        self.budgets = load_budgets()
+
+    def __call__(self, request):
+        metrics = instrumentation.start()
+        started = time.perf_counter()
+        with measuring(metrics):
+            response = self.get_response(request)
+        match = request.resolver_match
+        record = {'view': match.view_name if match else None,
+                  'method': request.method, 'status': response.status_code}
+        response.perf_metrics = record
+        if response.streaming:
+            response.streaming_content = self.measure_stream(
+                response.streaming_content, metrics, record, started)
+        else:
+            self.finish(metrics, record, started)
+        if settings.PERF_HEADERS:
+            response['Server-Timing'] = server_timing(metrics)
+            response['X-Query-Count'] = str(metrics.queries)
+        return response
+
+    def measure_stream(self, content, metrics, record, started):
+        try:
+            yield from iterate_within(content, lambda: measuring(metrics))
+        except Exception:
+            # Заголовки с кодом уже ушли: сервер оборвёт соединение, а в
+            # лог попадёт, что ответ не дописан.
+            record['stream_error'] = True
+            raise
+        finally:
+            self.finish(metrics, record, started)
+
+    def finish(self, metrics, record, started):
+        metrics.total_ms = (time.perf_counter() - started) * 1000
+        record.update(metrics.as_dict())
+        over = self.over_budget(record['view'], record['method'], record)
+        if over:
+            record['over_budget'] = over
+        if settings.PERF_LOG:
+            if record.get('stream_error'):
+                level = logging.ERROR
+            else:
+                level = logging.WARNING if over else logging.INFO
+            logger.log(level, json.dumps(record))
+
+    def over_budget(self, view_name, method, record):
+        return exceeded(
+            budget_for(self.budgets, view_name, method) or {}, record)
+
+
+@contextmanager
+def measuring(metrics):
+    """Замер ``metrics`` активен в потоке, SQL всех баз считается."""
+    instrumentation.resume(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(
+                    instrumentation.sql_wrapper))
+            yield
+    finally:
+        instrumentation.stop()
+
+
+def iterate_within(iterable, context):
+    """Отдаёт элементы ``iterable``, вычисляя каждый внутри ``context()``.
+
+    Генератор потокового ответа работает уже после выхода из middleware;
+    так его запросы идут в том же замере и к той же базе, что и view.
+    """
+    iterator = iter(iterable)
+    while True:
+        with context():
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def server_timing(metrics):
+    return ', '.join([
+        f'sql;dur={metrics.sql_ms:.1f};desc="{metrics.queries} queries"',
+        f'tpl;dur={metrics.template_ms:.1f}',
+        f'cache;desc="hits={metrics.cache_hits} '
+        f'misses={metrics.cache_misses}"',
+        f'total;dur={metrics.total_ms:.1f}',
+    ])
+
+
+class ProfilingMiddleware:
+    """Снимает профиль запроса по токену сотрудника или по доле трафика.
+
+    Стоит сразу за ``PerformanceMiddleware``: число SQL-запросов берётся
+    из его замеров. Запросу с токеном имя файла профиля возвращается в
+    заголовке ``X-Profile``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = profiling.requested(request)
+        if reason is None:
+            return self.get_response(request)
+        metrics = instrumentation.current()
+        queries = metrics.queries if metrics else None
+        started = time.perf_counter()
+        with profiling.Sampler(threading.get_ident(),
+                               settings.PROFILE_INTERVAL) as sampler:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        if metrics:
+            queries = metrics.queries - queries
+        match = request.resolver_match
+        try:
+            name = profiling.write(sampler, match and match.view_name,
+                                   request.method, queries, total_ms)
+        except OSError:
+            logger.exception('Не удалось сохранить профиль запроса')
+            return response
+        if reason == 'token':
+            response['X-Profile'] = name
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Отправляет чтения GET на реплики, кроме недавно писавших клиентов.
+
+    Запросы, которые что-то записали, ставят cookie
+    ``REPLICA_PIN_COOKIE``: пока она жива, клиент читает с основной базы.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replica = (request.method in ('GET', 'HEAD')
+                       and settings.REPLICA_PIN_COOKIE not in request.COOKIES)
+        token = db_routers.begin(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = db_routers.end(token)
+        if response.streaming:
+            # Писать из потока нельзя (cookie уже не поставить), а читать
+            # он должен оттуда же, откуда читал view.
+            response.streaming_content = iterate_within(
+                response.streaming_content,
+                lambda: db_routers.resumed(state))
+        if settings.DATABASE_REPLICAS and (
+                state.wrote or request.method not in ('GET', 'HEAD')):
+            response.set_cookie(settings.REPLICA_PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class RateLimitMiddleware:
+    """Отвечает 429 на запросы сверх ``settings.RATE_LIMITS``.
+
+    Проверка идёт в ``process_view``: имя URL уже известно, а view ещё
+    не вызван.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        return ratelimit.check(request)
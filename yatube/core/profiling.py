@@ -0,0 +1,200 @@
+"""Профилирование отдельных запросов семплированием стека.
+
+Запрос профилируется, если в нём есть подписанный токен — параметр
+``profile_token`` или заголовок ``X-Profile-Token`` (выдаёт команда
+``profile_token`` сотрудникам с ``is_staff``), — либо случайно, с
+вероятностью ``settings.PROFILE_SAMPLE_RATE``. Токен действует, только
+пока его владелец — активный сотрудник: это проверяется на каждом
+запросе с токеном. Остальные запросы платят только за проверку токена.
+
+Пока идёт профилируемый запрос, отдельный поток раз в
+``PROFILE_INTERVAL`` секунд снимает стек потока запроса через
+``sys._current_frames()``; трассировки и ``sys.setprofile`` нет, поэтому
+сам запрос почти не замедляется. Профиль пишется в ``PROFILE_DIR`` в
+формате speedscope (JSON, открывается на speedscope.app) или collapsed
+stacks для flamegraph.pl; имя файла несёт имя URL, число SQL-запросов и
+время ответа. В каталоге хранятся только ``PROFILE_MAX_FILES`` последних
+профилей, старые удаляются при записи новых.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+
+SALT = 'core.profiling'
+QUERY_PARAM = 'profile_token'
+HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+_labels = {}
+
+
+def make_token(user):
+    """Токен, включающий профилирование на ``PROFILE_TOKEN_MAX_AGE``."""
+    return signing.TimestampSigner(salt=SALT).sign(user.get_username())
+
+
+def requested(request):
+    """Причина профилировать запрос: ``'token'``, ``'sampled'`` или None."""
+    token = request.GET.get(QUERY_PARAM) or request.META.get(HEADER)
+    if token:
+        try:
+            username = signing.TimestampSigner(salt=SALT).unsign(
+                token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            return None
+        # Уволенный или лишённый is_staff сотрудник теряет доступ сразу,
+        # а не когда истечёт токен.
+        User = get_user_model()
+        if not User._default_manager.filter(
+                is_active=True, is_staff=True,
+                **{User.USERNAME_FIELD: username}).exists():
+            return None
+        return 'token'
+    rate = settings.PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        return 'sampled'
+    return None
+
+
+class Sampler:
+    """Снимает стек потока ``thread_id``, пока открыт контекст."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        # Стек от корня к листу (кортеж code) → число снимков и их время.
+        self.counts = Counter()
+        self.weights = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='profile-sampler')
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack = tuple(reversed(stack))
+            self.counts[stack] += 1
+            self.weights[stack] += (now - last) * 1000
+            last = now
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(settings.BASE_DIR):
+            path = os.path.relpath(path, settings.BASE_DIR)
+        else:
+            path = os.path.join(*path.split(os.sep)[-2:])
+        # «;» разделяет кадры в collapsed stacks.
+        label = _labels[code] = (
+            f'{code.co_name} ({path}:{code.co_firstlineno})'
+            .replace(';', ':'))
+    return label
+
+
+def collapsed(sampler):
+    """Профиль в формате collapsed stacks: «кадр;кадр;... число»."""
+    return ''.join(
+        f'{";".join(_label(code) for code in stack)} {count}\n'
+        for stack, count in sorted(sampler.counts.items(),
+                                   key=lambda item: -item[1]))
+
+
+def speedscope(sampler, name, total_ms):
+    """Профиль типа sampled в формате speedscope, веса — в мс."""
+    frames = []
+    index = {}
+    samples = []
+    for stack in sampler.weights:
+        sample = []
+        for code in stack:
+            if code not in index:
+                index[code] = len(frames)
+                frames.append({'name': code.co_name,
+                               'file': code.co_filename,
+                               'line': code.co_firstlineno})
+            sample.append(index[code])
+        samples.append(sample)
+    weights = [round(weight, 3) for weight in sampler.weights.values()]
+    return json.dumps({
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'exporter': 'yatube',
+        'name': name,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': round(total_ms, 3),
+            'samples': samples,
+            'weights': weights,
+        }],
+    })
+
+
+def write(sampler, view_name, method, queries, total_ms):
+    """Сохраняет профиль в ``PROFILE_DIR`` и возвращает имя файла."""
+    tags = [view_name or 'unresolved', method, f'{total_ms:.0f}ms']
+    if queries is not None:
+        tags.append(f'{queries}q')
+    # Наносекунды в имени разводят профили, снятые в одну секунду.
+    name = '-'.join([time.strftime('%Y%m%d-%H%M%S'),
+                     f'{time.time_ns() % 10**9:09d}',
+                     *(re.sub(r'[^\w.-]', '_', tag) for tag in tags)])
+    if settings.PROFILE_FORMAT == 'collapsed':
+        name += '.collapsed.txt'
+        content = collapsed(sampler)
+    else:
+        name += '.speedscope.json'
+        content = speedscope(
+            sampler, f'{view_name} {method} {total_ms:.1f} ms, '
+                     f'{queries} queries', total_ms)
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(settings.PROFILE_DIR, name), 'w') as file:
+        file.write(content)
+    rotate()
+    return name
+
+
+def rotate():
+    """Удаляет старые профили сверх ``PROFILE_MAX_FILES``; 0 — без предела.
+
+    Имена начинаются с времени записи, поэтому старые — первые по
+    алфавиту.
+    """
+    if settings.PROFILE_MAX_FILES <= 0:
+        return
+    names = sorted(name for name in os.listdir(settings.PROFILE_DIR)
+                   if name.endswith(('.speedscope.json', '.collapsed.txt')))
+    for name in names[:-settings.PROFILE_MAX_FILES]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, name))
+        except FileNotFoundError:
+            # Соседний воркер уже удалил его.
+            pass
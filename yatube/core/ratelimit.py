@@ -0,0 +1,72 @@
+"""Ограничение частоты запросов: token bucket в общем кэше.
+
+Ведро заводится на пару «имя URL + пользователь», у анонимов вместо
+пользователя — IP. Настройки берутся из ``settings.RATE_LIMITS``: в ведре
+``burst`` жетонов, пустое ведро наполняется целиком за ``per`` секунд.
+Каждый запрос забирает жетон; если забирать нечего, ``RateLimitMiddleware``
+отвечает 429 до вызова view — без разбора формы и запросов к БД.
+
+Ведро хранится одним числом: моментом в мс, когда оно снова станет полным
+(GCRA). Запрос сдвигает этот момент атомарным ``cache.incr`` на цену
+жетона и проходит, если долг не больше ёмкости ведра; отказ возвращает
+сдвиг обратно. Ключ живёт ровно до этого момента, поэтому полное ведро —
+это просто отсутствующий ключ, и копить жетоны впрок нельзя.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+def take(key, burst, per):
+    """Забирает жетон из ведра ``key``.
+
+    Возвращает 0, если жетон был, иначе — сколько секунд ждать следующего.
+    """
+    price = per * 1000 // burst
+    capacity = price * burst
+    now = int(time.time() * 1000)
+    if cache.add(key, now + price, price / 1000):
+        return 0
+    try:
+        full_at = cache.incr(key, price)
+    except ValueError:
+        # Ключ истёк между add и incr: ведро успело наполниться.
+        cache.set(key, now + price, price / 1000)
+        return 0
+    debt = full_at - now
+    if debt > capacity:
+        cache.decr(key, price)
+        return (debt - capacity) / 1000
+    # Гонка двух touch может укоротить жизнь ключа не больше чем на цену
+    # жетона: ведро тогда наполнится чуть раньше, но не переполнится.
+    cache.touch(key, debt / 1000)
+    return 0
+
+
+def client_key(request):
+    """Пользователь из сессии без запроса к таблице пользователей."""
+    user_id = request.session.get(SESSION_KEY)
+    if user_id:
+        return f'user:{user_id}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def check(request):
+    """Ответ 429, если ведро запроса пусто; иначе ``None``."""
+    match = request.resolver_match
+    limit = settings.RATE_LIMITS.get(match.view_name) if match else None
+    if limit is None or request.method not in limit['methods']:
+        return None
+    wait = take(f'ratelimit:{match.view_name}:{client_key(request)}',
+                limit['burst'], limit['per'])
+    if not wait:
+        return None
+    response = HttpResponse('Слишком много запросов, попробуйте позже.',
+                            status=429,
+                            content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
@@ -0,0 +1,27 @@
+"""Профили соединений SQLite.
+
+Профиль выбирается переменной ``YATUBE_DB_PROFILE`` (см.
+``settings.DB_PROFILES``). Прагмы профиля выполняются на каждом новом
+соединении из сигнала ``connection_created`` напрямую через драйвер,
+мимо обёрток Django: они не попадают в счётчики запросов. Реплики
+открыты только на чтение, поэтому прагмы записи к ним не применяются.
+"""
+from django.conf import settings
+
+# Прагмы, которые меняют файл базы или нужны только пишущим.
+WRITE_PRAGMAS = {'journal_mode', 'synchronous', 'wal_autocheckpoint'}
+
+
+def profile_pragmas(alias):
+    pragmas = settings.DB_PROFILES[settings.DB_PROFILE]['PRAGMAS']
+    if alias in settings.DATABASE_REPLICAS:
+        return {name: value for name, value in pragmas.items()
+                if name not in WRITE_PRAGMAS}
+    return pragmas
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in profile_pragmas(connection.alias).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,112 @@
+"""Холодный старт воркера.
+
+``warm_up`` — хук предзагрузки: при ``settings.WSGI_PRELOAD``
+(``YATUBE_WSGI_PRELOAD=1``) его вызывает ``yatube/wsgi.py``, и работа,
+которую иначе делает первый запрос, выполняется до приёма трафика.
+Соединения с БД и кэшем хук не открывает: при ``--preload`` у gunicorn
+он работает в мастере до fork, а сокеты SQLite через fork не делятся.
+
+Запуск модуля как скрипта — один замер холодного процесса для команды
+``bench_startup``. Django импортируется только внутри замера; между
+фазами в stderr пишутся метки, по которым разбирается вывод
+``python -X importtime``.
+"""
+import json
+import sys
+import time
+
+PHASE_MARKER = 'yatube-startup-phase:'
+PHASES = ('settings', 'setup', 'wsgi')
+
+
+def warm_up():
+    """Компилирует шаблоны проекта и заполняет кэши URL-резолвера.
+
+    Возвращает число скомпилированных шаблонов и обойденных резолверов.
+    """
+    import os
+
+    from django.template import engines
+    from django.urls import URLResolver, get_resolver
+
+    from posts import cards
+
+    templates = 0
+    for engine in engines.all():
+        for directory in engine.engine.dirs:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if name.endswith('.html'):
+                        # С кэширующим загрузчиком скомпилированный шаблон
+                        # остаётся в процессе; без него прогреваются только
+                        # импорты библиотек тегов.
+                        engine.get_template(os.path.relpath(
+                            os.path.join(root, name), directory))
+                        templates += 1
+    resolvers = 0
+    pending = [get_resolver()]
+    while pending:
+        resolver = pending.pop()
+        # reverse_dict строит таблицы reverse() для резолвера и его
+        # вложенных include без пространства имён.
+        resolver.reverse_dict
+        resolvers += 1
+        pending.extend(pattern for pattern in resolver.url_patterns
+                       if isinstance(pattern, URLResolver))
+    cards.url_parts()
+    return {'templates': templates, 'resolvers': resolvers}
+
+
+def _phase(name):
+    print(PHASE_MARKER + name, file=sys.stderr, flush=True)
+
+
+def probe(paths, warm_requests):
+    """Замеряет фазы старта, первые и тёплые запросы; время в мс."""
+    clock = time.perf_counter
+    timings = {}
+    started = last = clock()
+
+    def mark(name):
+        nonlocal last
+        now = clock()
+        timings[name] = round((now - last) * 1000, 3)
+        last = now
+
+    import os
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    _phase('settings')
+    import django
+    from django.conf import settings
+    settings.INSTALLED_APPS
+    mark('settings')
+    _phase('setup')
+    django.setup(set_prefix=False)
+    mark('setup')
+    _phase('wsgi')
+    from yatube.wsgi import application
+    mark('wsgi')
+    startup = round((last - started) * 1000, 3)
+    _phase('first_request')
+    from core.benchmark import WSGIClient
+    client = WSGIClient(application)
+    first = {}
+    for path in paths:
+        begin = clock()
+        status, _, _ = client.fetch('GET', path)
+        first[path] = round((clock() - begin) * 1000, 3)
+        if status != 200:
+            raise RuntimeError(f'{path}: {status}')
+    _phase('warm_request')
+    warm = []
+    for _ in range(warm_requests):
+        for path in paths:
+            begin = clock()
+            client.fetch('GET', path)
+            warm.append(round((clock() - begin) * 1000, 3))
+    return {'phases': timings, 'startup_ms': startup,
+            'first_request_ms': first, 'warm_request_ms': warm}
+
+
+if __name__ == '__main__':
+    print(json.dumps(probe(sys.argv[2:], int(sys.argv[1]))))
@@ -0,0 +1,46 @@
+"""Окружение тестов: свои кэш и MEDIA_ROOT, без фоновых задач.
+
+Настройки сайта про тесты не знают: ``isolated`` подменяет их на время
+прогона. Для ``manage.py test`` его включает ``TestRunner``
+(``settings.TEST_RUNNER``), для pytest — корневой ``conftest.py``.
+``cache.clear()`` в ``setUp`` иначе стирал бы кэш сайта, а загрузки из
+тестов оставались бы в его ``media/``.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def isolated():
+    """Временный каталог под кэш и MEDIA_ROOT, удаляется на выходе."""
+    directory = tempfile.mkdtemp(prefix='yatube-test-')
+    cache = {**settings.CACHES['default'],
+             'LOCATION': os.path.join(directory, 'cache.sqlite3')}
+    try:
+        with override_settings(
+                CACHES={**settings.CACHES, 'default': cache},
+                MEDIA_ROOT=os.path.join(directory, 'media'),
+                # Миниатюры строятся только там, где тест их ждёт.
+                THUMBNAIL_WORKERS=0,
+                # Бюджеты в тестах проверяет BudgetTestMixin.
+                PERF_LOG=False):
+            yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._isolation = ExitStack()
+        self._isolation.enter_context(isolated())
+
+    def teardown_test_environment(self, **kwargs):
+        self._isolation.close()
+        super().teardown_test_environment(**kwargs)
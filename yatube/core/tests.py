@@ -0,0 +1,508 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import connection, router
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import get_resolver, reverse
+
+from core import profiling, ratelimit
+from core.cache_backends import TwoTierCache
+from core.db_backends.sqlite3.base import DatabaseWrapper
+from core.middleware import PerformanceMiddleware, ReplicaRoutingMiddleware
+from core.startup import PHASE_MARKER, warm_up
+from posts.management.commands.bench_startup import parse_imports
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+        # Два экземпляра на одном файле — как два воркера на одной машине.
+        self.first = self.backend()
+        self.second = self.backend()
+
+    def backend(self, **options):
+        return TwoTierCache(self.path, {'OPTIONS': options})
+
+    def test_write_in_one_process_is_seen_by_another(self):
+        """Запись и удаление в одном воркере видны другому сразу."""
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'new')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+        self.second.set_many({'a': 1, 'b': 2})
+        self.first.clear()
+        self.assertEqual(self.second.get_many(['a', 'b']), {})
+
+    def statements(self, cache, func):
+        connection = cache._connection()
+        statements = []
+        connection.set_trace_callback(statements.append)
+        try:
+            result = func()
+        finally:
+            connection.set_trace_callback(None)
+        return result, statements
+
+    def test_l1_hit_skips_table_read(self):
+        """Пока файл не менялся, L1 отдаёт значение без чтения таблицы."""
+        self.first.set('key', ['value'])
+        self.first.get('key')
+        self.assertIn(self.first.make_key('key'), self.first.l1.entries)
+        value, statements = self.statements(
+            self.first, lambda: self.first.get('key'))
+        self.assertEqual(value, ['value'])
+        self.assertEqual(statements, ['PRAGMA data_version'])
+        # Изменяемое значение отдаётся копией.
+        value.append('changed')
+        self.assertEqual(self.first.get('key'), ['value'])
+
+    def test_foreign_write_revalidates_l1_by_stamp(self):
+        """После чужой записи L1 сверяет штамп, но значение не читает."""
+        self.first.set('key', 'value')
+        self.first.set('other', 'x')
+        self.first.get('key')
+        self.second.set('other', 'y')
+        value, statements = self.statements(
+            self.first, lambda: self.first.get('key'))
+        self.assertEqual(value, 'value')
+        self.assertEqual(len(statements), 2)
+        self.assertNotIn('value', statements[1].split('FROM')[0])
+        self.assertEqual(self.first.get('other'), 'y')
+
+    def test_many_keys_and_bounded_size(self):
+        """get_many/delete_many не упираются в лимит параметров SQLite."""
+        cache = self.backend(MAX_ENTRIES=1500)
+        data = {f'key-{number}': number for number in range(2000)}
+        cache.set_many(data)
+        found = self.second.get_many(list(data))
+        # Остаются MAX_ENTRIES последних записей.
+        self.assertEqual(len(found), 1500)
+        self.assertEqual(found['key-1999'], 1999)
+        self.assertNotIn('key-0', found)
+        cache.delete_many(list(data))
+        self.assertEqual(self.second.get_many(list(data)), {})
+
+    def test_cull_keeps_recently_incremented_keys(self):
+        """incr и touch продлевают жизнь записи при вытеснении."""
+        cache = self.backend(MAX_ENTRIES=150)
+        cache.set('version', 1)
+        cache.set('bucket', 1)
+        for number in range(120):
+            cache.set(f'key-{number}', number)
+        cache.incr('version')
+        cache.touch('bucket')
+        for number in range(120, 200):
+            cache.set(f'key-{number}', number)
+        self.assertEqual(self.second.get('version'), 2)
+        self.assertEqual(self.second.get('bucket'), 1)
+        self.assertIsNone(self.second.get('key-0'))
+
+    def test_l1_is_bounded_by_bytes(self):
+        """L1 вытесняет старые записи, не выходя за лимит байтов."""
+        cache = self.backend(L1_MAX_BYTES=4096)
+        for number in range(100):
+            cache.set(f'key-{number}', 'x' * 200)
+        self.assertLessEqual(cache.l1.size, 4096)
+        self.assertNotIn(cache.make_key('key-0'), cache.l1.entries)
+        self.assertEqual(cache.get('key-0'), 'x' * 200)
+
+    def test_incr_is_atomic_across_instances(self):
+        """Параллельные incr из разных воркеров не теряют обновлений."""
+        self.first.set('counter', 0)
+        caches = [self.backend() for _ in range(4)]
+
+        def work(cache):
+            for _ in range(50):
+                cache.incr('counter')
+
+        threads = [threading.Thread(target=work, args=(cache,))
+                   for cache in caches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.second.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.first.incr('missing')
+
+    def test_expiry_and_add(self):
+        """Истёкшие записи не отдаются, add не перетирает живые."""
+        self.first.set('short', 1, timeout=0.05)
+        self.assertFalse(self.first.add('short', 2))
+        time.sleep(0.1)
+        self.assertIsNone(self.second.get('short'))
+        self.assertIsNone(self.first.get('short'))
+        self.assertTrue(self.second.add('short', 3))
+        self.assertEqual(self.first.get('short'), 3)
+        self.first.set('gone', 1, timeout=0)
+        self.assertFalse(self.first.has_key('gone'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, request, write=False):
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Post))
+            if write:
+                router.db_for_write(Post)
+                seen.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen, response.cookies.get(settings.REPLICA_PIN_COOKIE)
+
+    def test_get_reads_from_replica(self):
+        """Обычный GET читает с реплики и не ставит метку."""
+        seen, cookie = self.route(RequestFactory().get('/'))
+        self.assertEqual(seen, ['replica'])
+        self.assertIsNone(cookie)
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_writes_pin_reads_to_primary(self):
+        """После записи чтения — с основной базы, и в следующих запросах."""
+        seen, cookie = self.route(RequestFactory().get('/'), write=True)
+        self.assertEqual(seen, ['replica', 'default'])
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        seen, cookie = self.route(RequestFactory().post('/'))
+        self.assertEqual(seen, ['default'])
+        self.assertIsNotNone(cookie)
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        seen, _ = self.route(request)
+        self.assertEqual(seen, ['default'])
+
+    def test_only_post_models_read_from_replica(self):
+        """Сессии, пользователи и служебные таблицы — с основной базы."""
+        seen = {}
+
+        def view(request):
+            for model in (Post, Comment, User, Session, ContentType):
+                seen[model.__name__] = router.db_for_read(model)
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(seen, {'Post': 'replica', 'Comment': 'replica',
+                                'User': 'default', 'Session': 'default',
+                                'ContentType': 'default'})
+
+    def test_stream_reads_from_same_database(self):
+        """Генератор потокового ответа читает с той же реплики, что и view."""
+        seen = []
+
+        def stream():
+            seen.append(router.db_for_read(Post))
+            yield b''
+
+        response = ReplicaRoutingMiddleware(
+            lambda request: StreamingHttpResponse(stream()))(
+            RequestFactory().get('/'))
+        self.assertEqual(router.db_for_read(Post), 'default')
+        b''.join(response.streaming_content)
+        self.assertEqual(seen, ['replica'])
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_is_primary(self):
+        seen, cookie = self.route(RequestFactory().post('/'), write=True)
+        self.assertEqual(seen, ['default', 'default'])
+        self.assertIsNone(cookie)
+
+
+@override_settings(PERF_LOG=True)
+class PerformanceMiddlewareTests(TestCase):
+    def run_stream(self, *chunks):
+        def stream():
+            for chunk in chunks:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                yield chunk
+
+        response = PerformanceMiddleware(
+            lambda request: StreamingHttpResponse(stream()))(
+            RequestFactory().get('/'))
+        return response, response.streaming_content
+
+    def test_stream_is_measured_until_closed(self):
+        """Запросы из потока попадают в замер, лог — после конца потока."""
+        response, content = self.run_stream(b'a', b'b')
+        self.assertNotIn('queries', response.perf_metrics)
+        with self.assertLogs('yatube.perf', 'INFO') as logs:
+            self.assertEqual(b''.join(content), b'ab')
+        self.assertEqual(response.perf_metrics['queries'], 2)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['queries'],
+                         2)
+
+    def test_stream_error_is_logged(self):
+        """Оборванный поток не выглядит в логе успешным ответом."""
+        _, content = self.run_stream(b'a', ValueError('boom'))
+        with self.assertLogs('yatube.perf', 'ERROR') as logs, \
+                self.assertRaises(ValueError):
+            b''.join(content)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(record['stream_error'])
+        self.assertEqual(record['queries'], 1)
+
+
+@override_settings(DB_PROFILE='production')
+class SqliteProfileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'db.sqlite3')
+        self.database = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': self.path}, alias='profile')
+        self.addCleanup(self.database.close)
+
+    def pragma(self, name):
+        self.database.ensure_connection()
+        return self.database.connection.execute(
+            f'PRAGMA {name}').fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        """Прагмы профиля выполняются на каждом новом соединении."""
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 15_000)
+        self.assertEqual(self.pragma('cache_size'), -64_000)
+
+    def test_atomic_takes_write_lock_up_front(self):
+        """atomic берёт блокировку записи до первого запроса."""
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        other.execute('CREATE TABLE item (id INTEGER)')
+        other.commit()
+        # Так atomic открывает транзакцию в SQLite.
+        self.database.set_autocommit(
+            False, force_begin_transaction_with_broken_autocommit=True)
+        try:
+            with self.assertRaisesMessage(sqlite3.OperationalError,
+                                          'database is locked'):
+                other.execute('INSERT INTO item VALUES (1)')
+        finally:
+            self.database.rollback()
+            self.database.set_autocommit(True)
+
+
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_bucket_allows_burst_then_refills(self):
+        """Ведро отдаёт burst жетонов подряд и пополняется со временем."""
+        now = time.time()
+        with mock.patch('time.time', return_value=now):
+            waits = [ratelimit.take('bucket', 3, 30) for _ in range(4)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertAlmostEqual(waits[3], 10, places=2)
+        with mock.patch('time.time', return_value=now + 10):
+            self.assertEqual(ratelimit.take('bucket', 3, 30), 0)
+            self.assertGreater(ratelimit.take('bucket', 3, 30), 0)
+        # Долгий простой не копит жетоны сверх ёмкости.
+        with mock.patch('time.time', return_value=now + 3600):
+            waits = [ratelimit.take('bucket', 3, 30) for _ in range(4)]
+        self.assertEqual(waits.count(0), 3)
+
+    @override_settings(RATE_LIMITS={
+        'posts:add_comment': {'burst': 2, 'per': 60, 'methods': ('POST',)},
+    })
+    def test_over_limit_returns_429_before_view(self):
+        """Сверх лимита — 429 без формы и записи в БД."""
+        url = reverse('posts:add_comment', args=(self.post.pk,))
+        for _ in range(2):
+            self.assertEqual(
+                self.client.post(url, {'text': 'Да'}).status_code, 302)
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {'text': 'Да'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Comment.objects.count(), 2)
+
+    @override_settings(RATE_LIMITS={
+        'posts:add_comment': {'burst': 1, 'per': 60, 'methods': ('POST',)},
+    })
+    def test_buckets_are_per_client_and_endpoint(self):
+        url = reverse('posts:add_comment', args=(self.post.pk,))
+        self.client.post(url, {'text': 'Да'})
+        self.assertEqual(self.client.post(url, {'text': 'Да'}).status_code,
+                         429)
+        # Другой метод и другой маршрут не ограничены.
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.post(reverse('posts:post_create'),
+                                          {'text': 'Пост'}).status_code,
+                         302)
+        reader = Client()
+        reader.force_login(User.objects.create_user(username='reader'))
+        self.assertEqual(reader.post(url, {'text': 'Да'}).status_code, 302)
+        anonymous = Client(REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(anonymous.post(url).status_code, 302)
+        self.assertEqual(anonymous.post(url).status_code, 429)
+        self.assertEqual(Client(REMOTE_ADDR='10.0.0.2').post(url)
+                         .status_code, 302)
+
+
+class StartupTests(SimpleTestCase):
+    def test_warm_up_compiles_templates_and_urls(self):
+        """Прогрев оставляет шаблоны в кэширующем загрузчике."""
+        loader = engines['django'].engine.template_loaders[0]
+        loader.reset()
+        counts = warm_up()
+        self.assertGreaterEqual(counts['templates'], 20)
+        self.assertGreater(counts['resolvers'], 1)
+        self.assertIn('posts/index.html', loader.get_template_cache)
+        self.assertIn('posts', get_resolver().namespace_dict)
+
+    def test_parse_imports_splits_phases(self):
+        stderr = '\n'.join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |   encodings.idna',
+            f'{PHASE_MARKER}setup',
+            'import time:       300 |        300 |     django.utils.version',
+            'import time:        50 |        350 |   django',
+            'DeprecationWarning: шум, не строка импорта',
+            f'{PHASE_MARKER}first_request',
+            'import time:        70 |         70 | posts.views',
+        ])
+        self.assertEqual(parse_imports(stderr), {
+            'interpreter': [('encodings.idna', 120, 120)],
+            'setup': [('django.utils.version', 300, 300),
+                      ('django', 50, 350)],
+            'first_request': [('posts.views', 70, 70)],
+        })
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.post = Post.objects.create(author=cls.staff, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        profile_settings = override_settings(PROFILE_DIR=directory,
+                                             PROFILE_INTERVAL=0.001)
+        profile_settings.enable()
+        self.addCleanup(profile_settings.disable)
+        self.directory = directory
+        self.url = reverse('posts:post_detail', args=(self.post.pk,))
+
+    def token(self):
+        out = StringIO()
+        call_command('profile_token', 'staff', stdout=out, stderr=StringIO())
+        return out.getvalue().strip()
+
+    def test_signed_token_writes_tagged_speedscope_profile(self):
+        """Токен в параметре включает профиль; имя файла — в X-Profile."""
+        response = self.client.get(
+            self.url, {profiling.QUERY_PARAM: self.token()})
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile']
+        self.assertEqual(os.listdir(self.directory), [name])
+        self.assertIn('-posts_post_detail-GET-', name)
+        self.assertRegex(name, r'-\d+ms-\d+q\.speedscope\.json$')
+        with open(os.path.join(self.directory, name)) as file:
+            profile = json.load(file)
+        sampled = profile['profiles'][0]
+        self.assertEqual(sampled['type'], 'sampled')
+        self.assertEqual(len(sampled['samples']), len(sampled['weights']))
+        self.assertIn('queries', sampled['name'])
+
+    @override_settings(PROFILE_FORMAT='collapsed')
+    def test_header_token_and_collapsed_stacks(self):
+        response = self.client.get(self.url,
+                                   HTTP_X_PROFILE_TOKEN=self.token())
+        with open(os.path.join(self.directory,
+                               response['X-Profile'])) as file:
+            lines = file.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            self.assertIn('__call__ (core/middleware.py:', stack)
+
+    def test_bad_token_and_zero_rate_skip_profiling(self):
+        """Без подписи и при нулевой доле профили не пишутся."""
+        response = self.client.get(self.url,
+                                   {profiling.QUERY_PARAM: 'staff:forged'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_profiled_silently(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_token_only_for_staff(self):
+        User.objects.create_user(username='reader')
+        with self.assertRaises(CommandError):
+            call_command('profile_token', 'reader', stdout=StringIO())
+
+    def test_token_stops_working_without_staff(self):
+        """Токен не действует, если владелец больше не сотрудник."""
+        token = self.token()
+        for changes in ({'is_staff': False}, {'is_active': False}):
+            with self.subTest(**changes):
+                User.objects.filter(pk=self.staff.pk).update(**changes)
+                response = self.client.get(
+                    self.url, {profiling.QUERY_PARAM: token})
+                self.assertNotIn('X-Profile', response)
+                self.assertEqual(os.listdir(self.directory), [])
+                User.objects.filter(pk=self.staff.pk).update(
+                    is_staff=True, is_active=True)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_MAX_FILES=2)
+    def test_old_profiles_are_rotated(self):
+        """В каталоге остаются только последние PROFILE_MAX_FILES."""
+        for _ in range(3):
+            self.client.get(self.url)
+        before = sorted(os.listdir(self.directory))
+        self.assertEqual(len(before), 2)
+        response = self.client.get(self.url,
+                                   HTTP_X_PROFILE_TOKEN=self.token())
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [before[-1], response['X-Profile']])
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_MAX_FILES=0)
+    def test_zero_max_files_keeps_all_profiles(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        self.assertEqual(len(os.listdir(self.directory)), 3)
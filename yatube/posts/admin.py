@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
 from .models import Group, Post
+from .search import matching_ids
 
 
 @admin.register(Post)
@@ -11,5 +13,12 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице ищем через индекс FTS5.
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=RawSQL(*matching_ids(search_term))), \
+            False
+
 
 admin.site.register(Group)
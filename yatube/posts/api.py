@@ -0,0 +1,173 @@
+"""Read-only JSON для мобильного клиента: ленты и страница поста.
+
+``?fields=id,text,author`` выбирает поля ответа, и ORM читает только
+нужные для них колонки. Ленты листаются курсором ``?cursor=`` из поля
+``next``. Ответ пишется в поток по одному объекту, JSON страницы
+целиком в памяти не собирается.
+
+Запросы к БД выполняются до того, как view вернёт ответ: строки ленты
+(не больше ``MAX_LIMIT + 1``) и первая порция комментариев. Ошибка БД
+тогда становится ответом 500, а не оборванным JSON с кодом 200.
+Остальные порции комментариев читаются уже из потока; middleware замеров
+и маршрутизации держат свой контекст, пока поток не закрыт.
+"""
+import itertools
+import json
+from functools import wraps
+
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from .archive import get_post_or_404
+from .helpers import CursorPaginator
+from .models import ArchivedPost, Group, Post, User
+from .thumbnails import ready_master
+from .views import POSTS_AMOUNT
+
+MAX_LIMIT = 100
+
+# Поле ответа → колонки для only() и функция, достающая значение.
+POST_FIELDS = {
+    'id': (('id',), lambda post: post.pk),
+    'text': (('text',), lambda post: post.text),
+    'pub_date': (('pub_date',), lambda post: post.pub_date.isoformat()),
+    'author': (('author', 'author__username'),
+               lambda post: post.author.username),
+    'group': (('group', 'group__slug'),
+              lambda post: post.group.slug if post.group else None),
+    # Только мастер: оригинал с EXIF наружу не отдаётся.
+    'image': (('image',), lambda post: getattr(
+        ready_master(post.image), 'url', None)),
+    'comments_count': (('comments_count',),
+                       lambda post: post.comments_count),
+}
+# Комментарии бывают только у отдельного поста.
+DETAIL_FIELDS = (*POST_FIELDS, 'comments')
+
+
+class BadRequest(Exception):
+    pass
+
+
+def json_errors(view):
+    """Отдаёт ошибки JSON-ом, а не HTML-страницами сайта."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return JsonResponse({'error': 'method not allowed'}, status=405)
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        except Http404:
+            return JsonResponse({'error': 'not found'}, status=404)
+    return wrapper
+
+
+def requested_fields(request, allowed):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(allowed)
+    fields = list(dict.fromkeys(
+        name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise BadRequest(f'unknown fields: {", ".join(unknown)}')
+    return fields
+
+
+def shape(queryset, fields):
+    """Сужает queryset до колонок, нужных выбранным полям и курсору."""
+    columns = {'id', 'pub_date'}
+    for name in fields:
+        columns.update(POST_FIELDS.get(name, ((),))[0])
+    related = [name for name in ('author', 'group') if name in fields]
+    return queryset.select_related(*related).only(*columns)
+
+
+def serialize(post, fields):
+    return {name: POST_FIELDS[name][1](post)
+            for name in fields if name in POST_FIELDS}
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def stream_feed(paginator, rows, fields):
+    yield '{"results":['
+    last = None
+    has_next = False
+    for number, post in enumerate(rows):
+        if number == paginator.per_page:
+            has_next = True
+            break
+        yield (',' if number else '') + dumps(serialize(post, fields))
+        last = post
+    cursor = paginator.encode_cursor(last, 'next') if has_next else None
+    yield f'],"next":{dumps(cursor)}}}'
+
+
+def feed_response(request, queryset, archive=None):
+    fields = requested_fields(request, POST_FIELDS)
+    try:
+        limit = int(request.GET.get('limit', POSTS_AMOUNT))
+    except ValueError:
+        raise BadRequest('limit must be an integer')
+    paginator = CursorPaginator(
+        shape(queryset, fields), max(1, min(limit, MAX_LIMIT)),
+        archive=None if archive is None else shape(archive, fields))
+    rows = list(paginator.rows_after(request.GET.get('cursor')))
+    return StreamingHttpResponse(stream_feed(paginator, rows, fields),
+                                 content_type='application/json')
+
+
+@json_errors
+def index(request):
+    return feed_response(request, Post.objects.all(),
+                         ArchivedPost.objects.all())
+
+
+@json_errors
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('id'), slug=slug)
+    return feed_response(request, Post.objects.filter(group=group),
+                         ArchivedPost.objects.filter(group=group))
+
+
+@json_errors
+def profile(request, username):
+    author = get_object_or_404(User.objects.only('id'), username=username)
+    return feed_response(request, Post.objects.filter(author=author),
+                         ArchivedPost.objects.filter(author=author))
+
+
+def stream_detail(post, fields):
+    body = dumps(serialize(post, fields))
+    if 'comments' not in fields:
+        yield body
+        return
+    comments = post.comments.for_detail().iterator()
+    # Запрос выполняется при чтении первой записи, ещё до первой порции.
+    first = next(comments, None)
+    yield body[:-1] + (', ' if len(body) > 2 else '') + '"comments": ['
+    if first is not None:
+        comments = itertools.chain([first], comments)
+    for number, comment in enumerate(comments):
+        yield (',' if number else '') + dumps({
+            'id': comment.pk,
+            'author': comment.author.username,
+            'text': comment.text,
+            'created': comment.created.isoformat(),
+        })
+    yield ']}'
+
+
+@json_errors
+def post_detail(request, post_id):
+    fields = requested_fields(request, DETAIL_FIELDS)
+    post = get_post_or_404(post_id, lambda queryset: shape(queryset, fields))
+    stream = stream_detail(post, fields)
+    head = next(stream)
+    return StreamingHttpResponse(itertools.chain([head], stream),
+                                 content_type='application/json')
@@ -0,0 +1,98 @@
+"""Горячие и холодные посты.
+
+Посты старше ``settings.ARCHIVE_AFTER_DAYS`` вместе с комментариями
+переносятся командой ``archive_posts`` в ``ArchivedPost`` и
+``ArchivedComment`` с теми же id. Ленты читают горячую таблицу и
+добирают архив, только когда читатель долистал до её конца (см.
+``CursorPaginator``); ``post_detail`` ищет пост в обеих.
+
+Перенос идёт пачками, каждая — в своей транзакции. Счётчики авторов не
+меняются: архивные посты остаются постами автора. Строки поискового
+индекса остаются на месте (id те же), поиск находит пост в обеих
+таблицах. Из ``TimelineEntry`` архивные посты убираются: лента подписок
+добирает их из архива, как и остальные ленты.
+"""
+from django.db import connection, transaction
+from django.http import Http404
+
+from core.cache_tags import invalidate_tags
+from .models import (ArchivedComment, ArchivedPost, Comment, Post,
+                     TimelineEntry)
+
+POST_COLUMNS = 'id, text, pub_date, group_id, author_id, image, ' \
+               'comments_count'
+COMMENT_COLUMNS = 'id, post_id, author_id, text, created'
+
+
+def get_post_or_404(post_id, shape=None):
+    """Пост из горячей таблицы или из архива."""
+    for model in (Post, ArchivedPost):
+        queryset = model.objects.all()
+        if shape is not None:
+            queryset = shape(queryset)
+        try:
+            return queryset.get(pk=post_id)
+        except model.DoesNotExist:
+            pass
+    raise Http404(f'Пост {post_id} не найден')
+
+
+def _in(ids):
+    return ', '.join(['%s'] * len(ids))
+
+
+def _move_batch(posts):
+    """Переносит посты ``[(id, author_id, group_id)]`` с комментариями."""
+    ids = [pk for pk, _, _ in posts]
+    placeholders = _in(ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id FROM {Comment._meta.db_table} '
+            f'WHERE post_id IN ({placeholders})', ids)
+        comment_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            f'INSERT INTO {ArchivedPost._meta.db_table} ({POST_COLUMNS}) '
+            f'SELECT {POST_COLUMNS} FROM {Post._meta.db_table} '
+            f'WHERE id IN ({placeholders})', ids)
+        cursor.execute(
+            f'INSERT INTO {ArchivedComment._meta.db_table} '
+            f'({COMMENT_COLUMNS}) SELECT {COMMENT_COLUMNS} '
+            f'FROM {Comment._meta.db_table} '
+            f'WHERE post_id IN ({placeholders})', ids)
+        for model in (TimelineEntry, Comment):
+            cursor.execute(
+                f'DELETE FROM {model._meta.db_table} '
+                f'WHERE post_id IN ({placeholders})', ids)
+        cursor.execute(
+            f'DELETE FROM {Post._meta.db_table} '
+            f'WHERE id IN ({placeholders})', ids)
+    return len(comment_ids)
+
+
+def archive_before(cutoff, batch_size=500):
+    """Переносит в архив посты старше ``cutoff``.
+
+    Возвращает число перенесённых постов и комментариев.
+    """
+    moved_posts = moved_comments = 0
+    tags = set()
+    while True:
+        with transaction.atomic():
+            posts = list(
+                Post.objects.filter(pub_date__lt=cutoff)
+                .order_by('pub_date', 'id')
+                .values_list('id', 'author_id', 'group_id')[:batch_size]
+            )
+            if not posts:
+                break
+            moved_comments += _move_batch(posts)
+        moved_posts += len(posts)
+        # Теги лент; страницы самих постов не меняются, кроме формы
+        # комментария, а их ETag сменится вместе с тегом автора.
+        for _, author_id, group_id in posts:
+            tags.add(f'author:{author_id}')
+            if group_id:
+                tags.add(f'group:{group_id}')
+    if moved_posts:
+        invalidate_tags('feed', *tags)
+    return moved_posts, moved_comments
@@ -0,0 +1,293 @@
+"""Отложенная запись комментариев (write-behind).
+
+При ``settings.COMMENT_WRITE_BEHIND`` проверенный комментарий не пишется
+в БД в потоке запроса, а дописывается строкой JSON в журнал
+``COMMENT_QUEUE_DIR/comments.log``: ``O_APPEND`` под ``flock`` и ``fsync``,
+так что принятый комментарий переживает падение процесса. Поток-флашер
+в каждом процессе раз в ``COMMENT_FLUSH_INTERVAL`` секунд забирает
+журнал в сегмент и переносит сегмент в БД одной транзакцией с
+пакетными ``INSERT``: вместо сотни коротких транзакций, дерущихся за
+блокировку записи SQLite, — одна. ``created`` комментария — время
+постановки в очередь, а не сброса.
+
+Вставка идёт мимо сигналов, поэтому счётчики комментариев,
+поисковый индекс и теги кэша флашер обновляет сам, по разу на пост.
+Имя сегмента записывается в ``CommentQueueSegment`` в той же транзакции,
+что и его комментарии: если процесс упал после коммита, но до удаления
+файла, повторный сброс сегмент пропустит.
+
+Пока комментарий в очереди, автор видит его на странице поста из
+оверлея в кэше (см. ``pending``); остальные — после сброса. Оверлей
+пишется до журнала, так что сброс не может его опередить: у каждой
+записи свой ключ-слот, номер которого выдаёт атомарный ``cache.incr``.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache_tags import invalidate_tags
+from . import counters, search
+from .models import Comment, CommentQueueSegment, Post, User
+
+logger = logging.getLogger(__name__)
+
+LOG = 'comments.log'
+SEGMENT = '.segment'
+# Счётчик слотов оверлея автора у поста и сами слоты.
+PENDING_KEY = 'pending-comments:{}:{}'
+SLOT_KEY = 'pending-comments:{}:{}:{}'
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _path(name):
+    return os.path.join(settings.COMMENT_QUEUE_DIR, name)
+
+
+def enqueue(post, author, text):
+    """Ставит комментарий в очередь и показывает его автору сразу."""
+    record = {
+        'post': post.pk,
+        'author': author.pk,
+        'text': text,
+        'created': timezone.now().isoformat(),
+    }
+    slot_key = _remember(record)
+    try:
+        _append(record)
+    except Exception:
+        cache.delete(slot_key)
+        raise
+    _ensure_worker()
+
+
+def _remember(record):
+    """Кладёт запись в оверлей и возвращает ключ её слота."""
+    key = PENDING_KEY.format(record['post'], record['author'])
+    timeout = settings.COMMENT_PENDING_TIMEOUT
+    cache.add(key, 0, timeout)
+    record['slot'] = cache.incr(key)
+    cache.touch(key, timeout)
+    slot_key = SLOT_KEY.format(record['post'], record['author'],
+                               record['slot'])
+    cache.set(slot_key, record, timeout)
+    return slot_key
+
+
+def _append(record):
+    line = (json.dumps(record, ensure_ascii=False) + '\n').encode()
+    os.makedirs(settings.COMMENT_QUEUE_DIR, exist_ok=True)
+    while True:
+        fd = os.open(_path(LOG), os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                     0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Пока ждали блокировку, флашер мог забрать журнал в сегмент:
+            # тогда пишем в новый файл.
+            try:
+                current = os.stat(_path(LOG)).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                os.write(fd, line)
+                os.fsync(fd)
+                return
+        finally:
+            os.close(fd)
+
+
+def pending(post_id, user_id):
+    """Комментарии автора к посту, ещё не дошедшие до БД."""
+    if not settings.COMMENT_WRITE_BEHIND or not user_id:
+        return []
+    slots = cache.get(PENDING_KEY.format(post_id, user_id))
+    if not slots:
+        return []
+    records = cache.get_many([SLOT_KEY.format(post_id, user_id, slot)
+                              for slot in range(1, slots + 1)])
+    return sorted(records.values(), key=lambda record: record['slot'])
+
+
+def pending_comments(post, user):
+    """То же, что ``pending``, но объектами ``Comment`` для шаблона."""
+    if not user.is_authenticated:
+        return []
+    return [
+        Comment(post_id=post.pk, author=user, text=record['text'],
+                created=parse_datetime(record['created']))
+        for record in reversed(pending(post.pk, user.pk))
+    ]
+
+
+@contextmanager
+def _flush_lock(blocking):
+    os.makedirs(settings.COMMENT_QUEUE_DIR, exist_ok=True)
+    fd = os.open(_path('flush.lock'), os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else
+                                             fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+def _rotate():
+    """Переименовывает журнал в сегмент, дождавшись текущих записей."""
+    try:
+        fd = os.open(_path(LOG), os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        if os.fstat(fd).st_size:
+            os.rename(_path(LOG), _path(f'{time.time_ns()}{SEGMENT}'))
+    finally:
+        os.close(fd)
+
+
+def _read(name):
+    records = []
+    with open(_path(name), encoding='utf-8') as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Недописанная строка: процесс упал посреди write.
+                logger.warning('Пропущена битая строка в %s', name)
+    return records
+
+
+def flush(blocking=True):
+    """Переносит очередь в БД; возвращает число записанных комментариев.
+
+    Сбрасывает один процесс за раз: с ``blocking=False`` занятый флашер
+    не ждёт, а сразу возвращает 0.
+    """
+    if not os.path.isdir(settings.COMMENT_QUEUE_DIR):
+        return 0
+    written = 0
+    with _flush_lock(blocking) as locked:
+        if not locked:
+            return 0
+        _rotate()
+        segments = sorted(name for name in os.listdir(
+            settings.COMMENT_QUEUE_DIR) if name.endswith(SEGMENT))
+        for name in segments:
+            written += _store(name, _read(name))
+            os.remove(_path(name))
+            # Файла больше нет, и повторять нечего.
+            CommentQueueSegment.objects.filter(name=name).delete()
+    return written
+
+
+def _store(name, records):
+    if CommentQueueSegment.objects.filter(name=name).exists():
+        # Сегмент уже записан, но не удалён до падения.
+        _forget(records)
+        return 0
+    posts = set(Post.objects.filter(
+        pk__in={record['post'] for record in records}).values_list(
+        'pk', flat=True))
+    authors = set(User.objects.filter(
+        pk__in={record['author'] for record in records}).values_list(
+        'pk', flat=True))
+    # Пост или автор могли исчезнуть, пока комментарий ждал в очереди.
+    kept = [record for record in records
+            if record['post'] in posts and record['author'] in authors]
+    keys = {_key(record) for record in kept}
+    per_post = Counter(record['post'] for record in kept)
+    batch = settings.COMMENT_FLUSH_BATCH
+    with transaction.atomic():
+        CommentQueueSegment.objects.create(name=name)
+        _insert(kept, batch)
+        search.index_comments(_stored_ids(keys), batch)
+        for post_id, count in per_post.items():
+            counters.bump_comments(post_id, count)
+    invalidate_tags(*(f'post:{post_id}' for post_id in per_post))
+    _forget(records)
+    return len(kept)
+
+
+def _key(record):
+    """Ключ комментария из очереди: пост, автор и время постановки."""
+    return (record['post'], record['author'],
+            parse_datetime(record['created']))
+
+
+def _insert(records, batch):
+    """Вставляет комментарии со временем постановки в очередь.
+
+    ``bulk_create`` перезаписал бы ``created`` временем сброса
+    (``auto_now_add``), поэтому вставка идёт мимо ORM.
+    """
+    created = Comment._meta.get_field('created')
+    rows = [
+        (record['post'], record['author'], record['text'],
+         created.get_db_prep_value(parse_datetime(record['created']),
+                                   connection))
+        for record in records
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch):
+            cursor.executemany(
+                f'INSERT INTO {Comment._meta.db_table} '
+                f'(post_id, author_id, text, created) '
+                f'VALUES (%s, %s, %s, %s)', rows[start:start + batch])
+
+
+def _stored_ids(keys):
+    """id вставленных комментариев — по ключам записей, а не по порядку id.
+
+    Параллельный писатель может вставить свой комментарий в тот же
+    промежуток; время постановки с микросекундами отличает наши строки.
+    """
+    rows = Comment.objects.filter(
+        post_id__in={post_id for post_id, _, _ in keys},
+        created__in={created for _, _, created in keys},
+    ).values_list('id', 'post_id', 'author_id', 'created')
+    return [pk for pk, *key in rows if tuple(key) in keys]
+
+
+def _forget(records):
+    """Убирает записанные комментарии из оверлеев авторов."""
+    cache.delete_many([
+        SLOT_KEY.format(record['post'], record['author'], record['slot'])
+        for record in records if 'slot' in record
+    ])
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='comment-flusher',
+                                       daemon=True)
+            _worker.start()
+
+
+def _run():
+    while True:
+        time.sleep(settings.COMMENT_FLUSH_INTERVAL)
+        try:
+            flush(blocking=False)
+        except Exception:
+            # Сегмент остаётся на диске и уйдёт следующей попыткой.
+            logger.exception('Не удалось сбросить очередь комментариев')
+        finally:
+            connections.close_all()
@@ -0,0 +1,68 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными ``UPDATE ... SET x = x + 1`` из сигналов
+записи и удаления. Строка ``AuthorStats`` создаётся сигналом вместе с
+пользователем; для пользователей, записанных в обход ORM (импорт), её
+собирает команда ``rebuild_counters``. Чтение ничего не пишет: без строки
+счётчики считаются агрегатами, а запись в неё просто пропускается.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import ArchivedPost, AuthorStats, Follow, Post, User
+
+
+def count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total')[:1]
+    ), 0)
+
+
+def stats_annotations():
+    return {
+        # Архивные посты — тоже посты автора.
+        'real_posts': (count_subquery(Post.objects.all(), 'author')
+                       + count_subquery(ArchivedPost.objects.all(),
+                                        'author')),
+        'real_followers': count_subquery(Follow.objects.all(), 'author'),
+        'real_following': count_subquery(Follow.objects.all(), 'user'),
+    }
+
+
+def real_stats(user_id):
+    """Несохранённый ``AuthorStats`` с реальными счётчиками или None."""
+    real = User.objects.filter(pk=user_id).annotate(
+        **stats_annotations()).values(
+        'real_posts', 'real_followers', 'real_following').first()
+    if real is None:
+        return None
+    return AuthorStats(user_id=user_id,
+                       posts_count=real['real_posts'],
+                       followers_count=real['real_followers'],
+                       following_count=real['real_following'])
+
+
+def author_stats(user):
+    """Счётчики пользователя; без строки — агрегаты, без записи в БД."""
+    try:
+        return AuthorStats.objects.get(user=user)
+    except AuthorStats.DoesNotExist:
+        return real_stats(user.pk)
+
+
+def _bump(queryset, field, delta):
+    # Уменьшение не уводит счётчик ниже нуля: такое расхождение
+    # исправит команда rebuild_counters.
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def bump_author(user_id, field, delta):
+    _bump(AuthorStats.objects.filter(user_id=user_id), field, delta)
+
+
+def bump_comments(post_id, delta):
+    _bump(Post.objects.filter(pk=post_id), 'comments_count', delta)
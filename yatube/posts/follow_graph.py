@@ -0,0 +1,67 @@
+"""Граф подписок в кэше: проверки и списки без запросов к БД.
+
+Для каждого читателя в кэше лежит ``frozenset`` id авторов, на которых он
+подписан, для каждого автора — число подписчиков. Отсутствующие записи
+собираются из ``Follow`` одним запросом. Подписка и отписка не правят
+записи на месте, а удаляют обе — сразу и ещё раз после коммита: правка
+«прочитал — дописал» теряла бы параллельные подписки, а запись, собранная
+другим воркером до коммита, осталась бы устаревшей. Запись, изменённая
+в обход ORM (импорт, сырой SQL), доживает до ``FOLLOW_GRAPH_TIMEOUT``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Follow
+
+FOLLOWEES_KEY = 'followees:{}'
+FOLLOWERS_KEY = 'followers-count:{}'
+
+
+def followees(user_id):
+    """Множество id авторов, на которых подписан пользователь."""
+    key = FOLLOWEES_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True))
+        cache.set(key, ids, settings.FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+
+def is_following(user, author):
+    if not user.is_authenticated:
+        return False
+    return author.pk in followees(user.pk)
+
+
+def follower_counts(author_ids):
+    """``{author_id: подписчиков}``; промахи добираются одним запросом."""
+    keys = {FOLLOWERS_KEY.format(pk): pk for pk in author_ids}
+    found = cache.get_many(keys)
+    counts = {keys[key]: count for key, count in found.items()}
+    missing = [pk for key, pk in keys.items() if key not in found]
+    if missing:
+        loaded = dict.fromkeys(missing, 0)
+        loaded.update(
+            Follow.objects.filter(author_id__in=missing)
+            .values_list('author').annotate(total=Count('pk')).order_by())
+        cache.set_many({FOLLOWERS_KEY.format(pk): count
+                        for pk, count in loaded.items()},
+                       settings.FOLLOW_GRAPH_TIMEOUT)
+        counts.update(loaded)
+    return counts
+
+
+def follower_count(author_id):
+    return follower_counts([author_id])[author_id]
+
+
+def changed(user_id, author_id, using=None):
+    """Сбрасывает записи графа после подписки или отписки."""
+    keys = [FOLLOWEES_KEY.format(user_id), FOLLOWERS_KEY.format(author_id)]
+    # Сразу — чтобы обработчики в той же транзакции собрали граф заново.
+    cache.delete_many(keys)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys), using=using)
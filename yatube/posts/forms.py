@@ -1,5 +1,6 @@
 from django import forms
 
+from . import uploads
 from .models import Post, Comment
 
 
@@ -8,6 +9,22 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        field = self.add_prefix('image')
+        self.image_oversize = uploads.is_oversize(self.files.get(field))
+        if self.image_oversize:
+            # Обрезанный файл не отдаём в PIL: ошибку покажет clean_image.
+            self.files = self.files.copy()
+            del self.files[field]
+
+    def clean_image(self):
+        if self.image_oversize:
+            raise uploads.oversize_error()
+        image = self.cleaned_data['image']
+        uploads.check_dimensions(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
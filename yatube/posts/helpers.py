@@ -1,7 +1,270 @@
-from django.core.paginator import Paginator
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import (EmptyPage, InvalidPage, Page,
+                                   PageNotAnInteger, Paginator)
+from django.db.models import Q
+from django.utils.functional import SimpleLazyObject
+
+
+FEED_ORDERING = ('-pub_date', '-id')
+COMMENTS_ORDERING = ('-created', '-id')
+# Дальше старые ссылки ``?page=N`` не ведут: OFFSET такой глубины дорог,
+# а огромный номер SQLite не принимает вовсе.
+MAX_PAGE_NUMBER = 10_000
+
+
+def pack_cursor(values):
+    """Упаковывает значения ключа в непрозрачную строку для URL."""
+    raw = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def unpack_cursor(cursor):
+    """Обратная операция к ``pack_cursor``; для мусора — ``ValueError``."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list):
+        raise ValueError(cursor)
+    return values
+
+
+class CursorPaginator(Paginator):
+    """Keyset-паджинатор: страница выбирается по ключу последней записи.
+
+    Вместо COUNT(*) и OFFSET выполняется один запрос
+    ``WHERE (pub_date, id) < (...) ORDER BY ... LIMIT per_page + 1``,
+    поэтому стоимость страницы не зависит от её глубины.
+
+    ``archive`` — queryset холодной части ленты, в которой все записи
+    старше любой горячей. Он читается, только когда горячая часть
+    кончилась на текущей странице.
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING,
+                 archive=None, **kwargs):
+        self.ordering = tuple(ordering)
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+        self.archive = (archive.order_by(*self.ordering)
+                        if archive is not None else None)
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        # Общее число страниц не считаем: известна только текущая
+        # и то, есть ли следующая.
+        return self._num_pages
+
+    def _fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for name in self._fields():
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat')
+                          else value)
+        return pack_cursor([direction] + values)
+
+    def decode_cursor(self, cursor):
+        """Разбирает курсор; для битого курсора возвращает ``None``."""
+        try:
+            direction, *values = unpack_cursor(cursor)
+            fields = self._fields()
+            if direction not in ('next', 'prev') or len(values) != len(
+                    fields):
+                return None
+            model = self.object_list.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(fields, values)
+            ]
+        except (TypeError, ValueError, AttributeError, ValidationError):
+            return None
+        return direction, values
+
+    def _seek(self, values, reverse):
+        """Строит условие «строго после ключа» в порядке сортировки."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith('-') != reverse
+            field = name.lstrip('-')
+            lookup = f'{field}__lt' if descending else f'{field}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[field] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering]
+
+    def _sources(self):
+        if self.archive is None:
+            return [self.object_list]
+        return [self.object_list, self.archive]
+
+    def _rows_forward(self, values=None):
+        """Записи после ключа с одной лишней: горячие, затем архив."""
+        rows = []
+        for source in self._sources():
+            if values is not None:
+                source = source.filter(self._seek(values, reverse=False))
+            rows += source[:self.per_page + 1 - len(rows)]
+            if len(rows) > self.per_page:
+                break
+        return rows
+
+    def _rows_backward(self, values):
+        """Записи перед ключом с одной лишней, от ближних к дальним."""
+        rows = []
+        for source in reversed(self._sources()):
+            rows += (
+                source.filter(self._seek(values, reverse=True))
+                .order_by(*self._reversed_ordering())
+                [:self.per_page + 1 - len(rows)]
+            )
+            if len(rows) > self.per_page:
+                break
+        return rows
+
+    def page_after(self, cursor=None):
+        """Возвращает страницу по курсору (или первую страницу)."""
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            rows = self._rows_forward()
+            return self._build_page(rows, has_previous=False,
+                                    has_next=len(rows) > self.per_page)
+        direction, values = decoded
+        if direction == 'next':
+            rows = self._rows_forward(values)
+            return self._build_page(rows, has_previous=True,
+                                    has_next=len(rows) > self.per_page)
+        rows = self._rows_backward(values)
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return self._build_page(rows, has_previous=has_previous,
+                                has_next=True, trim=False)
+
+    def rows_after(self, cursor=None):
+        """Queryset записей после курсора ``next`` — с одной лишней.
+
+        Для API: без ``Page`` и его полей, лишняя запись показывает, есть
+        ли следующая страница. С архивом возвращается список: строки могут
+        прийти из двух таблиц.
+        """
+        decoded = self.decode_cursor(cursor) if cursor else None
+        values = decoded[1] if decoded and decoded[0] == 'next' else None
+        if self.archive is not None:
+            return self._rows_forward(values)
+        rows = self.object_list
+        if values is not None:
+            rows = rows.filter(self._seek(values, reverse=False))
+        return rows[:self.per_page + 1]
+
+    def page(self, number):
+        """Совместимость со ссылками ``?page=N``: OFFSET без COUNT(*).
+
+        Страница за концом ленты — ``EmptyPage``, как у ``Paginator``.
+        """
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if self.archive is not None and len(rows) <= self.per_page:
+            if rows:
+                # Горячая часть кончилась на этой странице: архив с начала.
+                rows += self.archive[:self.per_page + 1 - len(rows)]
+            else:
+                rows = self._archive_from(bottom)
+        if not rows and number > 1:
+            raise EmptyPage('Страница за концом ленты')
+        return self._build_page(rows, has_previous=number > 1,
+                                has_next=len(rows) > self.per_page,
+                                number=number)
+
+    def _archive_from(self, bottom):
+        """Архивные записи с позиции ``bottom`` общей ленты.
+
+        Вся страница за горячей частью, но сколько в ней записей, не
+        считаем: ключ записи на позиции ``bottom`` берётся из объединения
+        ключей обеих таблиц, а архив читается от него по индексу.
+        """
+        fields = self._fields()
+        keys = (
+            self.object_list.order_by().values_list(*fields)
+            .union(self.archive.order_by().values_list(*fields), all=True)
+            .order_by(*self.ordering)[bottom:bottom + 1]
+        )
+        key = next(iter(keys), None)
+        if key is None:
+            return []
+        return list(self.archive.exclude(self._seek(key, reverse=True))
+                    [:self.per_page + 1])
+
+    def get_page(self, number):
+        """Страница по номеру; негодный номер — первая страница по ключу."""
+        try:
+            return self.page(number)
+        except (InvalidPage, OverflowError):
+            return self.page_after()
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError, OverflowError):
+            raise PageNotAnInteger('Номер страницы — не целое число')
+        if not 1 <= number <= MAX_PAGE_NUMBER:
+            raise EmptyPage('Номер страницы вне допустимого диапазона')
+        return number
+
+    def _build_page(self, rows, has_previous, has_next, number=None,
+                    trim=True):
+        if trim:
+            rows = rows[:self.per_page]
+        if number is None:
+            number = 2 if has_previous else 1
+        self._num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = (
+            self.encode_cursor(rows[-1], 'next') if has_next and rows
+            else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(rows[0], 'prev') if has_previous and rows
+            else None
+        )
+        return page
 
 
 def pagin(request, *args, **kwargs):
-    paginator = Paginator(*args, **kwargs)
+    paginator = CursorPaginator(*args, **kwargs)
+    cursor = request.GET.get('cursor')
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number and not cursor:
+        return paginator.get_page(page_number)
+    return paginator.page_after(cursor)
+
+
+def lazy_pagin(request, *args, **kwargs):
+    """Страница, которая читается из БД только при первом обращении.
+
+    Если фрагмент с лентой уже лежит в кэше, запрос не выполняется вовсе.
+    """
+    return SimpleLazyObject(lambda: pagin(request, *args, **kwargs))
+
+
+def post_tags(post, *group_ids):
+    """Теги кэша, зависящие от поста (и от его прежних групп)."""
+    tags = ['feed', f'author:{post.author_id}', f'post:{post.pk}']
+    for group_id in {post.group_id, *group_ids}:
+        if group_id:
+            tags.append(f'group:{group_id}')
+    return tags
+
+
+def follow_tags(user_id, author_id):
+    """Теги профилей, у которых подписка меняет кнопку и счётчики."""
+    return [f'follows:{user_id}', f'follows:{author_id}']
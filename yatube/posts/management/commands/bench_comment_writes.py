@@ -0,0 +1,88 @@
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.benchmark import WSGIClient, bench_database, load, summary
+from posts import comment_queue
+from posts.models import Comment
+from yatube.wsgi import application
+from .bench_concurrency import Command as ConcurrencyCommand
+
+MODES = ('direct', 'write_behind')
+
+
+class Command(ConcurrencyCommand):
+    help = ('Пропускная способность add_comment при одновременных '
+            'писателях: запись в потоке запроса против отложенной '
+            '(posts.comment_queue), в профилях из settings.DB_PROFILES.')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(users=500, posts=5_000, comments=0, follows=0,
+                            clients=50, requests=5_000)
+
+    def handle(self, *args, **options):
+        self.setup(options)
+        with tempfile.TemporaryDirectory() as directory, \
+                bench_database(os.path.join(directory, 'bench.sqlite3')):
+            self.seed(options)
+            self.prepare(options)
+            with override_settings(PERF_HEADERS=True, PERF_LOG=False,
+                                   RATE_LIMITS={}):
+                report = {
+                    'dataset': self.dataset(),
+                    'options': {key: options[key] for key in
+                                ('clients', 'requests', 'seed')},
+                    'profiles': {
+                        name: {
+                            mode: self.run_writes(name, mode, directory,
+                                                  options)
+                            for mode in MODES
+                        }
+                        for name in options['profiles']
+                    },
+                }
+        self.write_report(report, options)
+
+    def run_writes(self, name, mode, directory, options):
+        _, url_name, url_kwargs, data = self.routes()['POST posts:add_comment']
+        workers = [
+            (WSGIClient(application, client['cookies']), client,
+             random.Random(f'{options["seed"]}-{name}-{mode}-{index}'))
+            for index, client in enumerate(self.clients)
+        ]
+
+        def task(worker):
+            wsgi, client, rng = workers[worker]
+            path = reverse(url_name, kwargs=url_kwargs(client, rng))
+            status, _ = wsgi.request('POST', path, data(client, rng))
+            return status
+
+        with self.profile(name), override_settings(
+                COMMENT_WRITE_BEHIND=mode == 'write_behind',
+                COMMENT_QUEUE_DIR=os.path.join(directory,
+                                               f'queue-{name}')):
+            before = Comment.objects.count()
+            statuses, timings, elapsed = load(
+                task, options['requests'], len(workers))
+            # Остаток очереди: до этого момента запись не закончена.
+            started = time.perf_counter()
+            comment_queue.flush()
+            drain_ms = (time.perf_counter() - started) * 1000
+            stored = Comment.objects.count() - before
+        counts = Counter(statuses)
+        return {
+            'rps': round(len(statuses) / elapsed, 1),
+            'writes': summary(timings),
+            'errors': sum(count for status, count in counts.items()
+                          if status >= 500),
+            'status': {str(status): count
+                       for status, count in sorted(counts.items())},
+            'stored': stored,
+            'drain_ms': round(drain_ms, 1),
+        }
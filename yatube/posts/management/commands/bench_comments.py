@@ -0,0 +1,88 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from core.benchmark import WSGIClient, bench_database, measure, summary
+from posts import views
+from posts.helpers import COMMENTS_ORDERING, CursorPaginator
+from posts.models import Comment, Post
+from yatube.wsgi import application
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Время отрисовки и размер ответа страницы поста с десятками '
+            'тысяч комментариев: всё одной страницей против пачек '
+            'с «Показать ещё».')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=50_000)
+        parser.add_argument('--commenters', type=int, default=1_000)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--batch', type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        with bench_database():
+            post = self.seed(options)
+            report = self.run(post, options['repeat'])
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def seed(self, options):
+        author = User.objects.create_user(username='bench_author')
+        post = Post.objects.create(author=author, text='Вирусный пост')
+        # Размер пачки выбирает Django: в SQLite не больше 500 строк
+        # в одном INSERT ... UNION ALL.
+        User.objects.bulk_create(
+            User(username=f'bench_{number}')
+            for number in range(options['commenters']))
+        commenters = list(User.objects.exclude(pk=author.pk).values_list(
+            'pk', flat=True))
+        total = options['comments']
+        for start in range(0, total, options['batch']):
+            Comment.objects.bulk_create(
+                Comment(post=post, author_id=commenters[number % len(
+                    commenters)], text=f'Комментарий номер {number}')
+                for number in range(start, min(start + options['batch'],
+                                               total))
+            )
+        Post.objects.filter(pk=post.pk).update(comments_count=total)
+        return post
+
+    def run(self, post, repeat):
+        client = WSGIClient(application)
+        comments = post.comments.for_detail()
+        paginator = CursorPaginator(comments, views.COMMENTS_AMOUNT,
+                                    ordering=COMMENTS_ORDERING)
+        middle = comments.order_by(*COMMENTS_ORDERING)[
+            comments.count() // 2]
+        detail = reverse('posts:post_detail', args=(post.pk,))
+        fragment = reverse('posts:post_comments', args=(post.pk,))
+        deep = f'{fragment}?cursor={paginator.encode_cursor(middle, "next")}'
+
+        def request(path):
+            sizes = []
+
+            def render():
+                # Замеряется отрисовка, а не фрагментный кэш.
+                cache.clear()
+                status, _, size = client.fetch('GET', path)
+                assert status == 200, (path, status)
+                sizes.append(size)
+            timings = measure(render, repeat)
+            return {**summary(timings), 'bytes': sizes[-1]}
+
+        with mock.patch.object(views, 'COMMENTS_AMOUNT', comments.count()):
+            unbounded = request(detail)
+        return {
+            'comments': comments.count(),
+            'per_page': views.COMMENTS_AMOUNT,
+            'unbounded_detail': unbounded,
+            'paged_detail': request(detail),
+            'fragment_first': request(fragment),
+            'fragment_middle': request(deep),
+        }
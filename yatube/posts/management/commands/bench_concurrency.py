@@ -0,0 +1,115 @@
+import os
+import random
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.benchmark import WSGIClient, bench_database, load, summary
+from yatube.wsgi import application
+from .bench_load import Command as LoadCommand
+
+# Смесь запросов: (маршрут из bench_load, вес).
+MIX = (
+    ('GET posts:post', 35),
+    ('GET posts:post_detail', 25),
+    ('GET posts:profile', 15),
+    ('GET posts:group_posts', 5),
+    ('POST posts:add_comment', 15),
+    ('POST posts:post_create', 5),
+)
+
+
+class Command(LoadCommand):
+    help = ('Смешанная нагрузка читателей и писателей на файловую SQLite '
+            'в разных профилях из settings.DB_PROFILES: RPS, задержки и '
+            'ошибки «database is locked» (ответы 500).')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(users=2_000, posts=50_000, comments=20_000,
+                            follows=40_000, clients=16, requests=3_000)
+        parser.add_argument('--profiles', nargs='*',
+                            default=['default', 'production'])
+
+    def handle(self, *args, **options):
+        self.setup(options)
+        with tempfile.TemporaryDirectory() as directory, \
+                bench_database(os.path.join(directory, 'bench.sqlite3')):
+            self.seed(options)
+            self.prepare(options)
+            # Лимиты частоты отключены: замеряется сам маршрут, а не 429.
+            with override_settings(PERF_HEADERS=True, PERF_LOG=False,
+                                   RATE_LIMITS={}):
+                report = {
+                    'dataset': self.dataset(),
+                    'options': {key: options[key] for key in
+                                ('clients', 'requests', 'seed')},
+                    'mix': dict(MIX),
+                    'profiles': {name: self.run_mix(name, options)
+                                 for name in options['profiles']},
+                }
+        self.write_report(report, options)
+
+    @contextmanager
+    def profile(self, name):
+        """Переключает профиль соединений на время прогона."""
+        with override_settings(DB_PROFILE=name):
+            profile = settings.DB_PROFILES[name]
+            # Потоки нагрузки создают свои обёртки соединений по этому же
+            # словарю настроек.
+            database = connection.settings_dict
+            old = {key: database[key] for key in ('ENGINE', 'CONN_MAX_AGE')}
+            database.update({key: profile[key] for key in old})
+            connections.close_all()
+            # Режим журнала хранится в самом файле: профиль без WAL должен
+            # вернуть журнал отката явно.
+            if 'journal_mode' not in profile['PRAGMAS']:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode = DELETE')
+            connection.close()
+            try:
+                yield
+            finally:
+                connections.close_all()
+                database.update(old)
+
+    def run_mix(self, name, options):
+        routes = self.routes()
+        names, weights = zip(*MIX)
+        workers = [
+            (WSGIClient(application, client['cookies']), client,
+             random.Random(f'{options["seed"]}-{name}-{index}'))
+            for index, client in enumerate(self.clients)
+        ]
+
+        def task(worker):
+            wsgi, client, rng = workers[worker]
+            route = rng.choices(names, weights)[0]
+            method, url_name, url_kwargs, data = routes[route]
+            path = reverse(url_name, kwargs=url_kwargs and url_kwargs(
+                client, rng))
+            status, _ = wsgi.request(method, path, data and data(client, rng))
+            return route.split()[0], status
+
+        with self.profile(name):
+            results, timings, elapsed = load(
+                task, options['requests'], len(workers))
+        reads = [timing for (method, _), timing in zip(results, timings)
+                 if method == 'GET']
+        writes = [timing for (method, _), timing in zip(results, timings)
+                  if method == 'POST']
+        statuses = Counter(status for _, status in results)
+        return {
+            'rps': round(len(results) / elapsed, 1),
+            'reads': summary(reads),
+            'writes': summary(writes),
+            'errors': sum(count for status, count in statuses.items()
+                          if status >= 500),
+            'status': {str(status): count
+                       for status, count in sorted(statuses.items())},
+        }
@@ -0,0 +1,267 @@
+import json
+import os
+import random
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from faker import Faker
+from mixer.backend.django import Mixer
+
+from core.benchmark import WSGIClient, bench_database, load, summary
+from posts.models import Comment, Follow, Group, Post
+from posts.timeline import backfill
+from yatube.wsgi import application
+
+User = get_user_model()
+
+WORDS_PER_TEXT = 12
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон всех маршрутов posts через WSGI-приложение '
+            'на синтетических данных во временной БД. Печатает JSON с '
+            'перцентилями задержки, RPS и числом запросов к БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument('--follows', type=int, default=5_000_000)
+        parser.add_argument('--clients', type=int, default=8,
+                            help='Число одновременных клиентов.')
+        parser.add_argument('--requests', type=int, default=400,
+                            help='Запросов на каждый маршрут.')
+        parser.add_argument('--routes', nargs='*',
+                            help='Прогнать только эти маршруты, '
+                                 'например "GET posts:post".')
+        parser.add_argument('--batch', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Файл для отчёта.')
+
+    def handle(self, *args, **options):
+        routes = self.routes()
+        selected = options['routes'] or list(routes)
+        unknown = set(selected) - set(routes)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные маршруты: {", ".join(sorted(unknown))}')
+        self.setup(options)
+        # Файл, а не память: к базе одновременно ходят потоки клиентов.
+        with tempfile.TemporaryDirectory() as directory, \
+                bench_database(os.path.join(directory, 'bench.sqlite3')):
+            self.seed(options)
+            self.prepare(options)
+            # Лимиты частоты отключены: замеряется сам маршрут, а не 429.
+            with override_settings(PERF_HEADERS=True, PERF_LOG=False,
+                                   RATE_LIMITS={}):
+                report = {
+                    'dataset': self.dataset(),
+                    'options': {key: options[key] for key in
+                                ('clients', 'requests', 'seed')},
+                    'routes': {
+                        name: self.run(routes[name], options)
+                        for name in selected
+                    },
+                }
+        self.write_report(report, options)
+
+    def setup(self, options):
+        self.random = random.Random(options['seed'])
+        Faker.seed(options['seed'])
+        self.vocabulary = list(dict.fromkeys(Faker('ru_RU').words(3000)))
+        # Закон Ципфа: частые слова встречаются почти везде, редкие — нет.
+        self.weights = [1 / rank for rank in
+                        range(1, len(self.vocabulary) + 1)]
+
+    def write_report(self, report, options):
+        output = json.dumps(report, indent=2, sort_keys=True,
+                            ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def text(self, rng=None):
+        return ' '.join((rng or self.random).choices(
+            self.vocabulary, self.weights, k=WORDS_PER_TEXT))
+
+    def seed(self, options):
+        batch = options['batch']
+        mixer = Mixer(commit=False)
+        mixer.faker.seed_instance(options['seed'])
+        # Размер пачки для пользователей и групп выбирает Django: в
+        # SQLite не больше 500 строк в одном INSERT ... UNION ALL.
+        User.objects.bulk_create(
+            mixer.cycle(options['users']).blend(
+                User, username=mixer.sequence('bench_{0}')))
+        Group.objects.bulk_create(
+            mixer.cycle(options['groups']).blend(
+                Group, slug=mixer.sequence('group-{0}')))
+        authors = list(User.objects.values_list('pk', flat=True))
+        groups = list(Group.objects.values_list('pk', flat=True)) + [None]
+        for start in range(0, options['posts'], batch):
+            Post.objects.bulk_create(
+                Post(text=self.text(),
+                     author_id=self.random.choice(authors),
+                     group_id=self.random.choice(groups))
+                for _ in range(start, min(start + batch, options['posts']))
+            )
+        last_post = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        for start in range(0, options['comments'] if last_post else 0,
+                           batch):
+            Comment.objects.bulk_create(
+                Comment(text=self.text(),
+                        author_id=self.random.choice(authors),
+                        post_id=self.random.randint(1, last_post))
+                for _ in range(start, min(start + batch, options['comments']))
+            )
+        per_user = min(options['follows'] // max(len(authors), 1),
+                       len(authors) - 1)
+        follows = (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in authors
+            for author_id in self.random.sample(authors, per_user + 1)
+            if author_id != user_id
+        )
+        pending = []
+        for follow in follows:
+            pending.append(follow)
+            if len(pending) == batch:
+                Follow.objects.bulk_create(pending, ignore_conflicts=True)
+                pending = []
+        Follow.objects.bulk_create(pending, ignore_conflicts=True)
+
+    def prepare(self, options):
+        """Достраивает то, что bulk_create пропускает мимо сигналов.
+
+        Счётчики и поисковый индекс пересчитываются целиком, ленты
+        подписок — только для пользователей, под которыми ходят клиенты.
+        """
+        call_command('rebuild_counters', batch_size=options['batch'],
+                     stdout=StringIO())
+        call_command('reindex_search', stdout=StringIO())
+        self.clients = []
+        for user in User.objects.order_by('pk')[:options['clients']]:
+            for follow in Follow.objects.filter(
+                    user=user).select_related('author'):
+                backfill(user, follow.author)
+            own = Post.objects.create(author=user, text=self.text())
+            client = Client()
+            client.force_login(user)
+            self.clients.append({
+                'cookies': {
+                    settings.SESSION_COOKIE_NAME:
+                        client.cookies[settings.SESSION_COOKIE_NAME].value,
+                    settings.CSRF_COOKIE_NAME: get_random_string(32),
+                },
+                'own_post': own.pk,
+                # Отписываться есть смысл только от тех, на кого подписан.
+                'followees': list(Follow.objects.filter(user=user)
+                                  .values_list('author__username', flat=True)),
+            })
+        self.usernames = list(User.objects.values_list('username', flat=True))
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.last_post = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first()
+
+    def dataset(self):
+        return {
+            'users': User.objects.count(),
+            'groups': Group.objects.count(),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        }
+
+    def routes(self):
+        """Маршруты posts: имя → функция, строящая запрос клиента."""
+        def post(client, rng):
+            return {'post_id': rng.randint(1, self.last_post)}
+
+        def author(client, rng):
+            return {'username': rng.choice(self.usernames)}
+
+        def followee(client, rng):
+            followees = client['followees']
+            if not followees:
+                return author(client, rng)
+            return {'username': followees.pop(rng.randrange(len(followees)))}
+
+        def form(client, rng):
+            return {'text': self.text(rng),
+                    'csrfmiddlewaretoken':
+                        client['cookies'][settings.CSRF_COOKIE_NAME]}
+
+        return {
+            'GET posts:post': ('GET', 'posts:post', None, None),
+            'GET posts:group_posts': (
+                'GET', 'posts:group_posts',
+                lambda client, rng: {'slug': rng.choice(self.slugs)}, None),
+            'GET posts:profile': ('GET', 'posts:profile', author, None),
+            'GET posts:post_detail': (
+                'GET', 'posts:post_detail', post, None),
+            'GET posts:search': (
+                'GET', 'posts:search', None,
+                lambda client, rng: {'q': rng.choice(self.vocabulary[:300])}),
+            'GET posts:follow_index': (
+                'GET', 'posts:follow_index', None, None),
+            'GET posts:post_create': (
+                'GET', 'posts:post_create', None, None),
+            'POST posts:post_create': (
+                'POST', 'posts:post_create', None, form),
+            'GET posts:post_edit': (
+                'GET', 'posts:post_edit',
+                lambda client, rng: {'post_id': client['own_post']}, None),
+            'POST posts:post_edit': (
+                'POST', 'posts:post_edit',
+                lambda client, rng: {'post_id': client['own_post']}, form),
+            'POST posts:add_comment': (
+                'POST', 'posts:add_comment', post, form),
+            'GET posts:profile_follow': (
+                'GET', 'posts:profile_follow', author, None),
+            'GET posts:profile_unfollow': (
+                'GET', 'posts:profile_unfollow', followee, None),
+        }
+
+    def run(self, route, options):
+        method, url_name, url_kwargs, data = route
+        workers = [
+            (WSGIClient(application, client['cookies']), client,
+             random.Random(f'{options["seed"]}-{url_name}-{index}'))
+            for index, client in enumerate(self.clients)
+        ]
+
+        def task(worker):
+            wsgi, client, rng = workers[worker]
+            path = reverse(url_name, kwargs=url_kwargs and url_kwargs(
+                client, rng))
+            status, headers = wsgi.request(
+                method, path, data and data(client, rng))
+            return status, int(headers.get('X-Query-Count', 0))
+
+        results, timings, elapsed = load(
+            task, options['requests'], len(workers))
+        queries = [count for _, count in results]
+        return {
+            **summary(timings),
+            'rps': round(len(results) / elapsed, 1),
+            'queries_per_request': {
+                'mean': round(sum(queries) / len(queries), 2),
+                'max': max(queries),
+            },
+            'status': {str(status): count for status, count in
+                       sorted(Counter(status for status, _ in results)
+                              .items())},
+        }
@@ -0,0 +1,72 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from core.benchmark import bench_database, measure, summary
+from posts.helpers import CursorPaginator, FEED_ORDERING
+from posts.models import Post
+from posts.views import POSTS_AMOUNT
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает стоимость первой и глубокой страницы ленты '
+            'для OFFSET- и keyset-паджинации на временной БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--page', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch', type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        with bench_database():
+            self.seed(options['posts'], options['batch'])
+            report = self.run(options['page'], options['repeat'])
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def seed(self, total, batch):
+        author = User.objects.create_user(username='bench_author')
+        for start in range(0, total, batch):
+            Post.objects.bulk_create(
+                Post(text=f'Пост {number}', author=author)
+                for number in range(start, min(start + batch, total))
+            )
+
+    def run(self, deep_page, repeat):
+        queryset = Post.objects.all()
+        bottom = (deep_page - 2) * POSTS_AMOUNT
+        anchor = queryset.order_by(*FEED_ORDERING)[
+            bottom + POSTS_AMOUNT - 1]
+        cursor = CursorPaginator(queryset, POSTS_AMOUNT).encode_cursor(
+            anchor, 'next')
+
+        def offset_page(number):
+            def render():
+                paginator = Paginator(
+                    queryset.order_by(*FEED_ORDERING), POSTS_AMOUNT)
+                list(paginator.get_page(number))
+            return render
+
+        def cursor_page(value):
+            def render():
+                paginator = CursorPaginator(queryset, POSTS_AMOUNT)
+                list(paginator.page_after(value))
+            return render
+
+        return {
+            'posts': queryset.count(),
+            'deep_page': deep_page,
+            'offset': {
+                'page_1': summary(measure(offset_page(1), repeat)),
+                'page_deep': summary(measure(offset_page(deep_page),
+                                             repeat)),
+            },
+            'cursor': {
+                'page_1': summary(measure(cursor_page(None), repeat)),
+                'page_deep': summary(measure(cursor_page(cursor), repeat)),
+            },
+        }
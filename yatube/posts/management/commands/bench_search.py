@@ -0,0 +1,126 @@
+import json
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from faker import Faker
+
+from core.benchmark import bench_database, measure, summary
+from posts.models import Comment, Group, Post
+from posts.search import SearchPaginator
+
+User = get_user_model()
+
+WORDS_PER_TEXT = 12
+MISSING = 'несуществующееслово'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку полнотекстового поиска на синтетическом '
+            'корпусе во временной БД и сравнивает её с LIKE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument('--authors', type=int, default=1_000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        Faker.seed(options['seed'])
+        self.vocabulary = list(dict.fromkeys(Faker('ru_RU').words(3000)))
+        # Закон Ципфа: частые слова встречаются почти везде, редкие — нет.
+        self.weights = [1 / rank for rank in
+                        range(1, len(self.vocabulary) + 1)]
+        with bench_database():
+            self.seed(options)
+            call_command('reindex_search', stdout=self.stdout)
+            report = self.run(options['repeat'])
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+
+    def text(self):
+        return ' '.join(self.random.choices(
+            self.vocabulary, self.weights, k=WORDS_PER_TEXT))
+
+    def seed(self, options):
+        batch = options['batch']
+        User.objects.bulk_create(
+            User(username=f'bench_{number}')
+            for number in range(options['authors'])
+        )
+        Group.objects.bulk_create(
+            Group(title=f'Группа {number}', slug=f'group-{number}',
+                  description='')
+            for number in range(options['groups'])
+        )
+        authors = list(User.objects.values_list('pk', flat=True))
+        groups = list(Group.objects.values_list('pk', flat=True))
+        for start in range(0, options['posts'], batch):
+            Post.objects.bulk_create(
+                Post(text=self.text(),
+                     author_id=self.random.choice(authors),
+                     group_id=self.random.choice(groups))
+                for _ in range(start, min(start + batch, options['posts']))
+            )
+        last_post = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first()
+        for start in range(0, options['comments'], batch):
+            Comment.objects.bulk_create(
+                Comment(text=self.text(),
+                        author_id=self.random.choice(authors),
+                        post_id=self.random.randint(1, last_post))
+                for _ in range(start, min(start + batch, options['comments']))
+            )
+
+    def run(self, repeat):
+        common = self.vocabulary[0]
+        middle = self.vocabulary[len(self.vocabulary) // 10]
+        rare = self.vocabulary[-1]
+        group = Group.objects.first()
+        author = User.objects.first()
+
+        def fts(query, **filters):
+            def search():
+                list(SearchPaginator(query, 10, **filters).page_after())
+            return search
+
+        def deep(query, pages):
+            paginator = SearchPaginator(query, 10)
+            page = paginator.page_after()
+            for _ in range(pages - 1):
+                page = paginator.page_after(page.next_cursor)
+            cursor = page.next_cursor
+
+            def search():
+                list(paginator.page_after(cursor))
+            return search
+
+        def like(query):
+            def search():
+                list(Post.objects.filter(text__icontains=query)[:10])
+            return search
+
+        cases = {
+            'fts_common_word': fts(common),
+            'fts_middle_word': fts(middle),
+            'fts_rare_word': fts(rare),
+            'fts_two_words': fts(f'{middle} {rare}'),
+            'fts_missing_word': fts(MISSING),
+            'fts_group_filter': fts(middle, group=group),
+            'fts_author_filter': fts(middle, author=author),
+            'fts_page_50': deep(middle, 50),
+            'like_middle_word': like(middle),
+            'like_rare_word': like(rare),
+            'like_missing_word': like(MISSING),
+        }
+        return {
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'words': {'common': common, 'middle': middle, 'rare': rare},
+            'latency': {name: summary(measure(case, repeat))
+                        for name, case in cases.items()},
+        }
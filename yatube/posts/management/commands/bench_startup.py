@@ -0,0 +1,192 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import reverse
+
+from core.benchmark import bench_database, summary
+from core.startup import PHASE_MARKER, PHASES
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+# Строка вывода -X importtime: «import time: self | cumulative | name».
+IMPORT_LINE = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_imports(stderr):
+    """Разбирает stderr замера: фаза → [(модуль, self мкс, cumulative мкс)].
+
+    Импорты до первой метки (сам интерпретатор и site) попадают в фазу
+    ``interpreter``.
+    """
+    phases = defaultdict(list)
+    phase = 'interpreter'
+    for line in stderr.splitlines():
+        if line.startswith(PHASE_MARKER):
+            phase = line[len(PHASE_MARKER):]
+            continue
+        match = IMPORT_LINE.match(line)
+        if match:
+            own, cumulative, _, module = match.groups()
+            phases[phase].append((module, int(own), int(cumulative)))
+    return phases
+
+
+class Command(BaseCommand):
+    help = ('Холодный старт воркера: импорт настроек, django.setup(), '
+            'импорт yatube.wsgi, первые и тёплые запросы — каждый прогон в '
+            'новом процессе python -X importtime, без прогрева и с '
+            'YATUBE_WSGI_PRELOAD=1. Печатает JSON с фазами и самыми '
+            'дорогими импортами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10,
+                            help='Процессов на каждый вариант.')
+        parser.add_argument('--warm-requests', type=int, default=20,
+                            help='Тёплых запросов на каждый адрес.')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Сколько модулей и пакетов показать.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, 'startup.sqlite3')
+            with bench_database(os.path.join(directory, 'seed.sqlite3')):
+                paths = self.seed()
+                connection.close()
+                # bench_database удаляет файл на выходе, а читать его
+                # будут процессы замера: оставляем вторую ссылку.
+                os.link(connection.settings_dict['NAME'], database)
+            report = {
+                'runs': options['runs'],
+                'paths': paths,
+                'interpreter_ms': summary(self.interpreter(options['runs'])),
+            }
+            for variant, preload in (('cold', False), ('preload', True)):
+                report[variant] = self.variant(
+                    directory, database, paths, preload, options)
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+
+    def seed(self):
+        author = User.objects.create_user(username='bench_author')
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.bulk_create(
+            Post(author=author, group=group,
+                 text=f'Текст поста номер {number}')
+            for number in range(30)
+        )
+        post = Post.objects.latest('pk')
+        Comment.objects.create(post=post, author=author, text='Комментарий')
+        return [
+            reverse('posts:post'),
+            reverse('posts:group_posts', args=(group.slug,)),
+            reverse('posts:profile', args=(author.username,)),
+            reverse('posts:post_detail', args=(post.pk,)),
+        ]
+
+    def interpreter(self, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'pass'], check=True)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def variant(self, directory, database, paths, preload, options):
+        environment = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'yatube.settings',
+            'YATUBE_DB_PATH': database,
+            'YATUBE_WSGI_PRELOAD': '1' if preload else '0',
+            # Как у воркеров в бою (см. WSGI_APPLICATION в settings).
+            'SETUPTOOLS_USE_DISTUTILS': 'stdlib',
+        }
+        results = []
+        imports = []
+        for run in range(options['runs']):
+            # У каждого процесса свой пустой кэш: фрагменты от прошлого
+            # прогона сделали бы первый запрос тёплым.
+            environment['YATUBE_CACHE_PATH'] = os.path.join(
+                directory, f'cache-{preload:d}-{run}.sqlite3')
+            start = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-m', 'core.startup',
+                 str(options['warm_requests']), *paths],
+                cwd=settings.BASE_DIR, env=environment, check=True,
+                capture_output=True, text=True)
+            process = (time.perf_counter() - start) * 1000
+            result = json.loads(completed.stdout.splitlines()[-1])
+            result['process_ms'] = process
+            results.append(result)
+            imports.append(parse_imports(completed.stderr))
+        return {
+            'phases_ms': {
+                phase: summary([result['phases'][phase]
+                                for result in results])
+                for phase in PHASES
+            },
+            'startup_ms': summary([result['startup_ms']
+                                   for result in results]),
+            'process_ms': summary([result['process_ms']
+                                   for result in results]),
+            'first_request_ms': {
+                path: summary([result['first_request_ms'][path]
+                               for result in results])
+                for path in paths
+            },
+            'warm_request_ms': summary([
+                timing for result in results
+                for timing in result['warm_request_ms']]),
+            'imports': self.imports(imports, options['top']),
+        }
+
+    def imports(self, runs, top):
+        """Средние по прогонам времена импорта, в мс.
+
+        ``packages`` — собственное время, сложенное по пакету верхнего
+        уровня; ``modules`` — самые дорогие модули по cumulative;
+        ``first_request`` — что импортирует первый запрос, то есть чего
+        не успел загрузить старт.
+        """
+        def mean_ms(values):
+            return round(statistics.mean(values) / 1000, 3)
+
+        def ranked(totals):
+            return dict(sorted(
+                ((name, mean_ms(values + [0] * (len(runs) - len(values))))
+                 for name, values in totals.items()),
+                key=lambda item: -item[1])[:top])
+
+        packages = defaultdict(list)
+        modules = defaultdict(list)
+        first_request = defaultdict(list)
+        for phases in runs:
+            per_package = defaultdict(int)
+            for phase in PHASES:
+                for module, own, cumulative in phases[phase]:
+                    per_package[module.split('.')[0]] += own
+                    modules[module].append(cumulative)
+            for package, own in per_package.items():
+                packages[package].append(own)
+            for module, _, cumulative in phases['first_request']:
+                first_request[module].append(cumulative)
+        return {
+            'startup_total_ms': mean_ms([
+                sum(own for phase in PHASES
+                    for _, own, _ in phases[phase])
+                for phases in runs]),
+            'packages': ranked(packages),
+            'modules': ranked(modules),
+            'first_request': ranked(first_request),
+        }
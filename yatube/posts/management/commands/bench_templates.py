@@ -0,0 +1,75 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from core.benchmark import bench_database, measure, summary
+from posts.counters import author_stats
+from posts.helpers import pagin
+from posts.models import Group, Post
+from posts.views import POSTS_AMOUNT
+
+User = get_user_model()
+
+# Фрагментный кэш выключен: замеряется сама отрисовка.
+NO_FRAGMENT_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = ('Время отрисовки шаблонов лент (index, group_list, profile, '
+            'follow) на странице из POSTS_AMOUNT карточек, без БД и '
+            'фрагментного кэша.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with bench_database(), override_settings(CACHES=NO_FRAGMENT_CACHE):
+            pages = self.pages()
+            report = {
+                'cards_per_page': POSTS_AMOUNT,
+                'pages': {
+                    name: summary(measure(render, options['repeat']))
+                    for name, render in pages.items()
+                },
+            }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def pages(self):
+        author = User.objects.create_user(
+            username='bench_author', first_name='Лев', last_name='Толстой')
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание группы')
+        Post.objects.bulk_create(
+            Post(author=author, group=group,
+                 text=f'Текст поста номер {number} ' * 5)
+            for number in range(POSTS_AMOUNT + 1)
+        )
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        # Страница читается из БД один раз, до замеров.
+        page = pagin(request, Post.objects.for_feed(), POSTS_AMOUNT)
+        page.object_list = list(page.object_list)
+        common = {'page_obj': page, 'cache_timeout': 0, 'cache_vary': ''}
+        contexts = {
+            'posts/index.html': common,
+            'posts/group_list.html': {**common, 'group': group},
+            'posts/profile.html': {**common, 'author': author,
+                                   'stats': author_stats(author),
+                                   'following': False},
+            'posts/follow.html': common,
+        }
+
+        def renderer(template, context):
+            return lambda: render_to_string(template, context, request)
+
+        return {template: renderer(template, context)
+                for template, context in contexts.items()}
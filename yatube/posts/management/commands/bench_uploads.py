@@ -0,0 +1,111 @@
+import json
+import random
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image
+
+from core.benchmark import bench_database, summary
+from posts import thumbnails, uploads
+from posts.models import Post
+
+# Размеры кадров типичных телефонных камер.
+SIZES = ((4032, 3024), (3024, 4032), (4000, 2250), (2560, 1920))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает на синтетических «фото с телефона» место на диске '
+            'и время построения миниатюр из оригинала и из мастер-копии.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        media_root = tempfile.mkdtemp()
+        try:
+            with bench_database(), override_settings(MEDIA_ROOT=media_root):
+                report = self.run(options['images'])
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+
+    def photo(self):
+        """Шумный градиент с EXIF: сжимается примерно как настоящее фото."""
+        size = self.random.choice(SIZES)
+        noise = Image.effect_noise(size, self.random.randint(20, 40))
+        gradient = Image.linear_gradient('L').resize(size)
+        image = Image.merge('RGB', (noise, gradient, gradient.transpose(
+            Image.FLIP_LEFT_RIGHT)))
+        exif = Image.Exif()
+        exif[0x0112] = self.random.choice((1, 6, 8))
+        exif[0x010F] = 'Bench Phone'
+        output = BytesIO()
+        image.save(output, 'JPEG', quality=92, exif=exif.tobytes())
+        return output.getvalue()
+
+    def cut(self, name, draft):
+        """Все миниатюры одной картинки, как их резал бы пул, в мс."""
+        start = time.perf_counter()
+        with default_storage.open(name) as source, \
+                Image.open(source) as opened:
+            if draft:
+                side = settings.POST_IMAGE_MAX_SIDE
+                opened.draft('RGB', (side, side))
+            image = uploads.normalized(opened)
+        for preset in settings.POST_THUMBNAILS:
+            thumbnails.render(image, preset)
+        return (time.perf_counter() - start) * 1000
+
+    def run(self, count):
+        names = [
+            default_storage.save(f'posts/bench_{number}.jpg',
+                                 ContentFile(self.photo()))
+            for number in range(count)
+        ]
+        # Прежний путь: каждая миниатюра — из полного декодирования
+        # оригинала.
+        original_ms = [self.cut(name, draft=False) for name in names]
+        # Новый: мастер строится один раз, миниатюры — из него.
+        generate_ms = []
+        for name in names:
+            start = time.perf_counter()
+            thumbnails.generate(name)
+            generate_ms.append((time.perf_counter() - start) * 1000)
+        masters = [thumbnails.master_name(name) for name in names]
+        master_ms = [self.cut(name, draft=True) for name in masters]
+        # Во время показа страницы файлы только ищутся на диске.
+        lookup_ms = []
+        for name in names:
+            image = Post(image=name).image
+            start = time.perf_counter()
+            for preset in settings.POST_THUMBNAILS:
+                thumbnails.ready_thumbnail(image, preset)
+            thumbnails.ready_master(image)
+            lookup_ms.append((time.perf_counter() - start) * 1000)
+        thumbnail_names = [thumbnails.thumbnail_name(name, preset)
+                           for name in names
+                           for preset in settings.POST_THUMBNAILS]
+        original_bytes = sum(map(default_storage.size, names))
+        master_bytes = sum(map(default_storage.size, masters))
+        return {
+            'images': count,
+            'original_bytes': original_bytes,
+            'master_bytes': master_bytes,
+            'disk_saved': round(1 - master_bytes / original_bytes, 3),
+            'thumbnail_bytes': sum(map(default_storage.size,
+                                       thumbnail_names)),
+            'generate_ms': summary(generate_ms),
+            'thumbnails_from_original_ms': summary(original_ms),
+            'thumbnails_from_master_ms': summary(master_ms),
+            'thumbnail_speedup': round(sum(original_ms) / sum(master_ms), 2),
+            'lookup_ms': summary(lookup_ms),
+        }
@@ -0,0 +1,39 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.cache_tags import invalidate_tags
+from posts import thumbnails
+from posts.helpers import post_tags
+from posts.models import ArchivedPost, Post
+
+
+class Command(BaseCommand):
+    help = ('Строит недостающие мастер-копии и миниатюры картинок постов, '
+            'включая архив. Оригиналы не меняет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить и существующие мастеры и миниатюры (после '
+                 'смены POST_THUMBNAILS, POST_IMAGE_MAX_SIDE или качества).')
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        for model in (Post, ArchivedPost):
+            posts = model.objects.exclude(image='').only(
+                'pk', 'image', 'author_id', 'group_id').order_by('pk')
+            for post in posts.iterator():
+                if not default_storage.exists(post.image.name):
+                    continue
+                try:
+                    count = thumbnails.generate(
+                        post.image.name, force=options['force'])
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    continue
+                if count:
+                    built += count
+                    invalidate_tags(*post_tags(post))
+        self.stdout.write(
+            f'Построено мастеров и миниатюр: {built}, ошибок: {failed}')
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import (ArchivedComment, ArchivedPost, Comment, Follow,
+                          Group, Post)
+
+POST_FIELDS = {'id': 'id', 'author': 'author__username',
+               'group': 'group__slug', 'text': 'text',
+               'pub_date': 'pub_date', 'image': 'image'}
+COMMENT_FIELDS = {'id': 'id', 'post': 'post_id',
+                  'author': 'author__username', 'text': 'text',
+                  'created': 'created'}
+# Порядок важен: импорт читает поток подряд, и на момент комментария
+# его пост уже должен быть записан. Архивные посты и комментарии
+# выгружаются как обычные: после импорта их снова перенесёт archive_posts.
+EXPORTS = (
+    ('group', Group, {'slug': 'slug', 'title': 'title',
+                      'description': 'description'}),
+    ('post', Post, POST_FIELDS),
+    ('post', ArchivedPost, POST_FIELDS),
+    ('comment', Comment, COMMENT_FIELDS),
+    ('comment', ArchivedComment, COMMENT_FIELDS),
+    ('follow', Follow, {'user': 'user__username',
+                        'author': 'author__username'}),
+)
+
+
+class DumpEncoder(DjangoJSONEncoder):
+    """Пишет даты с микросекундами.
+
+    DjangoJSONEncoder обрезает их до миллисекунд, и у постов одной
+    секунды после импорта мог бы поменяться порядок в ленте.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в NDJSON: '
+            'по объекту на строку, без загрузки таблиц в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-',
+                            help='Файл выгрузки, «-» — stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.dump(self.stdout, options['chunk_size'])
+            return
+        with open(options['output'], 'w') as stream:
+            counts = self.dump(stream, options['chunk_size'])
+        self.stderr.write(', '.join(
+            f'{name}: {count}' for name, count in counts.items()))
+
+    def dump(self, stream, chunk_size):
+        encoder = DumpEncoder(ensure_ascii=False)
+        counts = {}
+        for name, model, fields in EXPORTS:
+            rows = model.objects.order_by('pk').values_list(
+                *fields.values()).iterator(chunk_size=chunk_size)
+            counts.setdefault(name, 0)
+            for row in rows:
+                record = {'model': name, **dict(zip(fields, row))}
+                stream.write(encoder.encode(record) + '\n')
+                counts[name] += 1
+        return counts
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import comment_queue
+
+
+class Command(BaseCommand):
+    help = ('Сбрасывает очередь отложенных комментариев в БД — например, '
+            'перед остановкой сервера или по cron.')
+
+    def handle(self, *args, **options):
+        written = comment_queue.flush()
+        self.stdout.write(f'Записано комментариев: {written}')
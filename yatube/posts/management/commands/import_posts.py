@@ -0,0 +1,255 @@
+import json
+import sys
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from core.cache_tags import invalidate_tags
+from posts import timeline
+from posts.helpers import follow_tags, post_tags
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Сколько ключей подставлять в один IN (...): предел параметров SQLite.
+LOOKUP_CHUNK = 900
+
+
+@contextmanager
+def keep_auto_now(*fields):
+    """Отключает auto_now_add, чтобы bulk_create не затёр даты из выгрузки."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+class Lookup:
+    """Кэш «естественный ключ → pk» на время импорта.
+
+    Ключи, которых ещё нет в кэше, добираются одним запросом на пачку;
+    отсутствующие в базе создаются через ``create`` или считаются ошибкой.
+    """
+
+    def __init__(self, model, field, create=None):
+        self.model = model
+        self.field = field
+        self.create = create
+        self.ids = {}
+
+    def resolve(self, keys):
+        missing = {key for key in keys
+                   if key is not None and key not in self.ids}
+        self._fetch(missing)
+        missing -= self.ids.keys()
+        if missing and self.create is None:
+            raise CommandError(
+                f'{self.model.__name__}: не найдены '
+                f'{", ".join(sorted(missing)[:10])}')
+        if missing:
+            self.model.objects.bulk_create(
+                [self.create(key) for key in missing], ignore_conflicts=True)
+            self._fetch(missing)
+
+    def _fetch(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            self.ids.update(self.model.objects.filter(**{
+                f'{self.field}__in': keys[start:start + LOOKUP_CHUNK]
+            }).values_list(self.field, 'pk'))
+
+    def __getitem__(self, key):
+        return None if key is None else self.ids[key]
+
+
+class Command(BaseCommand):
+    help = ('Загружает NDJSON из export_posts пачками через bulk_create. '
+            'Сохраняет id и даты, авторов и группы ищет по username и slug. '
+            'Уже импортированное пропускает, а пост или комментарий, чей '
+            'id занят чужим, не пишет и сообщает о нём в stderr.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл выгрузки, «-» — stdin.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересобирать счётчики, поисковый индекс и ленты.')
+
+    def handle(self, *args, **options):
+        self.batch = options['batch_size']
+        self.users = Lookup(User, 'username', create=lambda username: User(
+            username=username, password=make_password(None)))
+        self.groups = Lookup(Group, 'slug')
+        self.pending = {name: [] for name in self.builders()}
+        self.counts = dict.fromkeys(self.pending, 0)
+        self.conflicts = dict.fromkeys(self.pending, 0)
+        # id постов выгрузки, которые не записаны из-за конфликта: их
+        # комментарии иначе попали бы к чужому посту с тем же id.
+        self.rejected_posts = set()
+        self.tags = set()
+        if options['path'] == '-':
+            self.load(sys.stdin)
+        else:
+            with open(options['path']) as stream:
+                self.load(stream)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(sql)
+        self.stdout.write(', '.join(
+            f'{name}: {count}' for name, count in self.counts.items()))
+        if any(self.conflicts.values()):
+            self.stderr.write('Конфликты: ' + ', '.join(
+                f'{name}: {count}'
+                for name, count in self.conflicts.items() if count))
+        if not options['skip_derived']:
+            self.rebuild_derived()
+        # bulk_create не шлёт сигналов, сбрасывающих страницы.
+        invalidate_tags(*self.tags)
+
+    def load(self, stream):
+        fields = (Post._meta.get_field('pub_date'),
+                  Comment._meta.get_field('created'))
+        with keep_auto_now(*fields):
+            for number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    pending = self.pending[record.pop('model')]
+                except (ValueError, KeyError) as error:
+                    raise CommandError(f'Строка {number}: {error!r}')
+                pending.append(record)
+                if len(pending) >= self.batch:
+                    self.flush()
+            self.flush()
+
+    def builders(self):
+        return {
+            'group': (Group, self.build_groups),
+            'post': (Post, self.build_posts),
+            'comment': (Comment, self.build_comments),
+            'follow': (Follow, self.build_follows),
+        }
+
+    def flush(self):
+        """Записывает накопленное; родительские объекты — раньше детей."""
+        for name, (model, build) in self.builders().items():
+            records = self.pending[name]
+            if not records:
+                continue
+            objects = build(records)
+            if objects:
+                with transaction.atomic():
+                    model.objects.bulk_create(objects)
+            self.tags.update(self.stale_tags(name, objects))
+            self.counts[name] += len(objects)
+            records.clear()
+
+    def conflict(self, name, message):
+        self.conflicts[name] += 1
+        self.stderr.write(f'{name} {message}')
+
+    def fresh(self, name, objects, fields):
+        """Оставляет объекты, чьих id ещё нет в базе.
+
+        Объект с тем же id и теми же ``fields`` уже импортирован и молча
+        пропускается; с другими — конфликт: он не пишется и попадает в
+        отчёт.
+        """
+        model, _ = self.builders()[name]
+        ids = [obj.pk for obj in objects]
+        found = {}
+        for start in range(0, len(ids), LOOKUP_CHUNK):
+            found.update(
+                (row[0], row[1:]) for row in model.objects.filter(
+                    pk__in=ids[start:start + LOOKUP_CHUNK]
+                ).values_list('pk', *fields))
+        result = []
+        for obj in objects:
+            existing = found.get(obj.pk)
+            if existing is None:
+                result.append(obj)
+            elif existing != tuple(getattr(obj, field) for field in fields):
+                self.conflict(name, f'{obj.pk}: id занят другой записью')
+                if name == 'post':
+                    self.rejected_posts.add(obj.pk)
+        return result
+
+    def stale_tags(self, name, objects):
+        """Теги кэша страниц, которые устарели после записи ``objects``."""
+        if name == 'post':
+            return {tag for post in objects for tag in post_tags(post)}
+        if name == 'comment':
+            return {f'post:{comment.post_id}' for comment in objects}
+        if name == 'follow':
+            return {tag for follow in objects
+                    for tag in follow_tags(follow.user_id, follow.author_id)}
+        return set()
+
+    def build_groups(self, records):
+        existing = set(Group.objects.filter(slug__in=[
+            record['slug'] for record in records]).values_list(
+            'slug', flat=True))
+        return [Group(**record) for record in records
+                if record['slug'] not in existing]
+
+    def build_posts(self, records):
+        self.users.resolve(record['author'] for record in records)
+        self.groups.resolve(record['group'] for record in records)
+        return self.fresh('post', [
+            Post(id=record['id'], text=record['text'],
+                 pub_date=parse_datetime(record['pub_date']),
+                 image=record['image'] or '',
+                 author_id=self.users[record['author']],
+                 group_id=self.groups[record['group']])
+            for record in records
+        ], ('author_id', 'pub_date'))
+
+    def build_comments(self, records):
+        self.users.resolve(record['author'] for record in records)
+        comments = []
+        for record in records:
+            if record['post'] in self.rejected_posts:
+                self.conflict('comment', f'{record["id"]}: пост '
+                              f'{record["post"]} не импортирован')
+                continue
+            comments.append(Comment(
+                id=record['id'], post_id=record['post'],
+                text=record['text'],
+                created=parse_datetime(record['created']),
+                author_id=self.users[record['author']]))
+        return self.fresh('comment', comments,
+                          ('post_id', 'author_id', 'created'))
+
+    def build_follows(self, records):
+        self.users.resolve(
+            username for record in records
+            for username in (record['user'], record['author']))
+        pairs = {(self.users[record['user']], self.users[record['author']])
+                 for record in records}
+        users = list({user_id for user_id, _ in pairs})
+        for start in range(0, len(users), LOOKUP_CHUNK):
+            pairs -= set(Follow.objects.filter(
+                user_id__in=users[start:start + LOOKUP_CHUNK]
+            ).values_list('user_id', 'author_id'))
+        return [Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in pairs]
+
+    def rebuild_derived(self):
+        """bulk_create идёт мимо сигналов — достраиваем их работу."""
+        call_command('rebuild_counters', batch_size=self.batch,
+                     stdout=self.stdout)
+        call_command('reindex_search', stdout=self.stdout)
+        self.stdout.write(f'Записей в лентах: {timeline.rebuild()}')
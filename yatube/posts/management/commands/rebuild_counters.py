@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from posts.counters import count_subquery, stats_annotations
+from posts.models import AuthorStats, Comment, Post, User
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счётчики с реальными данными '
+            'и исправляет расхождения пачками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать расхождения, ничего не записывая.')
+
+    def handle(self, *args, **options):
+        batch = options['batch_size']
+        dry_run = options['dry_run']
+        authors = self.reconcile_authors(batch, dry_run)
+        posts = self.reconcile_posts(batch, dry_run)
+        self.stdout.write(
+            f'Пользователей с расхождениями: {authors}, '
+            f'постов с расхождениями: {posts}'
+            + (' (dry run)' if dry_run else '')
+        )
+
+    def _batches(self, queryset, batch):
+        last_pk = 0
+        while True:
+            pks = list(queryset.filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:batch])
+            if not pks:
+                return
+            yield pks
+            last_pk = pks[-1]
+
+    def reconcile_authors(self, batch, dry_run):
+        drifted = 0
+        for pks in self._batches(User.objects.all(), batch):
+            rows = User.objects.filter(pk__in=pks).annotate(
+                **stats_annotations()).values_list(
+                'pk', 'real_posts', 'real_followers', 'real_following')
+            existing = {
+                stats.user_id: stats
+                for stats in AuthorStats.objects.filter(user_id__in=pks)
+            }
+            fixed = []
+            # Пользователи, записанные в обход сигналов (импорт), ещё без
+            # строки счётчиков: она создаётся здесь, а не при чтении.
+            created = []
+            for pk, posts, followers, following in rows:
+                stats = existing.get(pk)
+                if stats is None:
+                    created.append(AuthorStats(
+                        user_id=pk, posts_count=posts,
+                        followers_count=followers,
+                        following_count=following))
+                    continue
+                real = (posts, followers, following)
+                if real != (stats.posts_count, stats.followers_count,
+                            stats.following_count):
+                    (stats.posts_count, stats.followers_count,
+                     stats.following_count) = real
+                    fixed.append(stats)
+            drifted += len(fixed) + len(created)
+            if (fixed or created) and not dry_run:
+                with transaction.atomic():
+                    AuthorStats.objects.bulk_create(
+                        created, ignore_conflicts=True)
+                    AuthorStats.objects.bulk_update(
+                        fixed,
+                        ['posts_count', 'followers_count', 'following_count'],
+                    )
+        return drifted
+
+    def reconcile_posts(self, batch, dry_run):
+        drifted = 0
+        real = count_subquery(Comment.objects.all(), 'post')
+        for pks in self._batches(Post.objects.all(), batch):
+            stale = Post.objects.filter(pk__in=pks).annotate(
+                real_comments=real).filter(
+                ~Q(comments_count=F('real_comments')))
+            stale_pks = list(stale.values_list('pk', flat=True))
+            drifted += len(stale_pks)
+            if stale_pks and not dry_run:
+                Post.objects.filter(pk__in=stale_pks).update(
+                    comments_count=real)
+        return drifted
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import ArchivedComment, ArchivedPost, Comment, Post
+from posts.search import NORMALIZED_TEXT, TABLE
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает полнотекстовый индекс постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        batch = options['batch_size']
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+        posts = comments = 0
+        # Архив индексируется наравне с горячими таблицами: id те же.
+        for model in (Post, ArchivedPost):
+            posts += self.copy(
+                model, f'SELECT id, {NORMALIZED_TEXT}, id '
+                       f'FROM {model._meta.db_table}', batch)
+        for model in (Comment, ArchivedComment):
+            comments += self.copy(
+                model,
+                f'SELECT -id, {NORMALIZED_TEXT}, post_id '
+                f'FROM {model._meta.db_table} WHERE post_id IS NOT NULL',
+                batch,
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        self.stdout.write(
+            f'Проиндексировано постов: {posts}, комментариев: {comments}')
+
+    def copy(self, model, select, batch):
+        """Копирует строки в индекс пачками по диапазонам id."""
+        table = model._meta.db_table
+        total = 0
+        last_id = 0
+        clause = 'AND' if 'WHERE' in select else 'WHERE'
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT MAX(id) FROM (SELECT id FROM {table} '
+                    f'WHERE id > %s ORDER BY id LIMIT %s)',
+                    [last_id, batch],
+                )
+                upper = cursor.fetchone()[0]
+            if upper is None:
+                return total
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {TABLE}(rowid, text, post_id) {select} '
+                    f'{clause} id > %s AND id <= %s',
+                    [last_id, upper],
+                )
+                total += cursor.rowcount
+            last_id = upper
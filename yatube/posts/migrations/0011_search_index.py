@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE posts_search USING fts5("
+                "text, post_id UNINDEXED, "
+                "tokenize='unicode61 remove_diacritics 2')",
+                "INSERT INTO posts_search(rowid, text, post_id) "
+                "SELECT id, replace(replace(text, 'ё', 'е'), 'Ё', 'Е'), id "
+                "FROM posts_post",
+                "INSERT INTO posts_search(rowid, text, post_id) "
+                "SELECT -id, replace(replace(text, 'ё', 'е'), 'Ё', 'Е'), "
+                "post_id FROM posts_comment "
+                "WHERE post_id IS NOT NULL",
+            ],
+            reverse_sql=['DROP TABLE posts_search'],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-17 09:12
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total')[:1]
+    ), 0)
+
+
+def create_author_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    ArchivedPost = apps.get_model('posts', 'ArchivedPost')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    rows = User.objects.filter(stats__isnull=True).annotate(
+        real_posts=(count(Post.objects.all(), 'author')
+                    + count(ArchivedPost.objects.all(), 'author')),
+        real_followers=count(Follow.objects.all(), 'author'),
+        real_following=count(Follow.objects.all(), 'user'),
+    ).values_list('pk', 'real_posts', 'real_followers', 'real_following')
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk, posts_count=posts,
+                     followers_count=followers, following_count=following)
+         for pk, posts, followers, following in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_comment_queue_segment'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_author_stats, migrations.RunPython.noop),
+    ]
@@ -15,6 +15,31 @@ class Group(models.Model):
         return self.title
 
 
+# Поля, которые выводит карточка поста в лентах (posts.cards).
+FEED_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__title', 'group__slug',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для карточек ленты: автор и группа одним JOIN."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+    def for_detail(self):
+        """Пост для отдельной страницы, со всеми полями автора и группы."""
+        return self.select_related('author', 'group')
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_detail(self):
+        """Комментарии под постом: автору нужен только username."""
+        return self.select_related('author').only(
+            'id', 'text', 'created', 'post', 'author__username')
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст поста')
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -33,13 +58,27 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False
+    )
 
-    def __str__(self):
-        return self.text[:settings.LIMIT_POST]
+    objects = PostQuerySet.as_manager()
 
+    class Meta:
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_feed_idx'),
+        ]
 
-class Meta:
-    ordering = ['-pub_date']
+    def __str__(self):
+        return self.text[:settings.LIMIT_POST]
 
 
 class Comment(models.Model):
@@ -58,8 +97,88 @@ class Comment(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True)
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-created", "-id"]
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_idx'),
+        ]
+
+    def __str__(self):
+        return self.text
+
+
+class ArchivedPost(models.Model):
+    """Холодная часть ``Post``: посты старше ``ARCHIVE_AFTER_DAYS``.
+
+    Переносится командой ``archive_posts`` с тем же id, поэтому ссылки на
+    пост продолжают работать. Только для чтения.
+    """
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField(verbose_name='Текст поста')
+    pub_date = models.DateTimeField()
+    group = models.ForeignKey(Group, blank=True,
+                              null=True,
+                              on_delete=models.SET_NULL,
+                              related_name='archived_posts',
+                              verbose_name='Группа')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts'
+    )
+    image = models.ImageField(
+        'Картинка',
+        upload_to='posts/',
+        blank=True
+    )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='archived_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='archived_author_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='archived_group_feed_idx'),
+        ]
+
+    def __str__(self):
+        return self.text[:settings.LIMIT_POST]
+
+
+class ArchivedComment(models.Model):
+    """Комментарий архивного поста."""
+    id = models.IntegerField(primary_key=True)
+    post = models.ForeignKey(
+        ArchivedPost,
+        related_name='comments',
+        on_delete=models.CASCADE)
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments')
+    text = models.TextField(verbose_name='Текст комментария')
+    created = models.DateTimeField(verbose_name='Дата публикации')
+
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
-        ordering = ["-created"]
+        ordering = ["-created", "-id"]
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='archived_comment_post_idx'),
+        ]
 
     def __str__(self):
         return self.text
@@ -84,6 +203,70 @@ class Follow (models.Model):
                 name='uniq_follow'
             )
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_idx'),
+        ]
 
     def __str__(self):
         return self.user
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: строка на пару (читатель, пост)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='uniq_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_feed_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class CommentQueueSegment(models.Model):
+    """Сегмент очереди комментариев (``posts.comment_queue``) в БД.
+
+    Строка пишется в одной транзакции с комментариями сегмента: если
+    процесс упал до удаления файла, повторный сброс его пропустит.
+    """
+    name = models.CharField('Файл сегмента', max_length=64, unique=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,163 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+В виртуальной таблице ``posts_search`` лежит по строке на пост
+(``rowid = post.id``) и на комментарий (``rowid = -comment.id``); колонка
+``post_id`` связывает комментарий с постом. Архивные посты и
+комментарии остаются в индексе под теми же id. Найденные строки
+сворачиваются до постов с лучшим рангом bm25. Токенизатор unicode61 не
+считает «ё» и «е» одной буквой, поэтому «ё» заменяется и в индексе,
+и в запросе.
+"""
+from django.core.paginator import Page, Paginator
+from django.db import connection
+
+from .helpers import pack_cursor, unpack_cursor
+from .models import ArchivedPost, Comment, Post
+
+TABLE = 'posts_search'
+# SQL-выражение для той же замены при массовой переиндексации.
+NORMALIZED_TEXT = "replace(replace(text, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def normalize(text):
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5 (все слова)."""
+    terms = [term.replace('"', '""') for term in normalize(query).split()]
+    return ' '.join(f'"{term}"' for term in terms if term)
+
+
+def index_post(post):
+    _upsert(post.pk, post.text, post.pk)
+
+
+def index_comment(comment):
+    if comment.post_id is not None:
+        _upsert(-comment.pk, comment.text, comment.post_id)
+
+
+def index_comments(ids, batch_size=500):
+    """Индексирует комментарии, вставленные в обход сигналов."""
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {TABLE}(rowid, text, post_id) '
+                f'SELECT -id, {NORMALIZED_TEXT}, post_id '
+                f'FROM {Comment._meta.db_table} '
+                f'WHERE id IN ({placeholders})', chunk)
+
+
+def unindex_post(post):
+    _delete(post.pk)
+
+
+def unindex_comment(comment):
+    _delete(-comment.pk)
+
+
+def _upsert(rowid, text, post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {TABLE}(rowid, text, post_id) VALUES (%s, %s, %s)',
+            [rowid, normalize(text), post_id],
+        )
+
+
+def _delete(rowid):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+
+
+def matching_ids(query):
+    """SQL и параметры подзапроса с id постов, подходящих под ``query``."""
+    return (
+        f'SELECT post_id FROM {TABLE} WHERE {TABLE} MATCH %s',
+        [match_expression(query)],
+    )
+
+
+def search(query, limit, group=None, author=None, after=None):
+    """Возвращает ``[(post_id, score)]`` в порядке релевантности.
+
+    ``after`` — ключ ``(score, post_id)`` последней строки предыдущей
+    страницы; порядок ``score ASC, post_id ASC`` (у bm25 меньше — лучше).
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    # Пост может лежать в горячей таблице или в архиве, с тем же id.
+    where, params = ['(p.id IS NOT NULL OR a.id IS NOT NULL)'], [expression]
+    if group is not None:
+        where.append('COALESCE(p.group_id, a.group_id) = %s')
+        params.append(group.pk)
+    if author is not None:
+        where.append('COALESCE(p.author_id, a.author_id) = %s')
+        params.append(author.pk)
+    if after is not None:
+        where.append('(m.score > %s OR (m.score = %s AND m.post_id > %s))')
+        params.extend([after[0], after[0], after[1]])
+    sql = (
+        f'SELECT m.post_id, m.score FROM ('
+        f'SELECT post_id, MIN(rank) AS score FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s GROUP BY post_id) m '
+        f'LEFT JOIN {Post._meta.db_table} p ON p.id = m.post_id '
+        f'LEFT JOIN {ArchivedPost._meta.db_table} a ON a.id = m.post_id '
+        f'WHERE {" AND ".join(where)}'
+        + ' ORDER BY m.score, m.post_id LIMIT %s'
+    )
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+class SearchPaginator(Paginator):
+    """Keyset-паджинация результатов поиска по ключу ``(score, id)``."""
+
+    def __init__(self, query, per_page, group=None, author=None):
+        super().__init__([], per_page)
+        self.query = query
+        self.group = group
+        self.author = author
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def validate_number(self, number):
+        return int(number)
+
+    def page_after(self, cursor=None):
+        after = None
+        if cursor:
+            try:
+                score, post_id = unpack_cursor(cursor)
+                after = (float(score), int(post_id))
+            except (TypeError, ValueError):
+                after = None
+        rows = search(self.query, self.per_page + 1, group=self.group,
+                      author=self.author, after=after)
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        ids = [post_id for post_id, _ in rows]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        archived = [post_id for post_id in ids if post_id not in posts]
+        if archived:
+            posts.update(ArchivedPost.objects.for_feed().in_bulk(archived))
+        found = [posts[post_id] for post_id, _ in rows if post_id in posts]
+        number = 2 if after else 1
+        self._num_pages = number + 1 if has_next else number
+        page = Page(found, number, self)
+        if has_next:
+            post_id, score = rows[-1]
+            page.next_cursor = pack_cursor([score, post_id])
+        else:
+            page.next_cursor = None
+        page.previous_cursor = None
+        return page
@@ -0,0 +1,183 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache_tags import invalidate_tags
+from . import counters, follow_graph, search, timeline
+from .helpers import follow_tags, post_tags
+from .models import (ArchivedComment, ArchivedPost, AuthorStats, Comment,
+                     Follow, Group, Post)
+
+
+# Граф подписок сбрасывается первым: остальные обработчики (раскладка
+# ленты) читают его и должны увидеть подписку или отписку.
+@receiver(post_save, sender=Follow)
+def add_follow_edge(sender, instance, created, raw=False, using=None,
+                    **kwargs):
+    if created and not raw:
+        follow_graph.changed(instance.user_id, instance.author_id, using)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow_edge(sender, instance, using=None, **kwargs):
+    follow_graph.changed(instance.user_id, instance.author_id, using)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user, instance.author)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    # У нового пользователя ещё ничего нет — все счётчики нулевые.
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_author(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_author(instance.author_id, 'followers_count', 1)
+        counters.bump_author(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'followers_count', -1)
+    counters.bump_author(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.unindex_comment(instance)
+
+
+@receiver(post_delete, sender=ArchivedPost)
+def unindex_archived_post(sender, instance, **kwargs):
+    search.unindex_post(instance)
+
+
+@receiver(post_delete, sender=ArchivedComment)
+def unindex_archived_comment(sender, instance, **kwargs):
+    search.unindex_comment(instance)
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group(sender, instance, created, raw=False, **kwargs):
+    # Название и описание группы выводятся вне фрагментного кэша, но
+    # входят в ETag страницы группы.
+    if not created and not raw:
+        invalidate_tags(f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_author(sender, instance, created, raw=False,
+                      update_fields=None, using=None, **kwargs):
+    # Имя автора выводится на его профиле и страницах постов; вход
+    # сохраняет только last_login и страниц не меняет.
+    if created or raw or update_fields == frozenset({'last_login'}):
+        return
+    invalidate_on_commit(using, f'author:{instance.pk}')
+
+
+def invalidate_on_commit(using, *tags):
+    """Сбрасывает теги сразу и ещё раз после коммита транзакции.
+
+    Сразу — чтобы код в той же транзакции не получил старый фрагмент;
+    после коммита — чтобы не осталась страница, которую другой воркер
+    успел собрать по старым данным и положить под новую версию тега.
+    """
+    invalidate_tags(*tags)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: invalidate_tags(*tags), using=using)
+
+
+# Страницы и ETag сбрасываются здесь, а не во view: правки из админки,
+# shell и команд тоже должны их обновлять.
+@receiver(pre_save, sender=Post)
+def remember_post_placement(sender, instance, raw=False, using=None,
+                            **kwargs):
+    # Пост мог уйти из группы или сменить автора: старые ленты тоже
+    # устаревают.
+    instance._old_placement = Post.objects.using(using).filter(
+        pk=instance.pk).values_list('group_id', 'author_id').first() \
+        if instance.pk else None
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post(sender, instance, using=None, **kwargs):
+    tags = post_tags(instance)
+    old = getattr(instance, '_old_placement', None)
+    if old:
+        group_id, author_id = old
+        tags = post_tags(instance, group_id) + [f'author:{author_id}']
+    invalidate_on_commit(using, *dict.fromkeys(tags))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, using=None, **kwargs):
+    invalidate_on_commit(using, *post_tags(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, using=None, **kwargs):
+    invalidate_on_commit(using, f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, using=None, **kwargs):
+    invalidate_on_commit(using, *follow_tags(instance.user_id,
+                                             instance.author_id))
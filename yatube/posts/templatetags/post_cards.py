@@ -0,0 +1,8 @@
+from django import template
+
+from posts.cards import render_card
+
+register = template.Library()
+
+# {% post_card post group_link=True %} — карточка поста для лент.
+register.simple_tag(render_card, name='post_card')
@@ -0,0 +1,11 @@
+from django import template
+
+from posts.thumbnails import ready_master, ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_image(image, preset):
+    """Миниатюра, если готова, иначе мастер; оригинал не отдаётся."""
+    return ready_thumbnail(image, preset) or ready_master(image)
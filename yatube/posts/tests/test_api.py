@@ -0,0 +1,121 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=cls.author, group=cls.group)
+            for number in range(13)
+        )
+        cls.post = Post.objects.create(author=cls.other, text='Без группы')
+        Comment.objects.create(post=cls.post, author=cls.author,
+                               text='Комментарий')
+
+    def get(self, url, **params):
+        response = Client().get(url, params)
+        body = b''.join(response.streaming_content) if response.streaming \
+            else response.content
+        return response, json.loads(body)
+
+    def test_feeds_match_html_pages(self):
+        """Ленты API отдают те же посты, что и HTML-страницы."""
+        cases = (
+            (reverse('posts:api_index'), Post.objects.all()),
+            (reverse('posts:api_group_posts', args=(self.group.slug,)),
+             self.group.posts.all()),
+            (reverse('posts:api_profile', args=(self.other.username,)),
+             self.other.posts.all()),
+        )
+        for url, posts in cases:
+            with self.subTest(url=url):
+                response, data = self.get(url)
+                self.assertEqual(response['Content-Type'],
+                                 'application/json')
+                self.assertEqual([item['id'] for item in data['results']],
+                                 [post.pk for post in posts[:10]])
+
+    def test_cursor_walks_whole_feed(self):
+        """Курсор из ``next`` листает ленту до конца без повторов."""
+        seen = []
+        params = {'fields': 'id', 'limit': 5}
+        while True:
+            _, data = self.get(reverse('posts:api_index'), **params)
+            seen += [item['id'] for item in data['results']]
+            if not data['next']:
+                break
+            params['cursor'] = data['next']
+        self.assertEqual(seen, list(Post.objects.values_list('pk',
+                                                             flat=True)))
+
+    def test_sparse_fields_select_only_their_columns(self):
+        """``?fields=`` сужает и ответ, и SELECT."""
+        with CaptureQueriesContext(connection) as queries:
+            _, data = self.get(reverse('posts:api_index'), fields='id,group')
+        self.assertEqual(set(data['results'][0]), {'id', 'group'})
+        self.assertEqual([item['group'] for item in data['results'][:2]],
+                         [None, 'group'])
+        sql = queries[-1]['sql']
+        self.assertNotIn('"text"', sql)
+        self.assertNotIn('auth_user', sql)
+
+    def test_post_detail_streams_comments(self):
+        """Страница поста в API включает комментарии по запросу."""
+        url = reverse('posts:api_post_detail', args=(self.post.pk,))
+        _, data = self.get(url, fields='text,comments')
+        self.assertEqual(data, {
+            'text': 'Без группы',
+            'comments': [{
+                'id': self.post.comments.get().pk,
+                'author': 'author',
+                'text': 'Комментарий',
+                'created': self.post.comments.get().created.isoformat(),
+            }],
+        })
+        _, data = self.get(url)
+        self.assertIsNone(data['group'])
+        self.assertEqual(data['comments_count'], 1)
+
+    def test_errors_are_json(self):
+        """Ошибки API приходят JSON-ом с правильным кодом."""
+        response, data = self.get(reverse('posts:api_index'),
+                                  fields='id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', data['error'])
+        response, _ = self.get(reverse('posts:api_profile',
+                                       args=('nobody',)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_queries_run_before_response(self):
+        """Запросы идут до ответа и входят в замер запроса."""
+        urls = (
+            (reverse('posts:api_index'), {}, 'posts_post'),
+            (reverse('posts:api_post_detail', args=(self.post.pk,)),
+             {'fields': 'text,comments'}, 'posts_comment'),
+        )
+        for url, params, table in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as before:
+                    response = Client().get(url, params)
+                with CaptureQueriesContext(connection) as during:
+                    body = b''.join(response.streaming_content)
+                self.assertEqual(len(during), 0)
+                json.loads(body)
+                self.assertIn(f'FROM "{table}"', before[-1]['sql'])
+                self.assertEqual(response.perf_metrics['queries'],
+                                 len(before))
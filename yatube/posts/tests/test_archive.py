@@ -0,0 +1,172 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import search
+from posts.archive import archive_before
+from posts.counters import author_stats
+from posts.helpers import CursorPaginator
+from posts.models import ArchivedPost, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        now = timezone.now()
+        for number in range(25):
+            post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text=f'Пост {number}')
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(days=400 - number * 20))
+        cls.old = Post.objects.order_by('pub_date').first()
+        Comment.objects.create(post=cls.old, author=cls.author,
+                               text='Старый комментарий')
+        cls.expected = list(Post.objects.order_by('-pub_date', '-id')
+                            .values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        self.cutoff = timezone.now() - timedelta(days=200)
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_moves_posts_and_comments(self):
+        """Старые посты уезжают в архив вместе с комментариями."""
+        old = Post.objects.filter(pub_date__lt=self.cutoff).count()
+        self.assertEqual(archive_before(self.cutoff, batch_size=3),
+                         (old, 1))
+        self.assertEqual(ArchivedPost.objects.count(), old)
+        self.assertFalse(Post.objects.filter(
+            pub_date__lt=self.cutoff).exists())
+        archived = ArchivedPost.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.text, self.old.text)
+        self.assertEqual(archived.comments.get().text, 'Старый комментарий')
+        self.assertFalse(Comment.objects.exists())
+        found = {pk for pk, _ in search.search('Пост', 100)}
+        self.assertEqual(found, set(self.expected))
+
+    def test_command_uses_age_threshold(self):
+        out = StringIO()
+        call_command('archive_posts', older_than_days=200, stdout=out)
+        self.assertIn('комментариев: 1', out.getvalue())
+        self.assertTrue(ArchivedPost.objects.exists())
+
+    def test_feed_falls_through_to_archive(self):
+        """Лента листается за конец горячей части без дублей и дыр."""
+        archive_before(self.cutoff)
+        paginator = CursorPaginator(Post.objects.all(), 4,
+                                    archive=ArchivedPost.objects.all())
+        seen = []
+        page = paginator.page_after()
+        while True:
+            seen += [post.pk for post in page]
+            if not page.has_next():
+                break
+            page = paginator.page_after(page.next_cursor)
+        self.assertEqual(seen, self.expected)
+        previous = paginator.page_after(page.previous_cursor)
+        self.assertEqual([post.pk for post in previous],
+                         self.expected[-len(page) - 4:-len(page)])
+        numbered = [post.pk for number in range(1, 8)
+                    for post in paginator.page(number)]
+        self.assertEqual(numbered, self.expected)
+
+    def test_archive_page_by_number_does_not_count(self):
+        """Страница ``?page=N`` целиком в архиве открывается без COUNT."""
+        archive_before(self.cutoff)
+        paginator = CursorPaginator(Post.objects.all(), 4,
+                                    archive=ArchivedPost.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.page(5)
+        self.assertEqual([post.pk for post in page], self.expected[16:20])
+        self.assertFalse(any('COUNT(' in query['sql'].upper()
+                             for query in queries.captured_queries))
+        with self.assertRaises(EmptyPage):
+            paginator.page(8)
+
+    def test_archived_posts_stay_searchable(self):
+        archive_before(self.cutoff)
+        self.assertIn(self.old.pk, {pk for pk, _ in search.search(
+            'старый комментарий', 10, group=self.group, author=self.author)})
+        page = search.SearchPaginator('Пост', 100).page_after()
+        self.assertEqual({post.pk for post in page}, set(self.expected))
+        self.assertIn(ArchivedPost, {type(post) for post in page})
+        ArchivedPost.objects.get(pk=self.old.pk).delete()
+        self.assertNotIn(self.old.pk, {pk for pk, _ in search.search(
+            'Старый', 10)})
+        out = StringIO()
+        call_command('reindex_search', stdout=out)
+        self.assertIn(f'постов: {len(self.expected) - 1}', out.getvalue())
+
+    def test_follow_feed_falls_through_to_archive(self):
+        """Лента подписок добирает архив, и со «знаменитостями» тоже."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        archive_before(self.cutoff)
+        self.client.force_login(reader)
+        for limit in (100, 0):
+            with self.subTest(limit=limit), self.settings(
+                    TIMELINE_FANOUT_LIMIT=limit):
+                seen = []
+                response = self.client.get(reverse('posts:follow_index'))
+                while True:
+                    page = response.context['page_obj']
+                    seen += [post.pk for post in page]
+                    if not page.has_next():
+                        break
+                    response = self.client.get(
+                        reverse('posts:follow_index'),
+                        {'cursor': page.next_cursor})
+                self.assertEqual(seen, self.expected)
+                numbered = self.client.get(reverse('posts:follow_index'),
+                                           {'page': 3})
+                self.assertEqual(
+                    [post.pk for post in numbered.context['page_obj']],
+                    self.expected[20:])
+
+    def test_first_page_does_not_read_archive(self):
+        archive_before(self.cutoff)
+        paginator = CursorPaginator(Post.objects.all(), 4,
+                                    archive=ArchivedPost.objects.all())
+        with self.assertNumQueries(1):
+            list(paginator.page_after())
+
+    def test_views_serve_archived_posts(self):
+        """Архивный пост открывается по старой ссылке, но только читается."""
+        archive_before(self.cutoff)
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.old.pk,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['archived'])
+        self.assertContains(response, 'Старый комментарий')
+        self.assertNotContains(
+            response, reverse('posts:add_comment', args=(self.old.pk,)))
+        profile = reverse('posts:profile', args=(self.author.username,))
+        last = self.client.get(profile, {'page': 3}).context['page_obj']
+        self.assertEqual([post.pk for post in last], self.expected[20:])
+        api = self.client.get(
+            reverse('posts:api_post_detail', args=(self.old.pk,)))
+        self.assertEqual(api.status_code, 200)
+
+    def test_author_counters_keep_archived_posts(self):
+        before = author_stats(self.author).posts_count
+        archive_before(self.cutoff)
+        self.assertEqual(author_stats(self.author).posts_count, before)
+        out = StringIO()
+        call_command('rebuild_counters', dry_run=True, stdout=out)
+        self.assertIn('Пользователей с расхождениями: 0', out.getvalue())
@@ -0,0 +1,135 @@
+import json
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.budgets import BudgetTestMixin
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ViewBudgetTests(BudgetTestMixin, TestCase):
+    """Число запросов каждой страницы не растёт с размером выборки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.authors = [User.objects.create_user(username=f'author_{i}')
+                       for i in range(3)]
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        # Больше страницы в каждой ленте, чтобы оба замера читали только
+        # горячую часть.
+        cls.add_posts(12)
+        cls.post = Post.objects.first()
+        cls.add_comments(3)
+
+    @classmethod
+    def add_posts(cls, count):
+        for author in cls.authors:
+            for number in range(count):
+                Post.objects.create(author=author, group=cls.group,
+                                    text=f'Пост про котов {number}')
+
+    @classmethod
+    def add_comments(cls, count):
+        for number in range(count):
+            Comment.objects.create(post=cls.post,
+                                   author=cls.authors[number % 3],
+                                   text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def measure(self, url, **params):
+        cache.clear()
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        return response.perf_metrics['queries']
+
+    def check(self, *urls, **params):
+        """Бюджет и одно и то же число запросов на малой и большой выборке."""
+        small = {url: self.measure(url, **params) for url in urls}
+        self.add_posts(24)
+        self.add_comments(30)
+        large = {url: self.measure(url, **params) for url in urls}
+        self.assertEqual(small, large)
+
+    def test_feeds(self):
+        """Ленты укладываются в бюджет запросов."""
+        self.check(
+            reverse('posts:post'),
+            reverse('posts:group_posts', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.authors[0].username,)),
+            reverse('posts:follow_index'),
+        )
+
+    def test_post_detail(self):
+        """Страница поста укладывается в бюджет запросов."""
+        self.check(reverse('posts:post_detail', args=(self.post.pk,)),
+                   reverse('posts:post_comments', args=(self.post.pk,)))
+
+    def test_search(self):
+        """Поиск укладывается в бюджет запросов."""
+        self.check(reverse('posts:search'), q='котов')
+
+    def test_forms(self):
+        """Формы создания и правки укладываются в бюджет запросов."""
+        self.measure(reverse('posts:post_create'))
+        self.client.force_login(self.post.author)
+        self.measure(reverse('posts:post_edit', args=(self.post.pk,)))
+
+    def test_writes(self):
+        """Запись поста и комментария укладывается в бюджет POST."""
+        requests = (
+            (reverse('posts:post_create'),
+             {'text': 'Новый пост', 'group': self.group.pk}),
+            (reverse('posts:add_comment', args=(self.post.pk,)),
+             {'text': 'Ещё комментарий'}),
+        )
+        for url, data in requests:
+            with self.subTest(url=url):
+                response = self.client.post(url, data)
+                self.assertEqual(response.status_code, 302)
+                self.assertWithinBudget(response)
+        self.client.force_login(self.post.author)
+        response = self.client.post(
+            reverse('posts:post_edit', args=(self.post.pk,)),
+            {'text': 'Правка', 'group': self.group.pk})
+        self.assertWithinBudget(response)
+
+    def test_budget_is_per_method(self):
+        """Превышение ищется в бюджете своего метода и пишется в лог."""
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as budgets:
+            json.dump({'posts:post': {'POST': {'queries': 0}}}, budgets)
+            budgets.flush()
+            with override_settings(PERF_BUDGETS_FILE=budgets.name,
+                                   PERF_LOG=True):
+                client = Client()
+                with self.assertLogs('yatube.perf', 'INFO') as logs:
+                    response = client.get(reverse('posts:post'))
+        self.assertNotIn('over_budget', response.perf_metrics)
+        self.assertEqual([record.levelname for record in logs.records],
+                         ['INFO'])
+
+    @override_settings(PERF_HEADERS=True)
+    def test_metrics_headers(self):
+        """Замеры отдаются в заголовках, когда это включено."""
+        response = self.client.get(reverse('posts:post'))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertEqual(response['X-Query-Count'],
+                         str(response.perf_metrics['queries']))
+        cached = self.client.get(reverse('posts:post'))
+        self.assertGreater(cached.perf_metrics['cache_hits'], 0)
+        self.assertLess(cached.perf_metrics['queries'],
+                        response.perf_metrics['queries'])
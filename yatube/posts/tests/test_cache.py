@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.cache_tags import tag_versions
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='post_auth')
+        cls.group = Group.objects.create(
+            title='Первая группа', slug='first', description='Описание')
+        cls.other_group = Group.objects.create(
+            title='Вторая группа', slug='second', description='Описание')
+        Post.objects.bulk_create(
+            Post(text=f'Пост номер {i}', author=cls.auth, group=cls.group)
+            for i in range(13)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post_auth = Client()
+        self.post_auth.force_login(self.auth)
+
+    def test_pages_are_cached_separately(self):
+        """Каждая страница ленты кэшируется под своим ключом."""
+        first = self.post_auth.get(reverse('posts:post'))
+        second = self.post_auth.get(reverse('posts:post') + '?page=2')
+        self.assertNotEqual(first.content, second.content)
+        self.assertEqual(len(second.context['page_obj']), 3)
+
+    def test_post_create_invalidates_feed(self):
+        """Новый пост сразу виден в ленте, несмотря на кэш."""
+        self.post_auth.get(reverse('posts:post'))
+        self.post_auth.post(reverse('posts:post_create'),
+                            data={'text': 'Свежий пост'})
+        response = self.post_auth.get(reverse('posts:post'))
+        self.assertContains(response, 'Свежий пост')
+
+    def test_comment_bumps_only_post_tag(self):
+        """Комментарий инвалидирует страницу поста, но не ленту."""
+        post = Post.objects.first()
+        before = tag_versions('feed', f'post:{post.pk}')
+        self.post_auth.post(reverse('posts:add_comment', args=(post.pk,)),
+                            data={'text': 'Комментарий'})
+        after = tag_versions('feed', f'post:{post.pk}')
+        self.assertEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+        response = self.post_auth.get(
+            reverse('posts:post_detail', args=(post.pk,)))
+        self.assertContains(response, 'Комментарий')
+
+    def test_edit_invalidates_old_and_new_group(self):
+        """Перенос поста в другую группу обновляет обе ленты групп."""
+        post = Post.objects.first()
+        old_url = reverse('posts:group_posts', args=('first',))
+        new_url = reverse('posts:group_posts', args=('second',))
+        self.post_auth.get(old_url)
+        self.post_auth.get(new_url)
+        self.post_auth.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            data={'text': 'Перенесённый пост', 'group': self.other_group.pk})
+        self.assertNotContains(self.post_auth.get(old_url),
+                               'Перенесённый пост')
+        self.assertContains(self.post_auth.get(new_url), 'Перенесённый пост')
+
+    def test_orm_changes_invalidate_pages(self):
+        """Правка и удаление мимо view (админка, shell) обновляют ленты."""
+        post = Post.objects.filter(group=self.group).first()
+        group_url = reverse('posts:group_posts', args=('first',))
+        self.post_auth.get(group_url)
+        post.text = 'Исправлено в shell'
+        post.save()
+        self.assertContains(self.post_auth.get(group_url),
+                            'Исправлено в shell')
+        post.delete()
+        self.assertNotContains(self.post_auth.get(group_url),
+                               'Исправлено в shell')
+
+    def test_orm_comment_invalidates_post_page(self):
+        """Комментарий, добавленный мимо view, виден на странице поста."""
+        post = Post.objects.first()
+        url = reverse('posts:post_detail', args=(post.pk,))
+        self.post_auth.get(url)
+        post.comments.create(author=self.auth, text='Из админки')
+        self.assertContains(self.post_auth.get(url), 'Из админки')
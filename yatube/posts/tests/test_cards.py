@@ -0,0 +1,73 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import cards
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class PostCardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='<b>Текст</b> & ещё')
+        Post.objects.filter(pk=cls.post.pk).update(
+            pub_date=timezone.make_aware(datetime.datetime(2021, 3, 8, 12)))
+        cls.post.refresh_from_db()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_url_matches_reverse(self):
+        """Адреса из заготовок совпадают с reverse, включая экранирование."""
+        for name, arg in (('posts:profile', 'author'),
+                          ('posts:profile', 'имя с пробелом'),
+                          ('posts:post_detail', 42),
+                          ('posts:group_posts', 'test-slug')):
+            with self.subTest(name=name, arg=arg):
+                self.assertEqual(cards.url(name, arg),
+                                 reverse(name, args=[arg]))
+
+    def test_card_matches_template_output(self):
+        """Дата как у фильтра date, текст экранирован, ссылки по флагам."""
+        html = cards.render_card(self.post)
+        self.assertIn('Автор: Лев Толстой', html)
+        self.assertIn(Template('{{ value|date:"d E Y" }}').render(
+            Context({'value': self.post.pub_date})), html)
+        self.assertIn('&lt;b&gt;Текст&lt;/b&gt; &amp; ещё', html)
+        self.assertNotIn('<a href', html)
+        html = cards.render_card(self.post, profile_link=True,
+                                 detail_link=True, group_link=True)
+        for name, arg in (('posts:profile', 'author'),
+                          ('posts:post_detail', self.post.pk),
+                          ('posts:group_posts', 'test-slug')):
+            self.assertIn(f'href="{reverse(name, args=[arg])}"', html)
+
+    def test_feeds_render_cards(self):
+        """Ленты выводят карточки со ссылками своей страницы."""
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        group = reverse('posts:group_posts', args=('test-slug',))
+        profile = reverse('posts:profile', args=('author',))
+        pages = {
+            reverse('posts:post'): [group],
+            group: [detail],
+            profile: [profile, detail, group],
+        }
+        for url, links in pages.items():
+            with self.subTest(url=url):
+                content = self.client.get(url).content.decode()
+                self.assertIn('&lt;b&gt;Текст&lt;/b&gt;', content)
+                for link in links:
+                    self.assertIn(f'href="{link}"', content)
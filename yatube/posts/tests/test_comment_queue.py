@@ -0,0 +1,188 @@
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import comment_queue, search
+from posts.models import Comment, CommentQueueSegment, Post
+
+User = get_user_model()
+
+QUEUE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(COMMENT_WRITE_BEHIND=True, COMMENT_QUEUE_DIR=QUEUE_DIR,
+                   COMMENT_FLUSH_INTERVAL=3600)
+class CommentQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(QUEUE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.detail = reverse('posts:post_detail', args=(self.post.pk,))
+        self.addCleanup(self.drop_queue)
+
+    def drop_queue(self):
+        for name in os.listdir(QUEUE_DIR):
+            os.remove(os.path.join(QUEUE_DIR, name))
+
+    def comment(self, text):
+        return self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': text})
+
+    def test_author_sees_queued_comment_at_once(self):
+        """Комментарий из очереди виден автору, но ещё не в БД."""
+        self.assertRedirects(self.comment('Ёжик в тумане'), self.detail)
+        self.assertFalse(Comment.objects.exists())
+        response = self.client.get(self.detail)
+        self.assertContains(response, 'Ёжик в тумане')
+        self.assertContains(response, 'публикуется')
+        self.assertNotContains(Client().get(self.detail), 'Ёжик в тумане')
+
+    def test_flush_writes_batch_with_side_effects(self):
+        """Сброс пишет пачку и делает то, что делали бы сигналы."""
+        for number in range(3):
+            self.comment(f'Ёжик {number}')
+        self.assertEqual(comment_queue.flush(), 3)
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+        self.assertEqual([post_id for post_id, _ in
+                          search.search('ежик', 10)], [self.post.pk])
+        self.assertEqual(comment_queue.pending(self.post.pk,
+                                               self.reader.pk), [])
+        response = self.client.get(self.detail)
+        self.assertNotContains(response, 'публикуется')
+        self.assertContains(response, 'Ёжик 2')
+        self.assertEqual(os.listdir(QUEUE_DIR), ['flush.lock'])
+
+    def test_flush_keeps_enqueue_time_and_own_ids(self):
+        """Время постановки сохраняется, индексируются только свои строки."""
+        queued_at = timezone.now() - timedelta(minutes=5)
+        with mock.patch.object(comment_queue.timezone, 'now',
+                               return_value=queued_at):
+            self.comment('Из очереди')
+
+        def insert_with_neighbour(records, batch):
+            insert(records, batch)
+            Comment.objects.create(post=self.post, author=self.author,
+                                   text='Мимо очереди')
+
+        insert = comment_queue._insert
+        with mock.patch.object(comment_queue, '_insert',
+                               side_effect=insert_with_neighbour), \
+                mock.patch.object(comment_queue.search,
+                                  'index_comments') as index:
+            self.assertEqual(comment_queue.flush(), 1)
+        queued = Comment.objects.get(text='Из очереди')
+        self.assertEqual(queued.created, queued_at)
+        self.assertEqual(index.call_args[0][0], [queued.pk])
+
+    def test_replayed_segment_is_not_duplicated(self):
+        """Сегмент, записанный до падения, при повторе пропускается."""
+        self.comment('Один раз')
+        # Падение между коммитом и удалением сегмента.
+        with mock.patch.object(comment_queue.os, 'remove',
+                               side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                comment_queue.flush()
+        segment, = (name for name in os.listdir(QUEUE_DIR)
+                    if name.endswith(comment_queue.SEGMENT))
+        with open(os.path.join(QUEUE_DIR, segment), 'a') as file:
+            file.write('{"post": ')
+        with self.assertLogs('posts.comment_queue', 'WARNING'):
+            self.assertEqual(comment_queue.flush(), 0)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(os.listdir(QUEUE_DIR), ['flush.lock'])
+        self.assertFalse(CommentQueueSegment.objects.exists())
+
+    def test_replay_detects_segment_not_first_record(self):
+        """Совпадение первой записи с комментарием в БД — не повтор."""
+        self.comment('Повтор')
+        self.comment('Второй')
+        # Тот же текст пришёл в БД мимо очереди (другой воркер без
+        # write-behind), уже после постановки в очередь.
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Повтор')
+        self.assertEqual(comment_queue.flush(), 2)
+        self.assertEqual(Comment.objects.filter(text='Повтор').count(), 2)
+
+    def test_overlay_is_written_before_log(self):
+        """Сброс сразу после записи в журнал не оставляет оверлей."""
+        def append_and_flush(record):
+            append(record)
+            comment_queue.flush()
+
+        append = comment_queue._append
+        with mock.patch.object(comment_queue, '_append',
+                               side_effect=append_and_flush):
+            self.comment('Быстрый сброс')
+        self.assertEqual(Comment.objects.get().text, 'Быстрый сброс')
+        self.assertEqual(
+            comment_queue.pending(self.post.pk, self.reader.pk), [])
+
+    def test_concurrent_overlay_updates_are_kept(self):
+        """Параллельные комментарии одного автора все видны в оверлее."""
+        def write(number):
+            comment_queue.enqueue(self.post, self.reader, f'Поток {number}')
+
+        with mock.patch.object(comment_queue, '_ensure_worker'):
+            threads = [threading.Thread(target=write, args=(number,))
+                       for number in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        texts = {record['text'] for record in
+                 comment_queue.pending(self.post.pk, self.reader.pk)}
+        self.assertEqual(texts, {f'Поток {number}' for number in range(8)})
+
+    def test_comments_to_deleted_posts_are_dropped(self):
+        post = Post.objects.create(author=self.author, text='Удалю')
+        comment_queue.enqueue(post, self.reader, 'В пустоту')
+        self.comment('Останется')
+        post.delete()
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(Comment.objects.get().text, 'Останется')
+
+    def test_appends_survive_concurrent_rotation(self):
+        """Записи параллельных писателей не теряются при ротации журнала."""
+        writers, per_writer = 8, 50
+        record = {'post': self.post.pk, 'author': self.reader.pk,
+                  'text': 'x', 'created': '2026-01-01T00:00:00+00:00'}
+
+        def write():
+            for _ in range(per_writer):
+                comment_queue._append(record)
+
+        threads = [threading.Thread(target=write) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            comment_queue._rotate()
+        for thread in threads:
+            thread.join()
+        comment_queue._rotate()
+        lines = sum(len(comment_queue._read(name))
+                    for name in os.listdir(QUEUE_DIR))
+        self.assertEqual(lines, writers * per_writer)
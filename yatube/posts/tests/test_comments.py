@@ -0,0 +1,89 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.views import COMMENTS_AMOUNT
+
+User = get_user_model()
+
+CURSOR = re.compile(r'data-comments-url="([^"]+)"')
+
+
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        commenters = [User.objects.create_user(username=f'user_{number}')
+                      for number in range(5)]
+        for number in range(COMMENTS_AMOUNT * 2 + 5):
+            Comment.objects.create(post=cls.post,
+                                   author=commenters[number % 5],
+                                   text=f'Комментарий {number}')
+        cls.expected = list(cls.post.comments.values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_post_page_renders_first_batch(self):
+        """Страница поста показывает только первую пачку и кнопку."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        page = response.context['comments_page']
+        self.assertEqual([comment.pk for comment in page],
+                         self.expected[:COMMENTS_AMOUNT])
+        self.assertContains(response, 'Показать ещё комментарии')
+        self.assertNotContains(response, 'Комментарий 0')
+
+    def test_load_more_walks_all_comments(self):
+        """Фрагменты по курсору отдают все комментарии без дублей."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        seen = [comment.pk for comment in response.context['comments_page']]
+        url = CURSOR.search(response.content.decode()).group(1)
+        while url:
+            response = self.client.get(url.replace('&amp;', '&'))
+            self.assertTemplateUsed(response,
+                                    'posts/includes/comments_page.html')
+            self.assertNotContains(response, '<html')
+            seen += [comment.pk
+                     for comment in response.context['comments_page']]
+            found = CURSOR.search(response.content.decode())
+            url = found and found.group(1)
+        self.assertEqual(seen, self.expected)
+
+    def test_batch_loads_authors_in_same_query(self):
+        """Пачка комментариев — один запрос вместе с авторами."""
+        page = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        ).context['comments_page']
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:post_comments',
+                                    args=(self.post.pk,)),
+                            {'cursor': page.next_cursor})
+        comment_queries = [query for query in queries
+                           if 'posts_comment' in query['sql']]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertIn('auth_user', comment_queries[0]['sql'])
+
+    def test_cached_batch_skips_database(self):
+        url = reverse('posts:post_comments', args=(self.post.pk,))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([query for query in queries
+                          if 'posts_comment' in query['sql']])
+
+    def test_unknown_post_is_404(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk + 100,)))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,120 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Пост')
+        cls.urls = (
+            reverse('posts:post'),
+            reverse('posts:group_posts', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.author.username,)),
+            reverse('posts:post_detail', args=(cls.post.pk,)),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def etag(self, url):
+        # Первый показ страницы с формой ставит cookie CSRF, и она
+        # входит в валидатор.
+        self.client.get(url)
+        return self.client.get(url)['ETag']
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_page_is_304_for_one_query(self):
+        """Неизменная страница — 304 не дороже одного лёгкого запроса."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.etag(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.revalidate(url, etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertLessEqual(len(queries), 1)
+                self.assertFalse(hasattr(response, 'templates')
+                                 and response.templates)
+
+    def test_writes_change_validators(self):
+        """Новый пост, комментарий и подписка меняют ETag страниц."""
+        etags = {url: self.etag(url) for url in self.urls}
+        self.client.force_login(self.author)
+        author_etags = {url: self.etag(url) for url in self.urls}
+        self.client.post(reverse('posts:post_create'),
+                         data={'text': 'Новый', 'group': self.group.pk})
+        for url, etag in author_etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url, etag).status_code, 200)
+        self.client.force_login(self.reader)
+        detail = self.urls[-1]
+        etag = self.etag(detail)
+        self.client.post(reverse('posts:add_comment', args=(self.post.pk,)),
+                         data={'text': 'Комментарий'})
+        self.assertEqual(self.revalidate(detail, etag).status_code, 200)
+        profile = self.urls[2]
+        etag = self.etag(profile)
+        self.client.get(reverse('posts:profile_follow',
+                                args=(self.author.username,)))
+        self.assertEqual(self.revalidate(profile, etag).status_code, 200)
+        self.assertNotEqual(etags[profile], etag)
+
+    def test_admin_and_orm_edits_change_validators(self):
+        """Правки из админки и через ORM тоже меняют ETag страниц."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        profile, detail = self.urls[2], self.urls[3]
+        etags = {url: self.etag(url) for url in (profile, detail)}
+        staff = Client()
+        staff.force_login(admin)
+        response = staff.post(
+            reverse('admin:posts_post_change', args=(self.post.pk,)),
+            data={'text': 'Исправлено в админке',
+                  'author': self.author.pk, 'group': self.group.pk})
+        self.assertEqual(response.status_code, 302)
+        for url, etag in etags.items():
+            with self.subTest(url=url, edit='admin'):
+                self.assertContains(self.revalidate(url, etag),
+                                    'Исправлено в админке')
+        etag = self.etag(profile)
+        self.author.first_name = 'Лев'
+        self.author.save()
+        self.assertEqual(self.revalidate(profile, etag).status_code, 200)
+        etags = {url: self.etag(url) for url in self.urls}
+        Post.objects.get(pk=self.post.pk).delete()
+        for url, etag in etags.items():
+            with self.subTest(url=url, edit='orm delete'):
+                self.assertNotEqual(self.revalidate(url, etag).status_code,
+                                    304)
+
+    def test_validator_depends_on_session(self):
+        """Другой пользователь не получает 304 на чужой ETag."""
+        url = self.urls[0]
+        etag = self.etag(url)
+        self.assertEqual(Client().get(url, HTTP_IF_NONE_MATCH=etag)
+                         .status_code, 200)
+
+    def test_missing_objects_still_404(self):
+        """Для несуществующих страниц валидатора нет, ответ — 404."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk + 100,)),
+            HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
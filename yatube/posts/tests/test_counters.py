@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.counters import author_stats
+from posts.models import AuthorStats, Comment, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_write_paths_update_counters(self):
+        """Создание и удаление записей меняют счётчики."""
+        self.author_client.post(reverse('posts:post_create'),
+                                data={'text': 'Пост'})
+        post = Post.objects.get()
+        self.reader_client.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            data={'text': 'Комментарий'})
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=(self.author.username,)))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count), (1, 1))
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 1)
+
+        Comment.objects.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,)))
+        post.delete()
+        stats.refresh_from_db()
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count), (0, 0))
+
+    def test_rebuild_counters_fixes_drift(self):
+        """Команда rebuild_counters исправляет разъехавшиеся счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        call_command('rebuild_counters', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(author_stats(self.author).posts_count, 1)
+
+    def test_new_user_gets_stats_row(self):
+        """Строка счётчиков создаётся вместе с пользователем."""
+        user = User.objects.create_user(username='newcomer')
+        stats = AuthorStats.objects.get(user=user)
+        self.assertEqual((stats.posts_count, stats.followers_count,
+                          stats.following_count), (0, 0, 0))
+
+    def test_profile_without_stats_row_writes_nothing(self):
+        """Без строки профиль считает агрегаты и ничего не пишет."""
+        Post.objects.create(author=self.author, text='Пост')
+        AuthorStats.objects.filter(user=self.author).delete()
+        response = self.reader_client.get(
+            reverse('posts:profile', args=(self.author.username,)))
+        self.assertEqual(response.context['stats'].posts_count, 1)
+        self.assertFalse(
+            AuthorStats.objects.filter(user=self.author).exists())
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(author_stats(self.author).posts_count, 1)
+        self.assertTrue(
+            AuthorStats.objects.filter(user=self.author).exists())
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import follow_graph
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow(self, user, author):
+        client = Client()
+        client.force_login(user)
+        client.get(reverse('posts:profile_follow', args=(author.username,)))
+
+    def test_profile_shows_viewers_own_follow_state(self):
+        """Кнопка зависит от подписки смотрящего, а не от чужих подписок."""
+        self.follow(self.fan, self.author)
+        url = reverse('posts:profile', args=(self.author.username,))
+        self.assertFalse(self.client.get(url).context['following'])
+        self.follow(self.reader, self.author)
+        self.assertTrue(self.client.get(url).context['following'])
+        self.assertFalse(Client().get(url).context['following'])
+
+    def test_warm_graph_answers_without_sql(self):
+        """Прогретый граф отвечает без единого запроса к БД."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow_graph.followees(self.reader.pk)
+        follow_graph.follower_counts([self.author.pk, self.fan.pk])
+        with self.assertNumQueries(0):
+            self.assertTrue(follow_graph.is_following(self.reader,
+                                                      self.author))
+            self.assertFalse(follow_graph.is_following(self.reader,
+                                                       self.fan))
+            self.assertFalse(follow_graph.is_following(AnonymousUser(),
+                                                       self.author))
+            self.assertEqual(follow_graph.follower_counts(
+                [self.author.pk, self.fan.pk]),
+                {self.author.pk: 1, self.fan.pk: 0})
+
+    def test_follow_and_unfollow_reset_graph(self):
+        """Подписка и отписка сбрасывают граф, и он собирается заново."""
+        self.assertEqual(follow_graph.followees(self.reader.pk), set())
+        self.assertEqual(follow_graph.follower_count(self.author.pk), 0)
+        self.follow(self.reader, self.author)
+        self.follow(self.fan, self.author)
+        self.assertEqual(follow_graph.followees(self.reader.pk),
+                         {self.author.pk})
+        self.assertEqual(follow_graph.follower_count(self.author.pk), 2)
+        self.client.get(reverse('posts:profile_unfollow',
+                                args=(self.author.username,)))
+        self.assertEqual(follow_graph.followees(self.reader.pk), set())
+        self.assertEqual(follow_graph.follower_count(self.author.pk), 1)
+        with self.assertNumQueries(0):
+            follow_graph.followees(self.reader.pk)
+            follow_graph.follower_count(self.author.pk)
+
+    def test_graph_is_reset_again_after_commit(self):
+        """После коммита сбрасывается и граф, собранный до него."""
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            Follow.objects.create(user=self.reader, author=self.author)
+        # Другой воркер успел собрать граф по данным до коммита.
+        cache.set(follow_graph.FOLLOWEES_KEY.format(self.reader.pk),
+                  frozenset())
+        cache.set(follow_graph.FOLLOWERS_KEY.format(self.author.pk), 0)
+        for call in on_commit.call_args_list:
+            call[0][0]()
+        self.assertEqual(follow_graph.followees(self.reader.pk),
+                         {self.author.pk})
+        self.assertEqual(follow_graph.follower_count(self.author.pk), 1)
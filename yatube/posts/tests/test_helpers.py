@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from posts.helpers import CursorPaginator, pagin
+from posts.models import Post
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='post_auth')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.auth) for i in range(25)
+        )
+        cls.expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def test_walk_forward_and_back(self):
+        """Курсоры проходят ленту вперёд и назад без пропусков."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.page_after()
+        second = paginator.page_after(first.next_cursor)
+        third = paginator.page_after(second.next_cursor)
+        self.assertEqual(list(first) + list(second) + list(third),
+                         self.expected)
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+        back = paginator.page_after(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_page_is_single_query_without_count(self):
+        """Страница по курсору — один запрос без COUNT(*)."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.page_after().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            list(paginator.page_after(cursor))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        """Испорченный курсор отдаёт первую страницу."""
+        request = RequestFactory().get('/', {'cursor': 'garbage'})
+        page = pagin(request, Post.objects.all(), 10)
+        self.assertEqual(list(page), self.expected[:10])
+
+    def test_legacy_page_number(self):
+        """Старые ссылки ``?page=N`` продолжают работать."""
+        request = RequestFactory().get('/', {'page': '3'})
+        page = pagin(request, Post.objects.all(), 10)
+        self.assertEqual(list(page), self.expected[20:])
+        self.assertFalse(page.has_next())
+
+    def test_bad_page_number_falls_back_to_first_page(self):
+        """Номер за концом ленты или огромный отдаёт первую страницу."""
+        for number in ('99', '99999999999999999999', '0', '-1', 'abc'):
+            with self.subTest(number=number):
+                request = RequestFactory().get('/', {'page': number})
+                page = pagin(request, Post.objects.all(), 10)
+                self.assertEqual(list(page), self.expected[:10])
+                self.assertTrue(page.has_next())
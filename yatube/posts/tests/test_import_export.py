@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.cache_tags import tag_versions
+from posts.counters import author_stats
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineEntry)
+from posts.search import SearchPaginator
+
+User = get_user_model()
+
+OLD_DATE = datetime(2015, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class ImportExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(7):
+            post = Post.objects.create(author=cls.author, group=group,
+                                       text=f'Пост про котов {number}')
+            Comment.objects.create(post=post, author=cls.reader,
+                                   text=f'Комментарий {number}')
+        Post.objects.filter(pk=post.pk).update(pub_date=OLD_DATE)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        self.path = os.path.join(directory, 'dump.ndjson')
+        self.addCleanup(lambda: os.path.exists(self.path)
+                        and os.remove(self.path))
+
+    def export(self):
+        call_command('export_posts', output=self.path, stderr=StringIO())
+        with open(self.path) as stream:
+            return [json.loads(line) for line in stream]
+
+    def test_export_is_one_object_per_line(self):
+        """Каждая строка выгрузки — самостоятельный JSON-объект."""
+        records = self.export()
+        kinds = [record['model'] for record in records]
+        self.assertEqual(kinds, ['group'] + ['post'] * 7
+                         + ['comment'] * 7 + ['follow'])
+        self.assertEqual(records[-1],
+                         {'model': 'follow', 'user': 'reader',
+                          'author': 'author'})
+
+    def test_round_trip_restores_everything(self):
+        """Импорт в пустую базу восстанавливает данные и производные."""
+        expected = list(Post.objects.values_list(
+            'id', 'text', 'pub_date', 'author__username', 'group__slug'))
+        self.export()
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        Group.objects.all().delete()
+        AuthorStats.objects.all().delete()
+        User.objects.filter(username='reader').delete()
+        call_command('import_posts', self.path, batch_size=3,
+                     stdout=StringIO())
+        self.assertEqual(list(Post.objects.values_list(
+            'id', 'text', 'pub_date', 'author__username', 'group__slug')),
+            expected)
+        self.assertTrue(Post.objects.filter(pub_date=OLD_DATE).exists())
+        self.assertEqual(Comment.objects.count(), 7)
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertTrue(Follow.objects.filter(
+            user=reader, author=self.author).exists())
+        self.assertEqual(TimelineEntry.objects.filter(user=reader).count(),
+                         7)
+        self.assertEqual(author_stats(self.author).posts_count, 7)
+        self.assertEqual(Post.objects.first().comments_count, 1)
+        self.assertEqual(len(SearchPaginator('котов', 10).page_after()), 7)
+
+    def test_import_invalidates_pages(self):
+        """Импорт мимо сигналов всё равно сбрасывает теги страниц."""
+        self.export()
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        tags = ('feed', f'author:{self.author.pk}',
+                f'follows:{self.reader.pk}')
+        before = tag_versions(*tags)
+        call_command('import_posts', self.path, skip_derived=True,
+                     stdout=StringIO())
+        for tag, old, new in zip(tags, before, tag_versions(*tags)):
+            with self.subTest(tag=tag):
+                self.assertNotEqual(old, new)
+
+    def test_import_is_idempotent(self):
+        """Повторный импорт той же выгрузки не создаёт дублей."""
+        self.export()
+        stderr = StringIO()
+        call_command('import_posts', self.path, skip_derived=True,
+                     stdout=StringIO(), stderr=stderr)
+        self.assertEqual(Post.objects.count(), 7)
+        self.assertEqual(Comment.objects.count(), 7)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(stderr.getvalue(), '')
+
+    def test_taken_ids_are_reported(self):
+        """Пост с занятым чужим id не пишется, его комментарии тоже."""
+        self.export()
+        taken = Post.objects.order_by('pk').first().pk
+        Post.objects.filter(pk=taken).delete()
+        stranger = Post.objects.create(id=taken, author=self.reader,
+                                       text='Чужой пост')
+        stderr = StringIO()
+        call_command('import_posts', self.path, skip_derived=True,
+                     stdout=StringIO(), stderr=stderr)
+        self.assertEqual(Post.objects.get(pk=taken).text, stranger.text)
+        self.assertFalse(Comment.objects.filter(post=stranger).exists())
+        self.assertIn(f'post {taken}: id занят', stderr.getvalue())
+        self.assertIn('Конфликты: post: 1, comment: 1', stderr.getvalue())
@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.helpers import CursorPaginator
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def bad_steps(plan):
+    """Шаги плана с полным проходом по таблице или сортировкой в B-tree."""
+    return [
+        step for step in plan.splitlines()
+        if (step.startswith('SCAN') and 'USING' not in step)
+        or 'USE TEMP B-TREE' in step
+    ]
+
+
+def explain(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '\n'.join(row[-1] for row in cursor.fetchall())
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(15)
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def assert_plans(self, url):
+        first = self.client.get(url)
+        urls = [url]
+        cursor = getattr(first.context['page_obj'], 'next_cursor', None) \
+            if first.context and 'page_obj' in first.context else None
+        if cursor:
+            urls.append(f'{url}?cursor={cursor}')
+        for target in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(target)
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                plan = explain(sql)
+                with self.subTest(url=target, sql=sql):
+                    self.assertEqual(bad_steps(plan), [], plan)
+
+    def test_index(self):
+        """Главная лента читается по индексу."""
+        self.assert_plans(reverse('posts:post'))
+
+    def test_group_posts(self):
+        """Лента группы читается по индексу."""
+        self.assert_plans(reverse('posts:group_posts', args=('group',)))
+
+    def test_profile(self):
+        """Лента автора читается по индексу."""
+        self.assert_plans(reverse('posts:profile', args=('author',)))
+
+    def test_post_detail(self):
+        """Страница поста и комментарии читаются по индексу."""
+        self.assert_plans(reverse('posts:post_detail', args=(self.post.pk,)))
+
+    def test_follow_index(self):
+        """Лента подписок читается по индексу."""
+        self.assert_plans(reverse('posts:follow_index'))
+
+    def test_keyset_condition_uses_index(self):
+        """Условие keyset-паджинации не ломает индексный доступ."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.page_after()
+        queryset = paginator.object_list.filter(
+            paginator._seek([page[-1].pub_date, page[-1].id],
+                            reverse=False))[:11]
+        plan = explain(*queryset.query.sql_with_params())
+        self.assertEqual(bad_steps(plan), [], plan)
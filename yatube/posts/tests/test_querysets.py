@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryShapeTests(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Первый пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feeds_do_not_grow_with_page_size(self):
+        """Ленты делают одинаково запросов для одного и десяти постов."""
+        urls = (
+            reverse('posts:post'),
+            reverse('posts:group_posts', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:follow_index'),
+        )
+        single = [self.count_queries(url) for url in urls]
+        for number in range(9):
+            Post.objects.create(author=self.author, group=self.group,
+                                text=f'Пост {number}')
+        for url, expected in zip(urls, single):
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), expected)
+
+    def test_detail_does_not_grow_with_comments(self):
+        """Страница поста не делает запрос на каждого комментатора."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Первый')
+        single = self.count_queries(url)
+        for number in range(9):
+            commenter = User.objects.create_user(username=f'user_{number}')
+            Comment.objects.create(post=self.post, author=commenter,
+                                   text=f'Комментарий {number}')
+        self.assertEqual(self.count_queries(url), single)
+
+    def test_feed_loads_only_card_fields(self):
+        """Лента не тянет поля, которых нет в карточке поста."""
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(post.author.get_full_name(), 'Лев Толстой')
+            self.assertEqual(post.group.slug, 'group')
+        self.assertIn('comments_count', post.get_deferred_fields())
+        self.assertIn('email', post.author.get_deferred_fields())
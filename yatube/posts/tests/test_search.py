@@ -0,0 +1,85 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+from posts.search import SearchPaginator, match_expression
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='post_auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.in_text = Post.objects.create(
+            author=cls.auth, group=cls.group, text='Пишем про Котов')
+        cls.in_comment = Post.objects.create(
+            author=cls.other, text='Совсем другая тема')
+        Comment.objects.create(
+            post=cls.in_comment, author=cls.auth, text='а коты тут при чём')
+        cls.unrelated = Post.objects.create(
+            author=cls.auth, text='Ничего интересного')
+
+    def found(self, query, **filters):
+        return list(SearchPaginator(query, 10, **filters).page_after())
+
+    def test_index_follows_saves_and_deletes(self):
+        """Индекс обновляется при создании, правке и удалении."""
+        self.assertEqual(self.found('котов'), [self.in_text])
+        self.in_text.text = 'Теперь про собак'
+        self.in_text.save()
+        self.assertEqual(self.found('котов'), [])
+        self.assertEqual(self.found('собак'), [self.in_text])
+        self.in_comment.comments.all().delete()
+        self.assertEqual(self.found('коты'), [])
+
+    def test_comments_match_their_post_once(self):
+        """Совпадение в комментарии находит пост, без дублей."""
+        Comment.objects.create(
+            post=self.in_comment, author=self.other, text='коты, коты')
+        self.assertEqual(self.found('коты'), [self.in_comment])
+
+    def test_filters(self):
+        """Фильтры по группе и автору сужают выдачу."""
+        Post.objects.create(author=self.other, text='Про котов тоже')
+        self.assertEqual(self.found('котов', group=self.group),
+                         [self.in_text])
+        self.assertEqual(self.found('котов', author=self.auth),
+                         [self.in_text])
+
+    def test_keyset_pages_do_not_overlap(self):
+        """Страницы поиска идут по курсору без повторов."""
+        for number in range(15):
+            Post.objects.create(author=self.auth, text=f'ёжик номер {number}')
+        paginator = SearchPaginator('ежик', 10)
+        first = paginator.page_after()
+        second = paginator.page_after(first.next_cursor)
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 5)
+        self.assertFalse(set(first) & set(second))
+        self.assertFalse(second.has_next())
+
+    def test_query_is_escaped(self):
+        """Синтаксис FTS5 во вводе пользователя не ломает запрос."""
+        self.assertEqual(match_expression('a" OR b*'), '"a""" "OR" "b*"')
+        self.assertEqual(self.found('"котов" NEAR('), [])
+
+    def test_search_view(self):
+        """Страница поиска показывает найденные посты."""
+        response = Client().get(reverse('posts:search'), {'q': 'котов'})
+        self.assertEqual(list(response.context['page_obj']), [self.in_text])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс."""
+        model_admin = admin.site._registry[Post]
+        request = RequestFactory().get('/admin/posts/post/')
+        queryset, _ = model_admin.get_search_results(
+            request, Post.objects.all(), 'коты')
+        self.assertEqual(list(queryset), [self.in_comment])
+        self.assertNotIn('LIKE', str(queryset.query).upper())
@@ -0,0 +1,143 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='post_auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.auth,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.thumbnail = thumbnails.thumbnail_name(self.post.image.name,
+                                                   'card')
+
+    def test_page_never_builds_thumbnails(self):
+        """Показ страницы ничего не строит и не отдаёт оригинал."""
+        with mock.patch.object(thumbnails, '_get_executor') as executor, \
+                mock.patch.object(thumbnails, 'generate',
+                                  side_effect=AssertionError('resize')):
+            response = Client().get(reverse('posts:post'))
+        self.assertNotContains(response, self.post.image.url)
+        executor.assert_not_called()
+        self.assertFalse(default_storage.exists(self.thumbnail))
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_upload_queues_thumbnails_after_commit(self):
+        """Загрузка ставит миниатюры в пул только после коммита."""
+        client = Client()
+        client.force_login(self.auth)
+        with mock.patch.object(thumbnails, '_get_executor') as executor, \
+                mock.patch.object(thumbnails.transaction,
+                                  'on_commit') as on_commit:
+            client.post(reverse('posts:post_create'), data={
+                'text': 'Ещё пост',
+                'image': SimpleUploadedFile('new.gif', SMALL_GIF,
+                                            'image/gif'),
+            })
+            executor.assert_not_called()
+            for callback, *_ in on_commit.call_args_list:
+                callback[0]()
+        post = Post.objects.get(text='Ещё пост')
+        executor.return_value.submit.assert_called_once_with(
+            thumbnails._build, post.image.name, mock.ANY)
+
+    def test_generated_thumbnail_is_used(self):
+        """Готовую миниатюру шаблон берёт вместо оригинала."""
+        original = self.post.image.name
+        self.assertEqual(thumbnails.generate(original), 2)
+        self.assertEqual(thumbnails.generate(original), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image.name, original)
+        self.assertTrue(default_storage.exists(original))
+        thumbnail = thumbnails.ready_thumbnail(self.post.image, 'card')
+        self.assertEqual(thumbnail.name, self.thumbnail)
+        with default_storage.open(self.thumbnail) as file, \
+                Image.open(file) as image:
+            self.assertEqual(image.size, (960, 339))
+        response = Client().get(reverse('posts:post'))
+        self.assertContains(response, thumbnail.url)
+
+    def test_command_builds_missing_thumbnails(self):
+        """build_thumbnails строит недостающие и сбрасывает кэш страниц."""
+        Client().get(reverse('posts:post'))
+        out = StringIO()
+        call_command('build_thumbnails', stdout=out)
+        self.assertIn('Построено мастеров и миниатюр: 2, ошибок: 0',
+                      out.getvalue())
+        response = Client().get(reverse('posts:post'))
+        self.assertContains(response, default_storage.url(self.thumbnail))
+        call_command('build_thumbnails', stdout=out)
+        self.assertIn('Построено мастеров и миниатюр: 0', out.getvalue())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=64)
+    def test_master_is_capped_and_has_no_metadata(self):
+        """Мастер уменьшен, без EXIF; его отдают страница и API."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Phone'
+        photo = BytesIO()
+        Image.new('RGB', (200, 100), 'red').save(photo, 'JPEG',
+                                                 exif=exif.tobytes())
+        post = Post.objects.create(
+            author=self.auth, text='Фото с телефона',
+            image=SimpleUploadedFile('photo.jpg', photo.getvalue(),
+                                     'image/jpeg'))
+        # Без миниатюр: страница должна взять сам мастер.
+        with override_settings(POST_THUMBNAILS={}):
+            self.assertEqual(thumbnails.generate(post.image.name), 1)
+        master = thumbnails.ready_master(post.image)
+        self.assertEqual(master.name, 'masters/' + post.image.name)
+        with default_storage.open(master.name) as file, \
+                Image.open(file) as image:
+            self.assertEqual(image.size, (32, 64))
+            self.assertFalse(image.getexif())
+            self.assertNotIn('exif', image.info)
+        response = Client().get(
+            reverse('posts:post_detail', args=(post.pk,)))
+        self.assertContains(response, master.url)
+        self.assertNotContains(response, post.image.url)
+        response = Client().get(
+            reverse('posts:api_post_detail', args=(post.pk,)))
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['image'], master.url)
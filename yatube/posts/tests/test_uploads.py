@@ -0,0 +1,124 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import uploads
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Тег EXIF «Orientation»: 6 — камеру держали боком, повернуть на 90°.
+ORIENTATION = 0x0112
+
+
+def photo(size=(3000, 1000), orientation=6, image_format='JPEG'):
+    image = Image.new('RGB', size, 'white')
+    image.paste('red', (0, 0, size[0] // 10, size[1]))
+    exif = Image.Exif()
+    exif[ORIENTATION] = orientation
+    exif[0x010F] = 'Камера'
+    output = BytesIO()
+    image.save(output, image_format, exif=exif.tobytes(), quality=95)
+    return output.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def create(self, content, name='photo.jpg'):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с фото',
+            'image': SimpleUploadedFile(name, content, 'image/jpeg'),
+        })
+
+    def test_oversize_upload_rejected_before_decoding(self):
+        """Файл больше лимита не пишется целиком и не доходит до PIL."""
+        content = photo()
+        with override_settings(POST_IMAGE_MAX_BYTES=len(content) // 2):
+            response = self.create(content)
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'file_too_large'))
+        self.assertFalse(Post.objects.exists())
+
+    def test_upload_is_truncated_on_disk(self):
+        """Обработчик загрузки не пишет на диск байты сверх лимита."""
+        handler = uploads.LimitedUploadHandler()
+        with override_settings(POST_IMAGE_MAX_BYTES=100):
+            handler.new_file('image', 'photo.jpg', 'image/jpeg', 1000)
+            for start in range(0, 1000, 64):
+                handler.receive_data_chunk(b'x' * 64, start)
+            upload = handler.file_complete(1000)
+        self.assertTrue(upload.oversize)
+        self.assertEqual(upload.size, 1024)
+        upload.seek(0, 2)
+        self.assertLessEqual(upload.tell(), 128)
+
+    def test_limit_applies_only_to_post_forms(self):
+        """Админка принимает файл целиком: обработчик стоит только у форм."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        content = photo(size=(300, 100))
+        with override_settings(POST_IMAGE_MAX_BYTES=len(content) // 2):
+            response = client.post(reverse('admin:posts_post_add'), data={
+                'text': 'Из админки', 'author': self.author.pk,
+                'image': SimpleUploadedFile('photo.jpg', content,
+                                            'image/jpeg'),
+            })
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(text='Из админки')
+        self.assertEqual(post.image.size, len(content))
+
+    def test_post_forms_still_check_csrf(self):
+        """Проверка CSRF у форм постов идёт после установки обработчика."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = client.post(reverse('posts:post_create'),
+                               data={'text': 'Без токена'})
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.exists())
+
+    def test_too_many_pixels_rejected(self):
+        """Размеры проверяются по заголовку, без полного декодирования."""
+        with override_settings(POST_IMAGE_MAX_PIXELS=1000):
+            response = self.create(photo(size=(100, 100)))
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'too_many_pixels'))
+
+    def test_normalized_is_rotated_and_capped(self):
+        """Копия для миниатюр повёрнута по EXIF и не больше лимита."""
+        with Image.open(BytesIO(photo())) as source:
+            image = uploads.normalized(source)
+        self.assertEqual(image.mode, 'RGB')
+        self.assertEqual(max(image.size), settings.POST_IMAGE_MAX_SIDE)
+        # Картинка была 3000×1000 и лежала на боку.
+        self.assertGreater(image.height, image.width)
+
+    def test_transparency_is_kept(self):
+        """Картинки с прозрачностью не теряют альфа-канал."""
+        output = BytesIO()
+        Image.new('RGBA', (10, 10), (0, 0, 0, 0)).save(output, 'PNG')
+        with Image.open(output) as source:
+            self.assertEqual(uploads.normalized(source).mode, 'RGBA')
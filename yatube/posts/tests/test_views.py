@@ -195,7 +195,8 @@ class StaticViewsTests(TestCase):
         """Тестирование cache для главной страницы."""
         original = self.post_auth.get(reverse('posts:post'))
         posts = original.content
-        Post.objects.get(id=1).delete()
+        # update() не шлёт сигналов, и теги кэша остаются прежними.
+        Post.objects.filter(id=1).update(text='Текст мимо сигналов')
         new = self.post_auth.get(reverse('posts:post'))
         new_posts = new.content
         self.assertEqual(new_posts, posts)
@@ -0,0 +1,176 @@
+"""Мастер-копии и миниатюры картинок постов.
+
+Мастер — картинка, повёрнутая по EXIF, уменьшенная до
+``POST_IMAGE_MAX_SIDE`` и пересжатая без метаданных (EXIF, GPS);
+миниатюры режутся из неё. Сайт показывает только мастер и миниатюры,
+ссылка на загруженный оригинал не отдаётся: пока мастера нет, картинки
+у поста не видно. Оригинал не меняется и не удаляется.
+
+Всё строится не при показе страницы, а после загрузки картинки (пул
+потоков, задача ставится после коммита) или командой
+``build_thumbnails`` для уже загруженных. Имена однозначно выводятся из
+имени картинки (``masters/posts/a.jpg``, ``thumbs/960x339/posts/a.jpg``),
+поэтому шаблону достаточно проверить, есть ли файл.
+"""
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from core.cache_tags import invalidate_tags
+
+from . import uploads
+from .helpers import post_tags
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'thumbs'
+MASTER_DIR = 'masters'
+# Мастер таких картинок — PNG: у них бывает прозрачность.
+LOSSLESS_EXTENSIONS = ('.png', '.gif', '.webp')
+
+Thumbnail = namedtuple('Thumbnail', 'name url')
+
+_executor = None
+
+
+def _get_executor():
+    # Потоки, а не процессы: Pillow отпускает GIL на декодировании и
+    # ресайзе, а дочерние процессы унаследовали бы соединения с БД и
+    # настройки родителя.
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails')
+    return _executor
+
+
+def thumbnail_name(name, preset):
+    """Имя миниатюры картинки ``name`` размера ``preset``."""
+    width, height = settings.POST_THUMBNAILS[preset]['size']
+    stem = os.path.splitext(name)[0]
+    return f'{THUMBNAIL_DIR}/{width}x{height}/{stem}.jpg'
+
+
+def master_name(name):
+    """Имя мастер-копии картинки ``name``."""
+    stem, extension = os.path.splitext(name)
+    suffix = '.png' if extension.lower() in LOSSLESS_EXTENSIONS else '.jpg'
+    return f'{MASTER_DIR}/{stem}{suffix}'
+
+
+def _ready(name, storage):
+    if not storage.exists(name):
+        return None
+    return Thumbnail(name, storage.url(name))
+
+
+def ready_thumbnail(image, preset, storage=default_storage):
+    """Готовая миниатюра или ``None``; сама ничего не строит."""
+    if not image:
+        return None
+    return _ready(thumbnail_name(image.name, preset), storage)
+
+
+def ready_master(image, storage=default_storage):
+    """Готовый мастер или ``None``; сам ничего не строит."""
+    if not image:
+        return None
+    return _ready(master_name(image.name), storage)
+
+
+def _flatten(image):
+    if image.mode == 'RGB':
+        return image
+    # Прозрачные места — белые, как фон карточки.
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image)
+    return background
+
+
+def _jpeg(image):
+    output = BytesIO()
+    _flatten(image).save(output, 'JPEG', quality=settings.POST_IMAGE_QUALITY,
+                         optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def render(image, preset):
+    """Миниатюра в JPEG из уже повёрнутой по EXIF картинки PIL."""
+    options = settings.POST_THUMBNAILS[preset]
+    if options.get('crop'):
+        image = ImageOps.fit(image, options['size'], Image.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail(options['size'], Image.LANCZOS)
+    return _jpeg(image)
+
+
+def render_master(image, name):
+    """Мастер из ``uploads.normalized``: метаданные не переносятся."""
+    if name.endswith('.png'):
+        output = BytesIO()
+        image.save(output, 'PNG', optimize=True)
+        return output.getvalue()
+    return _jpeg(image)
+
+
+def _save(storage, name, content):
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def generate(name, storage=default_storage, force=False):
+    """Строит недостающие мастер и миниатюры; возвращает число файлов.
+
+    Оригинал декодируется только ради мастера; миниатюры режутся из
+    мастера — он уже повёрнут и в разы меньше оригинала.
+    """
+    master = master_name(name)
+    build_master = force or not storage.exists(master)
+    missing = [preset for preset in settings.POST_THUMBNAILS
+               if force or not storage.exists(thumbnail_name(name, preset))]
+    if not build_master and not missing:
+        return 0
+    side = settings.POST_IMAGE_MAX_SIDE
+    with storage.open(name if build_master else master) as source, \
+            Image.open(source) as opened:
+        # JPEG декодируется сразу с уменьшением в 2–8 раз, но не мельче
+        # мастера.
+        opened.draft('RGB', (side, side))
+        image = uploads.normalized(opened)
+    if build_master:
+        _save(storage, master, render_master(image, master))
+    for preset in missing:
+        _save(storage, thumbnail_name(name, preset), render(image, preset))
+    return build_master + len(missing)
+
+
+def _build(name, tags):
+    generate(name)
+    # Фрагменты с карточкой показывают оригинал до сброса тегов.
+    invalidate_tags(*tags)
+
+
+def _on_done(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Не удалось построить миниатюры: %s', error)
+
+
+def enqueue_on_commit(post):
+    """Ставит миниатюры картинки поста в пул после коммита транзакции."""
+    if not settings.THUMBNAIL_WORKERS:
+        return
+    name, tags = post.image.name, post_tags(post)
+    transaction.on_commit(lambda: _get_executor().submit(
+        _build, name, tags).add_done_callback(_on_done))
@@ -0,0 +1,163 @@
+"""Лента подписок с раскладкой постов по читателям при записи.
+
+Каждый новый пост копируется в ``TimelineEntry`` всех подписчиков автора,
+поэтому лента подписок читается одним диапазоном индекса
+``(user, -pub_date, -post)``. Посты авторов, у которых подписчиков больше
+``settings.TIMELINE_FANOUT_LIMIT``, не раскладываются: они подмешиваются
+в ленту при чтении. Когда после отписки у автора подписчиков не больше
+порога, а его посты разложены не всем, они раскладываются по лентам всех
+оставшихся подписчиков: пока он был «знаменитостью», новые посты и
+подписки в ленты не попадали.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from . import follow_graph
+from .models import (ArchivedPost, FEED_FIELDS, Follow, Post,
+                     TimelineEntry)
+
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+
+def is_celebrity(author):
+    return (follow_graph.follower_count(author.pk)
+            > settings.TIMELINE_FANOUT_LIMIT)
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user, author):
+    """Дозаполняет ленту читателя постами автора после подписки."""
+    if is_celebrity(author):
+        return
+    posts = Post.objects.filter(author=author).values_list('pk', 'pub_date')
+    _bulk_insert(
+        TimelineEntry(user_id=user.pk, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts.iterator()
+    )
+
+
+def prune(user, author):
+    """Убирает посты автора из ленты читателя после отписки.
+
+    Если автор был «знаменитостью», а теперь подписчиков не больше
+    порога, досыпает ленты остальных подписчиков (``fan_out_author``).
+    Граф подписок к этому моменту уже учёл отписку.
+    """
+    TimelineEntry.objects.filter(
+        user=user,
+        post__in=Post.objects.filter(author=author).values('pk'),
+    ).delete()
+    if not is_celebrity(author) and was_celebrity(author):
+        fan_out_author(author)
+
+
+def was_celebrity(author):
+    """Не разложен ли последний пост автора кому-то из подписчиков.
+
+    Так видно, что автор был «знаменитостью», сколько бы подписок ни
+    исчезло разом (каскадное или массовое удаление) и как бы ни менялся
+    ``settings.TIMELINE_FANOUT_LIMIT``.
+    """
+    latest = Post.objects.filter(author=author).order_by(
+        '-pub_date', '-id').values_list('pk', flat=True).first()
+    if latest is None:
+        return False
+    entries = TimelineEntry.objects.filter(post_id=latest).count()
+    return entries < follow_graph.follower_count(author.pk)
+
+
+def fan_out_author(author):
+    """Раскладывает все посты автора по лентам всех его подписчиков.
+
+    Уже разложенные записи пропускаются; возвращает число новых.
+    """
+    entries = TimelineEntry._meta.db_table
+    follows = Follow._meta.db_table
+    posts = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {entries} (user_id, post_id, pub_date) '
+            f'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM {follows} follow '
+            f'JOIN {posts} post ON post.author_id = follow.author_id '
+            f'WHERE follow.author_id = %s',
+            [author.pk],
+        )
+        return cursor.rowcount
+
+
+def rebuild():
+    """Раскладывает посты по лентам всех подписок одним INSERT ... SELECT.
+
+    Нужна после массового импорта, который обходит сигналы; уже
+    разложенные записи пропускаются.
+    """
+    entries = TimelineEntry._meta.db_table
+    follows = Follow._meta.db_table
+    posts = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {entries} (user_id, post_id, pub_date) '
+            f'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM {follows} follow '
+            f'JOIN {posts} post ON post.author_id = follow.author_id '
+            f'WHERE follow.author_id NOT IN ('
+            f'SELECT author_id FROM {follows} GROUP BY author_id '
+            f'HAVING COUNT(*) > %s)',
+            [settings.TIMELINE_FANOUT_LIMIT],
+        )
+        return cursor.rowcount
+
+
+def celebrity_followees(user):
+    """id «знаменитостей» среди подписок читателя — по графу в кэше."""
+    counts = follow_graph.follower_counts(follow_graph.followees(user.pk))
+    return [author_id for author_id, count in counts.items()
+            if count > settings.TIMELINE_FANOUT_LIMIT]
+
+
+def follow_feed(user):
+    """Возвращает queryset ленты, порядок и архив для keyset-паджинации.
+
+    Обычный случай — диапазон по ``TimelineEntry``; если читатель подписан
+    на «знаменитостей», лента собирается при чтении из двух источников.
+    В ленты архивные посты не раскладываются: они добираются из
+    ``ArchivedPost`` по подпискам, как и в остальных лентах.
+    """
+    archive = ArchivedPost.objects.filter(
+        author__in=follow_graph.followees(user.pk)).for_feed()
+    celebrities = celebrity_followees(user)
+    if celebrities:
+        posts = Post.objects.filter(
+            Q(author__in=celebrities)
+            | Q(pk__in=TimelineEntry.objects.filter(
+                user=user).values('post_id'))
+        ).for_feed()
+        return posts, ('-pub_date', '-id'), archive
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group').only(
+        'pub_date', 'post', *(f'post__{field}' for field in FEED_FIELDS))
+    # Ключ ленты — (pub_date, post_id); у архивного поста это его id.
+    return (entries, TIMELINE_ORDERING,
+            archive.annotate(post_id=F('id')))
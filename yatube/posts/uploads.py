@@ -0,0 +1,98 @@
+"""Загрузка картинок постов с ограничениями и нормализацией.
+
+Формы постов (декоратор ``limited_uploads``) пишут файл на диск по мере
+приёма, не копя его в памяти; байты сверх ``POST_IMAGE_MAX_BYTES`` не
+пишутся вовсе, а форма отклоняет такой файл до декодирования. Остальные
+view, включая админку, принимают загрузки обычными обработчиками Django.
+Размеры проверяются по заголовку картинки. После коммита
+``posts.thumbnails`` строит из оригинала мастер-копию без метаданных,
+повёрнутую по EXIF и уменьшенную до ``POST_IMAGE_MAX_SIDE``; сайт
+показывает её и нарезанные из неё миниатюры.
+"""
+from functools import wraps
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файл во временный файл на диске и обрезает его по лимиту.
+
+    Лишние байты читаются из сокета, но отбрасываются; у итогового файла
+    ``oversize`` и настоящий ``size``, чтобы форма сообщила об ошибке.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(min(
+            file_size, settings.POST_IMAGE_MAX_BYTES))
+        file.oversize = self.received > settings.POST_IMAGE_MAX_BYTES
+        file.size = self.received
+        return file
+
+
+def limited_uploads(view):
+    """Декоратор view: файлы принимает ``LimitedUploadHandler``.
+
+    Обработчик нужно поставить до первого чтения ``request.POST``, а его
+    читает проверка CSRF в middleware, поэтому CSRF проверяется уже
+    внутри, после установки обработчика.
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, LimitedUploadHandler(request))
+        return protected(request, *args, **kwargs)
+    return csrf_exempt(wrapper)
+
+
+def is_oversize(upload):
+    return upload is not None and (
+        getattr(upload, 'oversize', False)
+        or upload.size > settings.POST_IMAGE_MAX_BYTES)
+
+
+def oversize_error():
+    return forms.ValidationError(
+        'Файл больше %(limit)s.', code='file_too_large',
+        params={'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)})
+
+
+def check_dimensions(image):
+    """Проверяет размеры, которые ImageField уже прочитал из заголовка."""
+    if not hasattr(image, 'image'):
+        return
+    width, height = image.image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise forms.ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height})
+
+
+def normalized(image):
+    """Картинка PIL, повёрнутая по EXIF и не больше ``POST_IMAGE_MAX_SIDE``.
+
+    Режим — RGB или, если у картинки есть прозрачность, RGBA.
+    """
+    image = ImageOps.exif_transpose(image)
+    transparent = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if transparent else 'RGB')
+    side = settings.POST_IMAGE_MAX_SIDE
+    image.thumbnail((side, side), Image.LANCZOS)
+    return image
@@ -1,60 +1,165 @@
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.shortcuts import get_object_or_404, render, redirect
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+
+from core.cache_tags import fragment_cache, tags_etag
+from . import comment_queue, follow_graph
+from .archive import get_post_or_404
+from .counters import author_stats
 from .forms import PostForm, CommentForm
-from .helpers import pagin
-from .models import Group, Post, User, Follow
+from .helpers import COMMENTS_ORDERING, lazy_pagin, pagin
+from .models import (ArchivedPost, Group, Post, PostQuerySet, TimelineEntry,
+                     User, Follow)
+from .search import SearchPaginator
+from .thumbnails import enqueue_on_commit
+from .uploads import limited_uploads
+from .timeline import follow_feed
 
 
 POSTS_AMOUNT = 10
+COMMENTS_AMOUNT = 20
+
+
+# Валидаторы для условного GET: считаются до основных запросов и шаблонов
+# по версиям тех же тегов, что и фрагментный кэш; если страница не
+# найдена, возвращают None, и view отвечает как обычно.
+def index_etag(request):
+    return tags_etag(request, 'feed')
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    return group_id and tags_etag(request, f'group:{group_id}')
 
 
+def profile_etag(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    return author_id and tags_etag(
+        request, f'author:{author_id}', f'follows:{author_id}')
+
+
+def post_etag(request, post_id):
+    # Свои комментарии из очереди видны только в свежей странице.
+    if settings.COMMENT_WRITE_BEHIND and comment_queue.pending(
+            post_id, request.session.get(SESSION_KEY)):
+        return None
+    author_id = (
+        Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True).first()
+        or ArchivedPost.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True).first()
+    )
+    return author_id and tags_etag(
+        request, f'post:{post_id}', f'author:{author_id}')
+
+
+@condition(etag_func=index_etag)
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.select_related('author').all()
+    posts = Post.objects.for_feed()
     context = {
-        'page_obj': pagin(request, posts, POSTS_AMOUNT),
+        'page_obj': lazy_pagin(request, posts, POSTS_AMOUNT,
+                               archive=ArchivedPost.objects.for_feed()),
+        **fragment_cache(request, 'feed'),
     }
     return render(request, template, context)
 
 
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.for_feed()
     context = {
         'group': group,
-        'page_obj': pagin(request, posts, POSTS_AMOUNT),
+        'page_obj': lazy_pagin(request, posts, POSTS_AMOUNT,
+                               archive=group.archived_posts.for_feed()),
+        **fragment_cache(request, f'group:{group.pk}'),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@condition(etag_func=profile_etag)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    following = author.following.exists()
     context = {
         'author': author,
-        'following': following,
-        'page_obj': pagin(request, author.posts.all(), POSTS_AMOUNT),
+        'stats': author_stats(author),
+        'following': follow_graph.is_following(request.user, author),
+        'page_obj': lazy_pagin(request, author.posts.for_feed(),
+                               POSTS_AMOUNT,
+                               archive=author.archived_posts.for_feed()),
+        **fragment_cache(request, f'author:{author.pk}'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_post_or_404(post_id, PostQuerySet.for_detail)
     author = post.author
-    post_list = author.posts.all()
     form = CommentForm(request.POST or None)
-    commentss = post.comments.all()
     context = {
         'post': post,
-        'post_list': post_list,
         'author': author,
+        'stats': author_stats(author),
         'form': form,
-        'commentss': commentss,
+        'comments_page': comments_page(request, post),
+        'pending_comments': comment_queue.pending_comments(
+            post, request.user),
+        'archived': isinstance(post, ArchivedPost),
+        **fragment_cache(request, f'post:{post.pk}'),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_page(request, post):
+    """Пачка комментариев после ``?cursor=``, автор — тем же запросом."""
+    return lazy_pagin(request, post.comments.for_detail(), COMMENTS_AMOUNT,
+                      ordering=COMMENTS_ORDERING)
+
+
+@condition(etag_func=post_etag)
+def post_comments(request, post_id):
+    """Фрагмент со следующей пачкой комментариев для «Показать ещё»."""
+    post = get_post_or_404(post_id, lambda queryset: queryset.only('id'))
+    context = {
+        'post': post,
+        'comments_page': comments_page(request, post),
+        **fragment_cache(request, f'post:{post.pk}'),
+    }
+    return render(request, 'posts/includes/comments_page.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    group_slug = request.GET.get('group') or None
+    username = request.GET.get('author') or None
+    group = get_object_or_404(Group, slug=group_slug) if group_slug else None
+    author = get_object_or_404(User, username=username) if username else None
+    page_obj = None
+    if query:
+        page_obj = SearchPaginator(
+            query, POSTS_AMOUNT, group=group, author=author
+        ).page_after(request.GET.get('cursor'))
+    params = {'q': query, 'group': group_slug or '', 'author': username or ''}
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'page_obj': page_obj,
+        'query_prefix': urlencode(params) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@limited_uploads
 def post_create(request):
     if request.method == 'POST':
         form = PostForm(request.POST,
@@ -62,7 +167,10 @@ def post_create(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            with transaction.atomic():
+                post.save()
+            if post.image:
+                enqueue_on_commit(post)
             return redirect('posts:profile', request.user)
         return render(request, 'posts/create_post.html', {'form': form})
     else:
@@ -71,6 +179,7 @@ def post_create(request):
 
 
 @login_required
+@limited_uploads
 def post_edit(request, post_id):
     is_edit = True
     post = get_object_or_404(Post, id=post_id)
@@ -81,6 +190,8 @@ def post_edit(request, post_id):
         return redirect('posts:post_detail', post_id)
     if form.is_valid():
         form.save()
+        if post.image and 'image' in form.changed_data:
+            enqueue_on_commit(post)
         return redirect('posts:post_detail', post_id=post.id)
     context = {
         'form': form,
@@ -95,20 +206,30 @@ def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
+        if settings.COMMENT_WRITE_BEHIND:
+            comment_queue.enqueue(post, request.user,
+                                  form.cleaned_data['text'])
+            return redirect('posts:post_detail', post_id=post_id)
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    subs = request.user.follower.values('author')
-    posts = Post.objects.filter(
-        author__in=subs).select_related('author', 'group')
+    feed, ordering, archive = follow_feed(request.user)
+    page_obj = pagin(request, feed, POSTS_AMOUNT, ordering=ordering,
+                     archive=archive)
+    if feed.model is not Post:
+        page_obj.object_list = [
+            row.post if isinstance(row, TimelineEntry) else row
+            for row in page_obj
+        ]
     context = {
-        'page_obj': pagin(request, posts, POSTS_AMOUNT),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -117,12 +238,14 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:follow_index')
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.get(user=request.user, author=author).delete()
+    with transaction.atomic():
+        Follow.objects.get(user=request.user, author=author).delete()
     return redirect("posts:follow_index")
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+from pathlib import Path
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -51,6 +52,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,12 +62,21 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RateLimitMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# В окружении воркеров задаётся SETUPTOOLS_USE_DISTUTILS=stdlib: иначе
+# setuptools>=60 подменяет distutils, который Django 2.2 импортирует при
+# старте, своей копией с pkg_resources — это около 200 мс на каждый запуск
+# (см. bench_startup). Из settings этого не сделать: Django к этому
+# моменту уже импортирован.
+# Прогрев воркера до приёма трафика (core.startup.warm_up): шаблоны и
+# таблицы URL готовы к первому запросу.
+WSGI_PRELOAD = os.environ.get('YATUBE_WSGI_PRELOAD') == '1'
 
 
 # Database
@@ -72,10 +85,63 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get('YATUBE_DB_PATH',
+                               os.path.join(BASE_DIR, 'db.sqlite3')),
     }
 }
 
+# Профиль SQLite: YATUBE_DB_PROFILE=production включает WAL, прагмы для
+# конкурентной нагрузки (их выполняет core.sqlite на каждом соединении),
+# постоянные соединения и BEGIN IMMEDIATE в atomic. По умолчанию — голый
+# sqlite3, как раньше.
+DB_PROFILES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'CONN_MAX_AGE': 0,
+        'PRAGMAS': {},
+    },
+    'production': {
+        'ENGINE': 'core.db_backends.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 15_000,
+            # Отрицательное значение — в КиБ: 64 МиБ страниц на соединение.
+            'cache_size': -64_000,
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+        },
+    },
+}
+DB_PROFILE = os.environ.get('YATUBE_DB_PROFILE', 'default')
+DATABASES['default']['ENGINE'] = DB_PROFILES[DB_PROFILE]['ENGINE']
+DATABASES['default']['CONN_MAX_AGE'] = DB_PROFILES[DB_PROFILE]['CONN_MAX_AGE']
+
+# Реплики только для чтения: YATUBE_DB_REPLICAS=2 добавляет алиасы
+# replica1, replica2 на файлы-копии db.replica1.sqlite3, ... Копии
+# обновляет команда sync_replicas; в тестах реплики — зеркала default.
+DATABASE_REPLICAS = [
+    f'replica{number}'
+    for number in range(1, int(os.environ.get('YATUBE_DB_REPLICAS', 0)) + 1)
+]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': Path(BASE_DIR, f'db.{alias}.sqlite3').as_uri() + '?mode=ro',
+        'OPTIONS': {'uri': True},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.db_routers.PrimaryReplicaRouter']
+# С реплик читаются только модели этих приложений (ленты, посты,
+# комментарии). Сессии, пользователи, contenttypes и хранилище sorl
+# всегда читаются с основной базы: отставание реплики там ломает вход
+# и права, а выигрыша почти нет.
+REPLICA_APPS = ('posts',)
+# После записи клиент столько секунд читает с основной базы.
+REPLICA_PIN_COOKIE = 'read_primary'
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -117,12 +183,20 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Вне отладки шаблоны компилируются один раз на процесс; при
+            # DEBUG правки в файлах видны без перезапуска.
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -145,6 +219,35 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 LIMIT_POST = 15
 
+# Авторы с большим числом подписчиков не раскладываются по лентам при
+# публикации: их посты подмешиваются в ленту подписок при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BATCH_SIZE = 1000
+# Граф подписок в кэше; записи в обход ORM видны не позже этого срока.
+FOLLOW_GRAPH_TIMEOUT = 60 * 60 * 24
+# Посты старше этого срока команда archive_posts переносит в архив.
+ARCHIVE_AFTER_DAYS = 365
+
+# Отложенная запись комментариев (posts.comment_queue): журнал на диске
+# и пакетный сброс в БД фоновым потоком.
+COMMENT_WRITE_BEHIND = os.environ.get('YATUBE_COMMENT_WRITE_BEHIND') == '1'
+COMMENT_QUEUE_DIR = os.environ.get(
+    'YATUBE_COMMENT_QUEUE_DIR', os.path.join(BASE_DIR, 'comment_queue'))
+COMMENT_FLUSH_INTERVAL = 0.2
+COMMENT_FLUSH_BATCH = 500
+# Сколько автор видит свой комментарий из очереди, если сброс не успел.
+COMMENT_PENDING_TIMEOUT = 60 * 10
+
+# Лимиты частоты записей (core.ratelimit) по имени URL: до burst запросов
+# подряд, дальше — по одному раз в per / burst секунд. Ведро своё у
+# каждого пользователя, у анонимов — у каждого IP.
+RATE_LIMITS = {
+    'posts:post_create': {'burst': 10, 'per': 600, 'methods': ('POST',)},
+    'posts:add_comment': {'burst': 20, 'per': 60, 'methods': ('POST',)},
+    'posts:profile_follow': {'burst': 30, 'per': 60,
+                             'methods': ('GET', 'POST')},
+}
+
 ALL_PAGES = 13
 FISRT_LIST = 10
 SECOND_LIST = 3
@@ -154,8 +257,82 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# L1 в памяти каждого воркера поверх общего для воркеров сайта файла
+# SQLite: инвалидация в одном процессе сразу видна остальным.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100_000,
+            'L1_MAX_BYTES': 16 * 1024 * 1024,
+        },
     }
 }
+# Тесты не делят с сайтом кэш и MEDIA_ROOT: раннер подменяет их на
+# временный каталог (core.testing); замеры подменяют кэш так же
+# (core.benchmark.bench_database).
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Размеры миниатюр, которые используют шаблоны; строятся вместе с
+# мастер-копией в фоне после загрузки картинки или командой
+# build_thumbnails. crop — обрезать по
+# центру до точного размера, иначе вписать.
+POST_THUMBNAILS = {
+    'card': {'size': (960, 339), 'crop': True},
+}
+# 0 — не строить в фоне, только командой (так в тестах).
+THUMBNAIL_WORKERS = 2
+
+# Загрузки в формы постов пишутся на диск по мере приёма; файл больше
+# лимита форма отклоняет, не декодируя (posts.uploads.limited_uploads).
+# Сайт показывает мастер-копию: не больше POST_IMAGE_MAX_SIDE по длинной
+# стороне, повёрнутую по EXIF и без метаданных; из неё режутся миниатюры.
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_QUALITY = 85
+
+# Фрагменты лент инвалидируются по тегам при записи, поэтому TTL большой.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+# Входит в ETag страниц: после выкладки новый HTML не должен отдаваться
+# клиентам как 304 по старым версиям тегов.
+ETAG_SALT = os.environ.get('YATUBE_RELEASE', '')
+
+# Замеры запросов: JSON-строка на запрос в логгер yatube.perf, бюджеты
+# для URL и метода — в perf_budgets.json. INFO-записи выводятся при
+# PERF_LOG_LEVEL=INFO, превышения бюджета — всегда; в тестах лог молчит,
+# бюджеты там проверяет BudgetTestMixin.
+PERF_LOG = True
+PERF_HEADERS = DEBUG
+PERF_BUDGETS_FILE = os.path.join(BASE_DIR, 'perf_budgets.json')
+
+# Профили отдельных запросов (core.profiling): по токену из команды
+# profile_token или по доле PROFILE_SAMPLE_RATE от всех запросов. Формат —
+# 'speedscope' или 'collapsed' (для flamegraph.pl). В PROFILE_DIR остаются
+# PROFILE_MAX_FILES последних профилей, 0 — все.
+PROFILE_DIR = os.environ.get('YATUBE_PROFILE_DIR',
+                             os.path.join(BASE_DIR, 'profiles'))
+PROFILE_SAMPLE_RATE = float(os.environ.get('YATUBE_PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL = 0.005
+PROFILE_FORMAT = 'speedscope'
+PROFILE_TOKEN_MAX_AGE = 60 * 60
+PROFILE_MAX_FILES = int(os.environ.get('YATUBE_PROFILE_MAX_FILES', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'perf': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube.perf': {
+            'handlers': ['perf'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}